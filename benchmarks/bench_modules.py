@@ -0,0 +1,210 @@
+import time
+import threading
+
+from uniflex.core import modules
+from uniflex.core import events
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class BenchEvent(events.EventBase):
+    def __init__(self, seq=0, payload=b""):
+        super().__init__()
+        self.seq = seq
+        self.sent = time.perf_counter()
+        self.payload = payload
+
+
+class BenchDevice(modules.DeviceModule):
+    def __init__(self):
+        super().__init__()
+        self.value = 0
+
+    def echo(self, value):
+        return value
+
+    def get_value(self):
+        return self.value
+
+    def emit_events(self, num, size=0):
+        payload = b"x" * size
+        for seq in range(num):
+            self.send_event(BenchEvent(seq, payload))
+        return num
+
+
+class BenchApp(modules.ControlApplication):
+    """
+    Collects nodes, receive latencies of BenchEvent and replies
+    of calls; benchmark waits on expected number of them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.latencies = []
+        self.expected = 0
+        self.done = threading.Event()
+        self.replies = 0
+        self.expectedReplies = 0
+        self.repliesDone = threading.Event()
+
+    def expect_events(self, num):
+        self.latencies = []
+        self.expected = num
+        self.done.clear()
+
+    def expect_replies(self, num):
+        self.replies = 0
+        self.expectedReplies = num
+        self.repliesDone.clear()
+
+    def serve_reply(self, event):
+        self.replies = self.replies + 1
+        if self.replies >= self.expectedReplies:
+            self.repliesDone.set()
+
+    def get_devices(self):
+        devices = []
+        for node in self.get_nodes():
+            if node.uuid == self.localNode.uuid:
+                continue
+            devices.extend(node.get_devices())
+        return devices
+
+    @modules.on_event(events.NewNodeEvent)
+    def add_node(self, event):
+        self._add_node(event.node)
+
+    @modules.on_event(BenchEvent)
+    def serve_bench_event(self, event):
+        self.latencies.append(time.perf_counter() - event.sent)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+class SyntheticEvent(events.EventBase):
+    def __init__(self, seq=0, payload=b""):
+        super().__init__()
+        self.seq = seq
+        # wall clock, event may come from other process
+        self.created = time.time()
+        self.payload = payload
+
+
+class SyntheticDevice(modules.DeviceModule):
+    """
+    Device module of scale scenarios: exports given functions
+    (list of names or name -> delay in seconds) and emits
+    SyntheticEvent with eventRate per second.
+    """
+
+    def __init__(self, functions=None, eventRate=0, payload=0):
+        super().__init__()
+        self.eventRate = eventRate
+        self.payload = b"x" * payload
+        self.emitted = 0
+        self.running = False
+        functions = functions or ["get_status"]
+        if isinstance(functions, list):
+            functions = dict.fromkeys(functions, 0)
+        for name, delay in functions.items():
+            setattr(self, name, self._create_function(name, delay))
+            self.functions.append(name)
+
+    def _create_function(self, name, delay):
+        def function(*args, **kwargs):
+            if delay:
+                time.sleep(delay)
+            return self.emitted
+        function.__name__ = name
+        return function
+
+    def _emit_events(self):
+        interval = 1.0 / self.eventRate
+        nextTime = time.perf_counter()
+        while self.running:
+            self.send_event(SyntheticEvent(self.emitted, self.payload))
+            self.emitted = self.emitted + 1
+            nextTime = nextTime + interval
+            delay = nextTime - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    @modules.on_start()
+    def start_emitting(self):
+        if not self.eventRate:
+            return
+        self.running = True
+        thread = threading.Thread(target=self._emit_events)
+        thread.daemon = True
+        thread.start()
+
+    @modules.on_exit()
+    def stop_emitting(self):
+        self.running = False
+
+
+class NodeMonitor(modules.ControlApplication):
+    """
+    Counts discovered and lost nodes; all agents of scale
+    scenario keep running, so every lost node is false positive.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.discovered = 0
+        self.lost = 0
+        self.exited = 0
+
+    def get_stats(self):
+        return {"discovered": self.discovered, "lost": self.lost,
+                "exited": self.exited}
+
+    @modules.on_event(events.NewNodeEvent)
+    def count_new_node(self, event):
+        self.discovered = self.discovered + 1
+
+    @modules.on_event(events.NodeLostEvent)
+    def count_lost_node(self, event):
+        self.lost = self.lost + 1
+
+    @modules.on_event(events.NodeExitEvent)
+    def count_exited_node(self, event):
+        self.exited = self.exited + 1
+
+
+class ScaleController(NodeMonitor):
+    """
+    Controller of scale scenario; records dispatch lag of
+    SyntheticEvent and keeps proxies of all remote devices.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lags = []
+
+    def reset(self):
+        self.lags = []
+
+    def get_devices(self):
+        devices = []
+        for node in self.get_nodes():
+            if node.uuid == self.localNode.uuid:
+                continue
+            devices.extend(node.get_devices())
+        return devices
+
+    @modules.on_event(events.NewNodeEvent)
+    def add_node(self, event):
+        self._add_node(event.node)
+
+    @modules.on_event(events.NodeLostEvent)
+    def remove_lost_node(self, event):
+        self._remove_node(event.node)
+
+    @modules.on_event(SyntheticEvent)
+    def serve_synthetic_event(self, event):
+        self.lags.append(time.time() - event.created)
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of UniFlex core: event dispatch, function calls, node
+discovery, serialization and broker forwarding. Broker and agents
+run in this process and communicate over loopback; results are
+written as JSON, e.g. to compare runs before and after a change:
+
+   python benchmarks/run_benchmarks.py --output before.json
+   python benchmarks/run_benchmarks.py --output after.json \\
+       --baseline before.json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+
+import zmq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from uniflex.core.agent import Agent  # noqa: E402
+from uniflex.core.broker import Broker  # noqa: E402
+from uniflex.core import serialization  # noqa: E402
+from uniflex.core import compression  # noqa: E402
+import bench_modules  # noqa: E402
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+log = logging.getLogger('uniflex.benchmarks')
+
+
+def get_free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def summarize(samples):
+    """
+    Returns count, mean and percentiles of samples in microseconds.
+    """
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+
+    def percentile(p):
+        idx = min(len(samples) - 1, int(round(p / 100.0 * len(samples))))
+        return samples[idx] * 1e6
+
+    return {"count": len(samples),
+            "mean_us": sum(samples) / len(samples) * 1e6,
+            "p50_us": percentile(50),
+            "p90_us": percentile(90),
+            "p99_us": percentile(99),
+            "max_us": samples[-1] * 1e6}
+
+
+def wait_for(condition, timeout):
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise RuntimeError("Timeout after {} s".format(timeout))
+        time.sleep(0.001)
+    return time.perf_counter() - start
+
+
+def run_in_module(module, function, *args):
+    """
+    Run function in new thread in name of module, as calls of
+    module proxies are sent on behalf of calling module.
+    """
+    result = {}
+
+    def run():
+        try:
+            result["value"] = function(*args)
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.module = module
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+
+class Deployment(object):
+    """
+    Broker, controller agent with BenchApp and remote agents with
+    BenchDevice modules, all in this process.
+    """
+
+    def __init__(self, agentNum=1, devicesPerAgent=1, discovery="hello",
+                 localDevice=False, agentConfig=None):
+        super().__init__()
+        self.agentNum = agentNum
+        self.devicesPerAgent = devicesPerAgent
+        self.discovery = discovery
+        self.localDevice = localDevice
+        self.agentConfig = agentConfig or {}
+        xpub = get_free_port()
+        xsub = get_free_port()
+        self.sub = "tcp://127.0.0.1:{}".format(xpub)
+        self.pub = "tcp://127.0.0.1:{}".format(xsub)
+        self.controller = None
+        self.agents = []
+        self.app = None
+
+    def _create_config(self, name):
+        config = {'name': name, 'type': 'global', 'info': name, 'iface': 'lo',
+                  'sub': self.sub, 'pub': self.pub,
+                  'discovery': self.discovery}
+        config.update(self.agentConfig)
+        return config
+
+    def _create_device_modules(self):
+        devices = ["phy{}".format(i) for i in range(self.devicesPerAgent)]
+        return {'bench_device': {'module': 'bench_modules',
+                                 'class_name': 'BenchDevice',
+                                 'devices': devices}}
+
+    def create_controller(self):
+        config = {'config': self._create_config('controller'),
+                  'broker': {'xpub': self.sub, 'xsub': self.pub,
+                             'directory': self.discovery == 'directory'},
+                  'control_applications': {
+                      'bench_app': {'module': 'bench_modules',
+                                    'class_name': 'BenchApp'}}}
+        if self.localDevice:
+            config['modules'] = self._create_device_modules()
+        self.controller = Agent()
+        self.controller.load_config(config)
+        self.app = self.get_modules(self.controller, "BenchApp")[0]
+        return self.controller
+
+    def create_agents(self):
+        for idx in range(self.agentNum):
+            agent = Agent()
+            agent.load_config({
+                'config': self._create_config('agent-{}'.format(idx)),
+                'modules': self._create_device_modules()})
+            self.agents.append(agent)
+        return self.agents
+
+    @staticmethod
+    def get_modules(agent, name):
+        return [m for m in agent.moduleManager.modules.values()
+                if m.name == name]
+
+    def start(self, timeout=30):
+        self.create_controller()
+        self.create_agents()
+        self.controller.moduleManager.start()
+        # let broker bind its sockets
+        time.sleep(0.2)
+        for agent in self.agents:
+            agent.moduleManager.start()
+        expected = self.agentNum * self.devicesPerAgent
+        wait_for(lambda: len(self.app.get_devices()) >= expected, timeout)
+
+    def stop(self):
+        for agent in self.agents:
+            agent.stop()
+        if self.controller:
+            self.controller.stop()
+        # broker polls with 1 s timeout
+        time.sleep(1.1)
+
+
+def bench_event_dispatch(events, size, remote):
+    """
+    Throughput and publish-to-handler latency of BenchEvent sent by
+    device module to BenchApp, in the same agent or over broker.
+    """
+    deployment = Deployment(agentNum=1 if remote else 0,
+                            localDevice=not remote)
+    deployment.create_controller()
+    deployment.create_agents()
+    deployment.controller.moduleManager.start()
+    time.sleep(0.2)
+    for agent in deployment.agents:
+        agent.moduleManager.start()
+    try:
+        source = deployment.agents[0] if remote else deployment.controller
+        device = Deployment.get_modules(source, "BenchDevice")[0]
+        app = deployment.app
+        if remote:
+            wait_for(lambda: app.get_devices(), 30)
+            # warm up subscription of BenchEvent
+            app.expect_events(1)
+            wait_for(lambda: device.emit_events(1) and app.done.wait(0.1),
+                     10)
+            time.sleep(0.2)
+
+        # latency of single event, without queueing behind others
+        samples = []
+        for i in range(min(events, 500)):
+            app.expect_events(1)
+            device.emit_events(1, size)
+            if not app.done.wait(10):
+                raise RuntimeError("Event was not received")
+            samples.extend(app.latencies)
+        result = {"latency": summarize(samples)}
+
+        # throughput and latency of burst of events
+        app.expect_events(events)
+        start = time.perf_counter()
+        device.emit_events(events, size)
+        if not app.done.wait(60):
+            raise RuntimeError("Received {} of {} events".format(
+                len(app.latencies), events))
+        duration = time.perf_counter() - start
+        burst = summarize(app.latencies)
+        burst["events"] = events
+        burst["events_per_s"] = events / duration
+        result["burst"] = burst
+        result["payload_bytes"] = size
+        return result
+    finally:
+        deployment.stop()
+
+
+def bench_rpc(calls, fanout):
+    """
+    Round-trip time of blocking calls through module proxy and
+    of calls fanned out to devices of all remote agents.
+    """
+    deployment = Deployment(agentNum=fanout[0], devicesPerAgent=fanout[1])
+    deployment.start()
+    try:
+        app = deployment.app
+        devices = app.get_devices()
+
+        def blocking_calls():
+            device = devices[0]
+            samples = []
+            for i in range(calls):
+                start = time.perf_counter()
+                value = device.blocking(True).echo(i)
+                samples.append(time.perf_counter() - start)
+                assert value == i
+            return samples
+
+        def fanout_calls():
+            samples = []
+            for i in range(max(1, calls // len(devices))):
+                app.expect_replies(len(devices))
+                start = time.perf_counter()
+                for device in devices:
+                    device.callback(app.serve_reply).get_value()
+                if not app.repliesDone.wait(30):
+                    raise RuntimeError("Received {} of {} replies".format(
+                        app.replies, len(devices)))
+                samples.append(time.perf_counter() - start)
+            return samples
+
+        blocking = summarize(run_in_module(app, blocking_calls))
+        blocking["calls_per_s"] = 1e6 / blocking["mean_us"]
+        fanned = summarize(run_in_module(app, fanout_calls))
+        fanned["agents"] = fanout[0]
+        fanned["devices"] = len(devices)
+        return {"blocking": blocking, "fanout": fanned}
+    finally:
+        deployment.stop()
+
+
+def bench_discovery(agentNum, discovery):
+    """
+    Time from start of agents until every agent knows all nodes.
+    """
+    deployment = Deployment(agentNum=agentNum, discovery=discovery)
+    deployment.create_controller()
+    deployment.create_agents()
+    deployment.controller.moduleManager.start()
+    time.sleep(0.2)
+    allAgents = [deployment.controller] + deployment.agents
+    try:
+        start = time.perf_counter()
+        for agent in deployment.agents:
+            agent.moduleManager.start()
+        converged = wait_for(
+            lambda: all(len(agent.nodeManager.nodes) == len(allAgents)
+                        for agent in allAgents), 60)
+        return {"agents": agentNum, "discovery": discovery,
+                "agent_start_s": time.perf_counter() - start - converged,
+                "convergence_s": time.perf_counter() - start}
+    finally:
+        deployment.stop()
+
+
+class CodecEvent(bench_modules.BenchEvent):
+    pass
+
+
+class DillEvent(bench_modules.BenchEvent):
+    pass
+
+
+def bench_serialization(iterations, size):
+    """
+    Serialization cost per serializer and compression codec.
+    """
+    serialization.register_codec(
+        CodecEvent,
+        lambda e: json.dumps([e.seq, e.payload.decode()]).encode(),
+        lambda data: CodecEvent(*[v if i == 0 else v.encode() for i, v in
+                                  enumerate(json.loads(data.decode()))]))
+
+    dillEvent = DillEvent(1, b"x" * size)
+    # lambda cannot be pickled, type is pinned to dill
+    dillEvent.filter = lambda e: e.seq > 0
+    objects = {"pickle": bench_modules.BenchEvent(1, b"x" * size),
+               "dill": dillEvent,
+               "codec": CodecEvent(1, b"x" * size)}
+
+    def measure(function):
+        function()
+        start = time.perf_counter()
+        for i in range(iterations):
+            function()
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    results = {}
+    for name, obj in objects.items():
+        data, buffers, serializationType = serialization.dumps(obj)
+        msgType = obj.__class__.__name__
+        results[name] = {
+            "serialization_type": serializationType.name,
+            "bytes": len(data),
+            "dumps_us": measure(lambda: serialization.dumps(obj)),
+            "loads_us": measure(lambda: serialization.loads(
+                data, buffers, serializationType, msgType))}
+
+    data = serialization.dumps(objects["pickle"])[0]
+    for codec in compression.get_available_compressions():
+        compressed = compression.compress(data, codec)
+        results["pickle+{}".format(codec.name.lower())] = {
+            "bytes": len(compressed),
+            "compress_us": measure(
+                lambda: compression.compress(data, codec)),
+            "decompress_us": measure(
+                lambda: compression.decompress(compressed, codec))}
+    for result in results.values():
+        result["payload_bytes"] = size
+    return results
+
+
+def bench_broker(messages, size):
+    """
+    Forwarding rate of broker for messages of given payload size.
+    """
+    xpub = "tcp://127.0.0.1:{}".format(get_free_port())
+    xsub = "tcp://127.0.0.1:{}".format(get_free_port())
+    broker = Broker(xpub, xsub)
+    broker.daemon = True
+    broker.start()
+
+    ctx = zmq.Context()
+    pub = ctx.socket(zmq.PUB)
+    sub = ctx.socket(zmq.SUB)
+    for sock in [pub, sub]:
+        sock.setsockopt(zmq.SNDHWM, 0)
+        sock.setsockopt(zmq.RCVHWM, 0)
+    pub.connect(xsub)
+    sub.connect(xpub)
+    sub.setsockopt(zmq.SUBSCRIBE, b"bench")
+    header = json.dumps({}).encode('utf-8')
+    payload = b"x" * size
+    try:
+        # wait until subscription reaches publisher
+        poller = zmq.Poller()
+        poller.register(sub, zmq.POLLIN)
+        deadline = time.perf_counter() + 10
+        while not poller.poll(10):
+            if time.perf_counter() > deadline:
+                raise RuntimeError("Broker does not forward messages")
+            pub.send_multipart([b"bench", header, b"warmup"])
+        while poller.poll(100):
+            sub.recv_multipart()
+
+        received = [0]
+
+        def receive():
+            while received[0] < messages:
+                sub.recv_multipart(copy=False)
+                received[0] = received[0] + 1
+
+        thread = threading.Thread(target=receive)
+        thread.daemon = True
+        thread.start()
+        start = time.perf_counter()
+        for i in range(messages):
+            pub.send_multipart([b"bench", header, payload])
+        thread.join(60)
+        duration = time.perf_counter() - start
+        return {"messages": messages, "received": received[0],
+                "payload_bytes": size,
+                "messages_per_s": received[0] / duration,
+                "mbytes_per_s": received[0] * size / duration / 1e6}
+    finally:
+        broker.stop()
+        pub.close(0)
+        sub.close(0)
+        ctx.term()
+        broker.join(2)
+
+
+def get_metadata():
+    commit = None
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pyzmq": zmq.pyzmq_version(),
+            "zmq": zmq.zmq_version()}
+
+
+def flatten(results, prefix=""):
+    values = {}
+    for key, value in results.items():
+        name = "{}.{}".format(prefix, key) if prefix else key
+        if isinstance(value, dict):
+            values.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare(results, baseline):
+    """
+    Returns {metric: [baseline, current, change %]} of common metrics.
+    """
+    current = flatten(results["benchmarks"])
+    previous = flatten(baseline["benchmarks"])
+    changes = {}
+    for name in sorted(set(current) & set(previous)):
+        change = None
+        if previous[name]:
+            change = (current[name] - previous[name]) / previous[name] * 100
+        changes[name] = [previous[name], current[name], change]
+    return changes
+
+
+BENCHMARKS = ["events", "rpc", "discovery", "serialization", "broker"]
+
+
+def run(args):
+    benchmarks = {}
+    selected = args.benchmarks or BENCHMARKS
+    if "events" in selected:
+        log.info("Event dispatch")
+        benchmarks["event_dispatch_local"] = bench_event_dispatch(
+            args.events, args.payload, remote=False)
+        benchmarks["event_dispatch_remote"] = bench_event_dispatch(
+            args.events, args.payload, remote=True)
+    if "rpc" in selected:
+        log.info("Function calls")
+        benchmarks["rpc"] = bench_rpc(args.calls,
+                                      (args.fanout_agents,
+                                       args.fanout_devices))
+    if "discovery" in selected:
+        log.info("Node discovery")
+        benchmarks["discovery"] = {
+            mode: bench_discovery(args.agents, mode)
+            for mode in ["hello", "directory"]}
+    if "serialization" in selected:
+        log.info("Serialization")
+        benchmarks["serialization"] = bench_serialization(
+            args.iterations, args.payload)
+    if "broker" in selected:
+        log.info("Broker forwarding")
+        benchmarks["broker_forwarding"] = bench_broker(args.messages,
+                                                       args.payload)
+    return {"metadata": get_metadata(), "parameters": vars(args),
+            "benchmarks": benchmarks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("benchmarks", nargs="*",
+                        help="benchmarks to run: {} (default: all)"
+                        .format(", ".join(BENCHMARKS)))
+    parser.add_argument("--output", help="JSON file with results")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--fanout-agents", type=int, default=4)
+    parser.add_argument("--fanout-devices", type=int, default=2)
+    parser.add_argument("--agents", type=int, default=8,
+                        help="simulated agents in discovery benchmark")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--payload", type=int, default=256,
+                        help="payload size in bytes")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmarks: {}".format(", ".join(unknown)))
+
+    logging.basicConfig(level=logging.INFO if args.verbose
+                        else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(message)s')
+
+    results = run(args)
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["comparison"] = compare(results, json.load(f))
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Scale harness: runs controller and N agents with M synthetic device
+modules each, connected by local broker, as described by scenario
+file, and reports dispatch lag, RPC latency, false node losses and
+broker CPU usage as JSON:
+
+   python benchmarks/scale_harness.py benchmarks/scenarios/fleet.yaml
+
+Scenario (YAML):
+
+   name: fleet
+   agents: [10, 20, 40]   # fleet sizes, scenario runs for each
+   mode: process          # agents in threads or processes
+   duration: 30           # seconds of measurement
+   warmup: 5
+   broker:                # Broker options
+     directory: false
+     hello_aggregation: false
+   agent:                 # added to config of all agents
+     discovery: hello
+   devices:
+     count: 4             # device modules per agent
+     functions:           # exported functions, name: delay in s
+       get_status: 0
+     event_rate: 10       # events per second per device
+     payload: 256         # bytes
+   rpc:
+     rate: 50             # calls per second from controller
+     concurrency: 1
+     function: get_status
+
+Broker runs in separate process, so its CPU usage is measured alone.
+Every node lost while all agents keep running is false positive.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import threading
+import multiprocessing
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from uniflex.core.agent import Agent  # noqa: E402
+from uniflex.core.broker import Broker  # noqa: E402
+from run_benchmarks import (get_free_port, summarize, wait_for,  # noqa: E402
+                            get_metadata)
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+log = logging.getLogger('uniflex.benchmarks.scale')
+
+DEFAULT_SCENARIO = {
+    "name": "default",
+    "agents": [4],
+    "mode": "thread",
+    "duration": 10,
+    "warmup": 2,
+    "discovery_timeout": 60,
+    "broker": {},
+    "agent": {},
+    "devices": {"count": 1, "functions": {"get_status": 0},
+                "event_rate": 10, "payload": 256},
+    "rpc": {"rate": 10, "concurrency": 1, "function": None},
+}
+
+
+def load_scenario(path):
+    with open(path) as f:
+        scenario = yaml.safe_load(f) or {}
+    for key, value in DEFAULT_SCENARIO.items():
+        if isinstance(value, dict):
+            scenario[key] = dict(value, **scenario.get(key, {}))
+        else:
+            scenario.setdefault(key, value)
+    if not isinstance(scenario["agents"], list):
+        scenario["agents"] = [scenario["agents"]]
+    if scenario["mode"] not in ["thread", "process"]:
+        raise ValueError("Unknown mode: {}".format(scenario["mode"]))
+    return scenario
+
+
+def create_agent_config(scenario, name, sub, pub):
+    devices = scenario["devices"]
+    return {
+        'config': dict({'name': name, 'type': 'global', 'iface': 'lo',
+                        'info': name, 'sub': sub, 'pub': pub},
+                       **scenario["agent"]),
+        'control_applications': {
+            'monitor': {'module': 'bench_modules',
+                        'class_name': 'NodeMonitor'}},
+        'modules': {
+            'synthetic_device': {
+                'module': 'bench_modules',
+                'class_name': 'SyntheticDevice',
+                'devices': ["dev{}".format(i)
+                            for i in range(devices["count"])],
+                'kwargs': {'functions': devices["functions"],
+                           'eventRate': devices["event_rate"],
+                           'payload': devices["payload"]}}}}
+
+
+def get_module(agent, name):
+    for module in agent.moduleManager.modules.values():
+        if module.name == name:
+            return module
+    return None
+
+
+def get_cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_broker(options, conn):
+    broker = Broker(**options)
+    broker.daemon = True
+    broker.start()
+    # every request is answered with CPU time used so far
+    while True:
+        request = conn.recv()
+        conn.send(get_cpu_time())
+        if request == "stop":
+            broker.stop()
+            break
+
+
+def run_agent(config, conn):
+    agent = Agent()
+    agent.load_config(config)
+    agent.moduleManager.start()
+    conn.recv()
+    conn.send(get_module(agent, "NodeMonitor").get_stats())
+    agent.stop()
+
+
+class ThreadAgent(object):
+    """
+    Agent running in harness process.
+    """
+
+    def __init__(self, config):
+        super().__init__()
+        self.agent = Agent()
+        self.agent.load_config(config)
+
+    def start(self):
+        self.agent.moduleManager.start()
+
+    def stop(self):
+        stats = get_module(self.agent, "NodeMonitor").get_stats()
+        self.agent.stop()
+        return stats
+
+
+class ProcessAgent(object):
+    """
+    Agent running in its own process.
+    """
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.conn = None
+        self.process = None
+
+    def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, childConn = ctx.Pipe()
+        self.process = ctx.Process(target=run_agent,
+                                   args=(self.config, childConn))
+        self.process.daemon = True
+        self.process.start()
+
+    def stop(self):
+        stats = None
+        try:
+            self.conn.send("stop")
+            if self.conn.poll(10):
+                stats = self.conn.recv()
+        except (OSError, EOFError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        return stats
+
+
+def generate_rpc_load(controller, scenario, stopEvent, samples, errors):
+    rpc = scenario["rpc"]
+    function = rpc["function"] or \
+        list(scenario["devices"]["functions"])[0]
+    interval = rpc["concurrency"] / float(rpc["rate"])
+    devices = controller.get_devices()
+    idx = 0
+    nextTime = time.perf_counter()
+    while not stopEvent.is_set():
+        device = devices[idx % len(devices)]
+        idx = idx + 1
+        start = time.perf_counter()
+        try:
+            getattr(device.blocking(True), function)()
+            samples.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(repr(e))
+        nextTime = nextTime + interval
+        delay = nextTime - time.perf_counter()
+        if delay > 0:
+            stopEvent.wait(delay)
+
+
+def run_fleet(scenario, agentNum):
+    """
+    Runs scenario with given number of agents; returns its report.
+    """
+    mode = scenario["mode"]
+    devices = scenario["devices"]
+    sub = "tcp://127.0.0.1:{}".format(get_free_port())
+    pub = "tcp://127.0.0.1:{}".format(get_free_port())
+
+    ctx = multiprocessing.get_context("spawn")
+    brokerConn, childConn = ctx.Pipe()
+    brokerOptions = dict(scenario["broker"], xpub=sub, xsub=pub)
+    brokerProcess = ctx.Process(target=run_broker,
+                                args=(brokerOptions, childConn))
+    brokerProcess.daemon = True
+    brokerProcess.start()
+
+    config = create_agent_config(scenario, "controller", sub, pub)
+    config['control_applications'] = {
+        'controller': {'module': 'bench_modules',
+                       'class_name': 'ScaleController'}}
+    config.pop('modules')
+    controllerAgent = Agent()
+    controllerAgent.load_config(config)
+    controller = get_module(controllerAgent, "ScaleController")
+
+    agentClass = ThreadAgent if mode == "thread" else ProcessAgent
+    agents = [agentClass(create_agent_config(
+        scenario, "agent-{}".format(i), sub, pub)) for i in range(agentNum)]
+
+    report = {"agents": agentNum, "mode": mode,
+              "devices_per_agent": devices["count"]}
+    stopEvent = threading.Event()
+    rpcThreads = []
+    try:
+        controllerAgent.moduleManager.start()
+        start = time.perf_counter()
+        for agent in agents:
+            agent.start()
+        expected = agentNum * devices["count"]
+        wait_for(lambda: len(controller.get_devices()) >= expected,
+                 scenario["discovery_timeout"])
+        report["discovery_s"] = time.perf_counter() - start
+        log.info("{} agents discovered in {:.2f} s"
+                 .format(agentNum, report["discovery_s"]))
+        time.sleep(scenario["warmup"])
+
+        controller.reset()
+        rpcSamples = []
+        rpcErrors = []
+        brokerConn.send("cpu")
+        brokerCpu = brokerConn.recv()
+        measureStart = time.perf_counter()
+        if scenario["rpc"]["rate"]:
+            for i in range(scenario["rpc"]["concurrency"]):
+                thread = threading.Thread(
+                    target=generate_rpc_load,
+                    args=(controller, scenario, stopEvent, rpcSamples,
+                          rpcErrors))
+                # calls are sent in name of controller
+                thread.module = controller
+                thread.daemon = True
+                thread.start()
+                rpcThreads.append(thread)
+
+        time.sleep(scenario["duration"])
+        lags = list(controller.lags)
+        stopEvent.set()
+        brokerConn.send("cpu")
+        brokerCpu = brokerConn.recv() - brokerCpu
+        duration = time.perf_counter() - measureStart
+        for thread in rpcThreads:
+            thread.join(10)
+
+        expectedEvents = expected * devices["event_rate"] * duration
+        report["dispatch_lag"] = summarize(lags)
+        report["events"] = {
+            "expected": int(expectedEvents),
+            "received": len(lags),
+            "received_per_s": len(lags) / duration}
+        report["rpc"] = summarize(rpcSamples)
+        report["rpc"]["errors"] = len(rpcErrors)
+        report["rpc"]["calls_per_s"] = len(rpcSamples) / duration
+        report["broker"] = {"cpu_s": brokerCpu,
+                            "cpu_percent": brokerCpu / duration * 100}
+    finally:
+        stopEvent.set()
+        agentStats = [agent.stop() for agent in agents]
+        controllerStats = controller.get_stats()
+        controllerAgent.stop()
+        try:
+            brokerConn.send("stop")
+            brokerConn.recv()
+        except (OSError, EOFError):
+            pass
+        brokerProcess.join(5)
+
+    report["node_loss"] = {
+        "controller": controllerStats["lost"],
+        "agents": sum(stats["lost"] for stats in agentStats if stats),
+        "false_positives": controllerStats["lost"] + sum(
+            stats["lost"] for stats in agentStats if stats)}
+    return report
+
+
+def run(scenario):
+    runs = []
+    for agentNum in scenario["agents"]:
+        log.info("Run {} with {} agents".format(scenario["name"], agentNum))
+        runs.append(run_fleet(scenario, agentNum))
+
+    # smallest fleet with spurious hello timeouts
+    spurious = [r["agents"] for r in runs
+                if r["node_loss"]["false_positives"]]
+    return {"metadata": get_metadata(), "scenario": scenario,
+            "runs": runs,
+            "false_node_loss_from": min(spurious) if spurious else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenario", help="scenario file (YAML)")
+    parser.add_argument("--output", help="JSON file with report")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose
+                        else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(message)s')
+
+    report = run(load_scenario(args.scenario))
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
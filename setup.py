@@ -12,6 +12,7 @@ setup(
     packages=find_packages(),
     scripts=['uniflex/bin/uniflex-agent',
              'uniflex/bin/uniflex-broker',
+             'uniflex/bin/uniflex-replay',
              'uniflex/bin/uniflex-matlab-agent'],
     url='https://github.com/uniflex',
     license='MIT',
@@ -20,6 +21,7 @@ setup(
     description='UniFlex Framework',
     long_description='Implementation of UniFlex Framework',
     keywords='wireless control',
-    install_requires=['apscheduler', 'pyzmq', 'dill', 'protobuf', 'decorator', 'pyyaml', 'netifaces', 'docopt', 'tzlocal'],
-    extras_require={},
+    install_requires=['apscheduler', 'pyzmq', 'dill', 'protobuf>=3.20', 'decorator', 'pyyaml', 'netifaces', 'docopt', 'tzlocal'],
+    extras_require={'bulk': ['numpy'],
+                    'compression': ['lz4', 'zstandard']},
 )
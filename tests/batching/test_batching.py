@@ -0,0 +1,26 @@
+from uniflex.core.batching import MessageBatcher, unpack_records
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_batcher_packs_records_per_topic():
+    sent = []
+    batcher = MessageBatcher(sent.append, lambda: b"batch",
+                             maxMessages=3, maxDelay=10**6)
+    for i in range(4):
+        batcher.add(b"A", b"desc", str(i).encode())
+    batcher.add(b"B", b"desc", b"x")
+
+    # full batch is sent immediately
+    assert len(sent) == 1
+    topic, desc, frame = sent[0]
+    assert (topic, desc) == (b"A", b"batch")
+    records = unpack_records(frame)
+    assert [bytes(p) for d, p in records] == [b"0", b"1", b"2"]
+
+    # single records are sent as regular messages
+    batcher.flush()
+    assert sent[1:] == [[b"A", b"desc", b"3"], [b"B", b"desc", b"x"]]
@@ -0,0 +1,79 @@
+import json
+import time
+import uuid
+
+import zmq
+
+import uniflex.msgs as msgs
+from uniflex.core.broker import Broker
+from uniflex.core.liveness import HelloAggregator
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def create_msg_desc(sourceUuid, msgType="Event"):
+    msgDesc = msgs.MessageDescription()
+    msgDesc.msgType = msgType
+    msgDesc.sourceUuid = sourceUuid
+    msgDesc.serializationType = msgs.SerializationType.PICKLE
+    return json.dumps(msgDesc.serialize()).encode('utf-8')
+
+
+def test_malformed_message_does_not_stop_broker():
+    url = "inproc://broker-{}".format(uuid.uuid4())
+    xpub, xsub = url + "-xpub", url + "-xsub"
+    broker = Broker(xpub, xsub, directory=True, hello_aggregation=True)
+    broker.daemon = True
+    broker.start()
+    for i in range(100):
+        if broker.running:
+            break
+        time.sleep(0.01)
+    ctx = zmq.Context.instance()
+    sub = ctx.socket(zmq.SUB)
+    sub.connect(xpub)
+    sub.setsockopt(zmq.SUBSCRIBE, b"Event")
+    pub = ctx.socket(zmq.PUB)
+    pub.connect(xsub)
+    try:
+        received = None
+        # resend until subscription reaches publisher
+        for i in range(100):
+            pub.send_multipart([b"Event", b"not json", b"bad"])
+            pub.send_multipart([b"Event", create_msg_desc("node"), b"ok"])
+            if sub.poll(20):
+                received = sub.recv_multipart()
+                break
+        assert received is not None
+        assert received[2] == b"ok"
+        assert broker.is_alive()
+        assert "node" in broker.helloAggregator.seen
+    finally:
+        broker.stop()
+        sub.close(linger=0)
+        pub.close(linger=0)
+
+
+def test_hello_aggregator_interprets_only_its_topics():
+    aggregator = HelloAggregator()
+    hello = msgs.HelloMsg()
+    hello.uuid = "node"
+    hello.timeout = 10
+    helloDesc = create_msg_desc("node", msgs.get_msg_type(msgs.HelloMsg))
+    exitDesc = create_msg_desc("node", msgs.get_msg_type(msgs.NodeExitMsg))
+
+    # messages on other topics only refresh their source
+    assert not aggregator.process_msg(
+        [b"Event", helloDesc, hello.SerializeToString()])
+    assert not aggregator.process_msg([b"Event", exitDesc, b""])
+    assert aggregator.seen == {"node"}
+    assert aggregator.hellos == {}
+
+    assert aggregator.process_msg(
+        [b"HELLO_MSG", helloDesc, hello.SerializeToString()])
+    assert aggregator.hellos["node"].timeout == 10
+    aggregator.process_msg([b"NODE_EXIT", exitDesc, b""])
+    assert aggregator.seen == set()
@@ -0,0 +1,32 @@
+import pytest
+
+from uniflex.core.bulk import BulkChannel, read_bulk_data
+from uniflex.core.bulk import is_bulk_data_valid, release_bulk_buffer
+from uniflex.core.exceptions import BulkDataOverwritten
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_bulk_channel_read_and_overwrite():
+    channel = BulkChannel(size=1024)
+    try:
+        first = channel.write(b"a" * 300)
+        second = channel.write(b"b" * 300)
+        assert first.seq + 1 == second.seq
+        assert bytes(read_bulk_data(first)) == b"a" * 300
+        assert bytes(read_bulk_data(second, copy=True)) == b"b" * 300
+
+        # third and fourth record wrap around and overwrite first one
+        channel.write(b"c" * 300)
+        fourth = channel.write(b"d" * 300)
+        assert fourth.position % 1024 == 0
+        assert not is_bulk_data_valid(first)
+        with pytest.raises(BulkDataOverwritten):
+            read_bulk_data(first)
+        assert bytes(read_bulk_data(fourth)) == b"d" * 300
+    finally:
+        release_bulk_buffer(channel.name)
+        channel.close()
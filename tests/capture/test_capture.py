@@ -0,0 +1,60 @@
+import zmq
+
+from uniflex.core.broker import Broker
+from uniflex.core.capture import CaptureWriter, CaptureReader, replay
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def read_capture(path):
+    with CaptureReader(path) as reader:
+        return [(t, [bytes(f) for f in frames]) for t, frames in reader]
+
+
+def test_capture_is_appended_and_truncated_record_ignored(tmp_path):
+    path = str(tmp_path / "broker.cap")
+    writer = CaptureWriter(path)
+    writer.write([b"topic", b"{}", zmq.Frame(b"payload")], 1000)
+    writer.close()
+    # capture continues in existing file
+    writer = CaptureWriter(path)
+    writer.write([b"topic", b"{}", b"second"], 2000)
+    writer.close()
+    with open(path, "ab") as f:
+        f.write(b"\x00\x00")
+
+    assert read_capture(path) == [
+        (1000, [b"topic", b"{}", b"payload"]),
+        (2000, [b"topic", b"{}", b"second"])]
+
+
+def test_replay_publishes_capture_through_broker(tmp_path):
+    path = str(tmp_path / "broker.cap")
+    writer = CaptureWriter(path)
+    for i in range(10):
+        writer.write([b"Event", b"{}", str(i).encode()], i * 1000)
+    writer.close()
+
+    xpub, xsub = "tcp://127.0.0.1:18790", "tcp://127.0.0.1:18789"
+    broker = Broker(xpub, xsub)
+    broker.daemon = True
+    broker.start()
+    ctx = zmq.Context()
+    sub = ctx.socket(zmq.SUB)
+    sub.connect(xpub)
+    sub.setsockopt(zmq.SUBSCRIBE, b"Event")
+    try:
+        assert replay(path, xsub, speed=0, ctx=ctx)[0] == 10
+        received = []
+        while sub.poll(2000):
+            received.append(sub.recv_multipart()[2])
+            if len(received) == 10:
+                break
+        assert received == [str(i).encode() for i in range(10)]
+    finally:
+        broker.stop()
+        sub.close(linger=0)
+        ctx.term()
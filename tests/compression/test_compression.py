@@ -0,0 +1,75 @@
+import json
+
+import uniflex.msgs as msgs
+from uniflex.core.compression import PayloadCompressor
+from uniflex.core.node import Node
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def transfer(msgDesc):
+    # message description travels as json header
+    return msgs.MessageDescription.parse(json.loads(
+        json.dumps(msgDesc.serialize())))
+
+
+def test_payload_compressed_above_threshold():
+    dictionary = b"channel=11;power=20;rssi=-67;" * 8
+    sender = PayloadCompressor(enabled=True, algorithm="zlib", threshold=64,
+                               types={"HelloMsg": None},
+                               dictionaries={"SampleEvent": dictionary})
+    receiver = PayloadCompressor(dictionaries={"SampleEvent": dictionary})
+
+    payload = b"channel=11;power=20;rssi=-70;" * 10
+    msgDesc = msgs.MessageDescription("SampleEvent")
+    compressed = sender.compress(msgDesc, payload)
+    assert len(compressed) < len(payload)
+    assert msgDesc.compression == msgs.CompressionType.ZLIB
+
+    msgDesc = transfer(msgDesc)
+    assert msgDesc.dictionaryId is not None
+    assert receiver.decompress(msgDesc, compressed) == payload
+
+    # small payloads and disabled types are sent as they are
+    msgDesc = msgs.MessageDescription("SampleEvent")
+    assert sender.compress(msgDesc, b"x" * 10) == b"x" * 10
+    msgDesc = msgs.MessageDescription("HelloMsg")
+    assert sender.compress(msgDesc, payload) == payload
+    assert "compression" not in msgDesc.serialize()
+
+
+def create_node(compressions):
+    msg = msgs.NodeInfoMsg()
+    msg.agent_uuid = "node"
+    msg.ip = msg.name = msg.hostname = ""
+    msg.compressions.extend(compressions)
+    # advertised compressions travel in NodeInfo
+    info = msgs.NodeInfoMsg()
+    info.ParseFromString(msg.SerializeToString())
+    return Node.create_node_from_msg(info)
+
+
+def test_receiver_without_selected_compression_gets_zlib():
+    # algorithm (and its level) available only in sender
+    sender = PayloadCompressor(enabled=True, threshold=64, level=19)
+    sender.compression = msgs.CompressionType.LZ4
+    receiver = PayloadCompressor()
+    payload = b"channel=11;power=20;rssi=-70;" * 10
+
+    node = create_node([msgs.CompressionType.ZLIB])
+    msgDesc = msgs.MessageDescription("SampleEvent")
+    compressed = sender.compress(msgDesc, payload, node.compressions)
+    assert msgDesc.compression == msgs.CompressionType.ZLIB
+    assert receiver.decompress(transfer(msgDesc), compressed) == payload
+
+    # unknown receivers, e.g. of broadcast, get zlib as well
+    msgDesc = msgs.MessageDescription("SampleEvent")
+    compressed = sender.compress(msgDesc, payload)
+    assert msgDesc.compression == msgs.CompressionType.ZLIB
+
+    node = create_node([msgs.CompressionType.ZLIB, msgs.CompressionType.LZ4])
+    assert sender.get_compression(node.compressions) == \
+        msgs.CompressionType.LZ4
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from uniflex.core import events
+from uniflex.core import modules
+from uniflex.core.common import PriorityLaneQueue
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class TelemetryEvent(events.EventBase):
+    priority = events.EventPriority.LOW
+
+    def __init__(self):
+        super().__init__()
+
+
+def test_control_events_are_high_priority():
+    high = events.EventPriority.HIGH
+    assert events.NodeLostEvent("timeout").priority == high
+    assert events.ConnectionLostEvent().priority == high
+    assert events.CommandEvent(ctx=None).priority == high
+    assert events.ReturnValueEvent(None, None).priority == high
+    assert events.TimeEvent().priority == events.EventPriority.NORMAL
+
+
+def test_lanes_are_served_in_strict_priority_order():
+    queue = PriorityLaneQueue(len(events.EventPriority))
+    for i in range(3):
+        e = TelemetryEvent()
+        queue.put((e.priority, ("telemetry", i)))
+    queue.put((events.EventPriority.NORMAL, ("normal", 0)))
+    queue.put((events.EventPriority.HIGH, ("reply", 0)))
+    queue.put((events.EventPriority.HIGH, ("reply", 1)))
+
+    assert queue.qsize() == 6
+    assert queue.lane_size(events.EventPriority.LOW) == 3
+    order = [queue.get() for _ in range(6)]
+    assert order == [("reply", 0), ("reply", 1), ("normal", 0),
+                     ("telemetry", 0), ("telemetry", 1), ("telemetry", 2)]
+    assert queue.empty()
+
+
+def test_on_event_priority_overrides_event_class():
+    @modules.on_event(TelemetryEvent, priority=events.EventPriority.HIGH)
+    def handler(event):
+        pass
+
+    @modules.on_event(TelemetryEvent)
+    def other_handler(event):
+        pass
+
+    assert handler.priority == events.EventPriority.HIGH
+    assert not hasattr(other_handler, "priority")
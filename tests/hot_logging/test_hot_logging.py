@@ -0,0 +1,47 @@
+import logging
+
+from uniflex.core.hot_logging import HotPathLogger
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class Argument(object):
+    def __init__(self):
+        self.formatted = 0
+
+    def __format__(self, spec):
+        self.formatted = self.formatted + 1
+        return "arg"
+
+
+def test_message_is_formatted_only_when_emitted(caplog):
+    logger = logging.getLogger("test.hot_logging.lazy")
+    hotLog = HotPathLogger(logger)
+    arg = Argument()
+
+    caplog.set_level(logging.INFO, logger=logger.name)
+    hotLog.debug("event {}", arg, node="n1")
+    assert arg.formatted == 0
+    assert not caplog.records
+
+    caplog.set_level(logging.DEBUG, logger=logger.name)
+    hotLog.debug("event {}", arg, node="n1")
+    assert caplog.records[0].getMessage() == "event arg node=n1"
+    assert caplog.records[0].fields == {"node": "n1"}
+    assert arg.formatted > 0
+
+
+def test_sampled_debug_logs_every_nth_message(caplog):
+    logger = logging.getLogger("test.hot_logging.sampled")
+    hotLog = HotPathLogger(logger, sampleEvery=10)
+    caplog.set_level(logging.DEBUG, logger=logger.name)
+
+    for i in range(25):
+        hotLog.sampled_debug("message {}", i)
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "message 0 sampled=10", "message 10 sampled=10",
+        "message 20 sampled=10"]
@@ -0,0 +1,48 @@
+import threading
+
+from uniflex.core.journal import Journal, RecordType, read_records
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_torn_and_corrupted_records_are_ignored(tmp_path):
+    path = str(tmp_path / "tx.journal")
+    journal = Journal(path)
+    journal.append(RecordType.PREPARE, "tx1", {"tasks": [1, 2]})
+    journal.append(RecordType.COMMIT, "tx1", True)
+    journal.close()
+    with open(path, "ab") as f:
+        f.write(b"\x00\x00\x00")
+
+    prepare = (RecordType.PREPARE, "tx1", {"tasks": [1, 2]})
+    assert read_records(path) == [prepare, (RecordType.COMMIT, "tx1", True)]
+
+    with open(path, "r+b") as f:
+        f.seek(-5, 2)
+        f.write(b"\xff")
+    assert read_records(path) == [prepare]
+
+
+def test_concurrent_syncs_share_fsync_and_checkpoint_truncates(tmp_path):
+    path = str(tmp_path / "tx.journal")
+    journal = Journal(path, groupDelay=0.05)
+
+    def commit(i):
+        journal.sync(journal.append(RecordType.PREPARE, "tx{}".format(i)))
+
+    threads = [threading.Thread(target=commit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(read_records(path)) == 8
+    assert journal.syncs < 8
+
+    journal.checkpoint([(RecordType.PREPARE, "tx7", None)])
+    journal.append(RecordType.END, "tx7")
+    journal.close()
+    assert read_records(path) == [(RecordType.PREPARE, "tx7", None),
+                                  (RecordType.END, "tx7", None)]
@@ -0,0 +1,89 @@
+import os
+import sys
+
+from uniflex.core import modules, events
+from uniflex.core.lazy_module import (ModuleMetadataCache, LazyDeviceModule,
+                                      create_lazy_module)
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class LazyDevice(modules.DeviceModule):
+    created = 0
+
+    def __init__(self, channel=1):
+        super().__init__()
+        LazyDevice.created = LazyDevice.created + 1
+        self.channel = channel
+        self.startCount = 0
+
+    def get_channel(self):
+        return self.channel
+
+    @modules.on_event(events.AgentStartEvent,
+                      priority=events.EventPriority.LOW)
+    def start(self):
+        self.startCount = self.startCount + 1
+
+
+def test_module_is_created_on_first_call(tmp_path):
+    path = str(tmp_path / "metadata.json")
+    cache = ModuleMetadataCache(path)
+    metadata = cache.load(__name__, "LazyDevice")
+    cache.save()
+    # second agent start reads metadata from disk
+    assert ModuleMetadataCache(path).get(__name__, "LazyDevice") == metadata
+    assert metadata["handlers"] == [["start", "uniflex.core.events",
+                                     "AgentStartEvent",
+                                     int(events.EventPriority.LOW)]]
+
+    LazyDevice.created = 0
+    stub = create_lazy_module("dev", __name__, "LazyDevice", metadata,
+                              "phy0", {"channel": 11})
+    assert isinstance(stub, LazyDeviceModule)
+    assert stub.functions == ["get_channel", "start"]
+    assert stub.module is None and LazyDevice.created == 0
+
+    assert stub.get_channel() == 11
+    assert LazyDevice.created == 1
+    assert stub.module.uuid == stub.uuid
+    assert stub.module.device == "phy0"
+    # module is stopped and monitored through worker of stub
+    assert stub.module.worker is stub.worker
+
+    forward = getattr(stub, "_lazy_start_AgentStartEvent")
+    forward(events.AgentStartEvent())
+    assert stub.module.startCount == 1
+
+
+def test_entry_is_invalid_after_base_class_changes(tmp_path):
+    (tmp_path / "lazy_base.py").write_text(
+        "from uniflex.core import modules\n\n\n"
+        "class BaseDevice(modules.DeviceModule):\n"
+        "    def get_channel(self):\n"
+        "        return 1\n")
+    (tmp_path / "lazy_device.py").write_text(
+        "from lazy_base import BaseDevice\n\n\n"
+        "class Device(BaseDevice):\n"
+        "    pass\n")
+    sys.path.insert(0, str(tmp_path))
+    try:
+        cache = ModuleMetadataCache(str(tmp_path / "metadata.json"))
+        metadata = cache.load("lazy_device", "Device")
+        assert metadata["modules"] == ["lazy_device", "lazy_base"]
+        assert cache.get("lazy_device", "Device") == metadata
+
+        # function added to base class only
+        path = str(tmp_path / "lazy_base.py")
+        with open(path, "a") as f:
+            f.write("\n    def set_channel(self, channel):\n"
+                    "        pass\n")
+        os.utime(path, (0, 0))
+        assert cache.get("lazy_device", "Device") is None
+    finally:
+        sys.path.remove(str(tmp_path))
+        sys.modules.pop("lazy_device", None)
+        sys.modules.pop("lazy_base", None)
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from uniflex.core.exceptions import EntityLockedException
+from uniflex.core.locks import LockManager, LockMode
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_shared_intention_and_exclusive_modes():
+    locks = LockManager()
+    locks.acquire("tx1", [("node", LockMode.INTENTION_SHARED),
+                          ("radio", LockMode.SHARED)])
+    locks.acquire("tx2", [("node", LockMode.INTENTION_EXCLUSIVE),
+                          ("radio2", LockMode.EXCLUSIVE)])
+    locks.acquire("tx3", [("node", LockMode.INTENTION_SHARED),
+                          ("radio", LockMode.SHARED)])
+
+    # whole node cannot be locked while its modules are used
+    with pytest.raises(EntityLockedException):
+        locks.acquire("tx4", [("node", LockMode.SHARED)])
+    with pytest.raises(EntityLockedException):
+        locks.acquire("tx4", [("node", LockMode.INTENTION_EXCLUSIVE),
+                              ("radio", LockMode.EXCLUSIVE)])
+    # locks granted before conflict are released
+    assert "tx4" not in locks.owned
+    assert set(locks.get_holders("node")) == {"tx1", "tx2", "tx3"}
+
+
+def test_waiting_owner_gets_lock_after_release():
+    locks = LockManager()
+    locks.acquire("tx1", [("radio", LockMode.EXCLUSIVE)])
+    timer = threading.Timer(0.1, locks.release, args=("tx1",))
+    timer.start()
+    locks.acquire("tx2", [("radio", LockMode.EXCLUSIVE)], timeout=5)
+    assert locks.get_holders("radio") == {"tx2": LockMode.EXCLUSIVE}
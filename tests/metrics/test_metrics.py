@@ -0,0 +1,65 @@
+import time
+
+from uniflex.core import modules, metrics
+from uniflex.core.agent import Agent
+from uniflex.core.metrics import MetricsRegistry
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    counter = registry.counter("msgs_total", "Messages", ["direction"])
+    counter.labels("in").inc(3)
+    histogram = registry.histogram("latency_seconds", "Latency",
+                                   buckets=[0.1, 1])
+    histogram.observe(0.5)
+    histogram.observe(2)
+
+    assert registry.snapshot()["msgs_total"] == {("in",): 3}
+    text = registry.to_prometheus()
+    assert "# TYPE msgs_total counter" in text
+    assert 'msgs_total{direction="in"} 3.0' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_count 2" in text
+
+
+def test_handler_latency_is_recorded():
+    class SlowModule(modules.UniFlexModule):
+        def handle(self):
+            time.sleep(0.01)
+
+    module = SlowModule()
+    metrics.registry.enabled = True
+    try:
+        module.worker.add_task(module.handle, None)
+        module.worker.taskQueue.join()
+    finally:
+        metrics.registry.enabled = False
+        module.worker.stop()
+
+    value = metrics.handlerExecutionTime.labels("SlowModule.handle").get()
+    assert value["count"] == 1
+    assert value["sum"] >= 0.01
+
+
+def test_mailbox_depth_of_each_module_instance():
+    class Worker(modules.UniFlexModule):
+        pass
+
+    moduleManager = Agent().moduleManager
+    first = moduleManager.add_module_obj("worker", Worker())
+    second = moduleManager.add_module_obj("worker", Worker())
+    depths = metrics.registry.snapshot()["uniflex_module_mailbox_depth"]
+    assert ("Worker", "", first.uuid) in depths
+    assert ("Worker", "", second.uuid) in depths
+
+    moduleManager.remove_module(first.uuid)
+    depths = metrics.registry.snapshot()["uniflex_module_mailbox_depth"]
+    assert ("Worker", "", first.uuid) not in depths
+    assert ("Worker", "", second.uuid) in depths
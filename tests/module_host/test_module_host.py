@@ -0,0 +1,169 @@
+import os
+import time
+import types
+
+import pytest
+
+from uniflex.core import modules, events, serialization
+from uniflex.core.module_host import (ModuleHost, ModuleHostProcess,
+                                      BridgeDecodeError)
+from uniflex.core.node import Node
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def _restore_in_process(pid):
+    if os.getpid() != pid:
+        raise ValueError("object cannot leave process {}".format(pid))
+
+
+class ProcessBound(object):
+    # can be unpickled only in process that created it
+    def __reduce__(self):
+        return _restore_in_process, (os.getpid(),)
+
+
+class HostedDevice(modules.DeviceModule):
+    def __init__(self, channel=1):
+        super().__init__()
+        self.channel = channel
+
+    def get_channel(self):
+        return self.channel
+
+    def get_pid(self):
+        return os.getpid()
+
+    def fail(self):
+        raise ValueError("boom")
+
+
+class Thing(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class UndecodableDevice(modules.DeviceModule):
+    def get_bound(self):
+        return ProcessBound()
+
+    def get_thing(self):
+        return Thing(3)
+
+    def get_value(self):
+        return 1
+
+
+class NotifyEvent(events.EventBase):
+    pass
+
+
+class NotifyingDevice(modules.DeviceModule):
+    def notify(self, nodeUuid):
+        self.send_event(NotifyEvent(), Node(nodeUuid))
+
+
+class CrashingDevice(modules.DeviceModule):
+    def crash_worker(self):
+        # exception in handler ends worker thread
+        self.worker.add_task(self._fail, None)
+
+    def _fail(self):
+        raise ValueError("boom")
+
+
+class ShardApp(modules.ControlApplication):
+    def get_pid(self):
+        return os.getpid()
+
+    def get_node_names(self):
+        return sorted(n.name for n in self.moduleManager.nodes.values())
+
+
+def test_functions_are_called_in_child_process():
+    host = ModuleHost("dev", __name__, "HostedDevice", "phy0",
+                      {"channel": 11})
+    try:
+        assert host.functions == ["fail", "get_channel", "get_pid"]
+        assert host.get_channel() == 11
+        assert host.get_pid() == host.process.pid != os.getpid()
+        with pytest.raises(ValueError):
+            host.fail()
+    finally:
+        host.stop_host()
+    assert host.process.returncode == 0
+
+
+def test_shard_hosts_modules_with_node_replicas():
+    hostProcess = ModuleHostProcess("shard-0")
+    dev = ModuleHost("dev", __name__, "HostedDevice", "phy0", {},
+                     hostProcess)
+    app = ModuleHost("app", __name__, "ShardApp", None, {}, hostProcess)
+    hostProcess.start()
+    try:
+        assert dev.get_pid() == app.get_pid() == hostProcess.process.pid
+
+        node = Node("remote-uuid")
+        node.name = "remote"
+        node.add_module_proxy(dev)
+        hostProcess.replicate_node(node)
+        assert app.get_node_names() == ["remote"]
+
+        hostProcess.remove_node(node.uuid)
+        assert app.get_node_names() == []
+    finally:
+        hostProcess.stop()
+    assert hostProcess.process.returncode == 0
+
+
+def test_host_exits_when_worker_died():
+    host = ModuleHost("dev", __name__, "CrashingDevice", "phy0", {})
+    host.crash_worker()
+    host.stop_host(timeout=4)
+    assert host.process.returncode == 0
+
+
+def test_undecodable_return_value_fails_only_its_call():
+    host = ModuleHost("dev", __name__, "UndecodableDevice", "phy0", {})
+    try:
+        with pytest.raises(BridgeDecodeError) as error:
+            host.get_bound()
+        assert "cannot leave process" in str(error.value)
+        # receive thread keeps serving other calls
+        assert host.get_value() == 1
+    finally:
+        host.stop_host()
+
+
+def test_unicast_event_of_hosted_module_keeps_destination():
+    host = ModuleHost("dev", __name__, "NotifyingDevice", "phy0", {})
+    node = Node("node-1")
+    sent = []
+    host.agent = types.SimpleNamespace(nodeManager=types.SimpleNamespace(
+        get_node_by_uuid={node.uuid: node}.get))
+    host.send_event = lambda event, dstNode=None: sent.append(
+        (event, dstNode))
+    try:
+        host.notify(node.uuid)
+        for i in range(200):
+            if sent:
+                break
+            time.sleep(0.01)
+        assert len(sent) == 1
+        assert isinstance(sent[0][0], NotifyEvent)
+        assert sent[0][1] is node
+    finally:
+        host.stop_host()
+
+
+def test_whitelist_does_not_apply_to_host_bridge():
+    host = ModuleHost("dev", __name__, "UndecodableDevice", "phy0", {})
+    serialization.set_whitelist(["mypkg."])
+    try:
+        assert host.get_thing().value == 3
+    finally:
+        serialization.set_whitelist(None)
+        host.stop_host()
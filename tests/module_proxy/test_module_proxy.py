@@ -0,0 +1,34 @@
+import threading
+
+from uniflex.core.module_proxy import DeviceProxy
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_call_ids_are_unique_among_proxies():
+    # replies of calls fanned out to many devices are matched by call id
+    proxies = [DeviceProxy() for i in range(4)]
+    callIds = [proxy.generate_call_id() for proxy in proxies * 2]
+    assert len(set(callIds)) == len(callIds)
+
+
+def test_call_options_are_kept_per_thread():
+    proxy = DeviceProxy()
+    # returns calling context instead of sending it
+    proxy._send_cmd_event = lambda ctx: ctx
+    proxy.blocking(False).timeout(1)
+
+    contexts = []
+    thread = threading.Thread(
+        target=lambda: contexts.append(proxy.get_channel()))
+    thread.start()
+    thread.join()
+    assert contexts[0]._blocking is True
+    assert contexts[0]._timeout is None
+
+    ctx = proxy.get_channel()
+    assert ctx._blocking is False
+    assert ctx._timeout == 1
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import uniflex.msgs as msgs
+from uniflex.core import modules
+from uniflex.core.agent import Agent
+from uniflex.core.module_manager import ModuleManager
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class SimpleDevice(modules.DeviceModule):
+    def __init__(self):
+        super().__init__()
+
+    def set_channel(self, channel):
+        return channel
+
+
+class RecordingChannel(object):
+    def __init__(self):
+        self.connected = True
+        self.sent = []
+
+    def send(self, msgContainer):
+        topic, msgDesc, msg = msgContainer
+        if not isinstance(msg, bytes):
+            msg = msg.SerializeToString()
+        self.sent.append([topic, msgDesc, msg])
+
+
+def create_agent(name):
+    agent = Agent()
+    agent.name = name
+    agent.ip = "127.0.0.1"
+    agent.info = name
+    agent.nodeManager.create_local_node(agent)
+    agent.nodeManager._transportChannel = RecordingChannel()
+    return agent
+
+
+def add_device(agent, deviceName):
+    device = SimpleDevice()
+    device.device = deviceName
+    agent.moduleManager.add_module_obj("device", device)
+    agent.nodeManager.get_local_node().add_module_proxy(device)
+    return device
+
+
+def test_node_info_is_cached_until_modules_change():
+    agent = create_agent("ap1")
+    add_device(agent, "phy0")
+
+    nodeManager = agent.nodeManager
+    infoHash = nodeManager.get_node_info_hash()
+    _, cached = nodeManager._update_node_info()
+    assert nodeManager._update_node_info()[1] is cached
+
+    add_device(agent, "phy1")
+    assert nodeManager.get_node_info_hash() != infoHash
+
+
+def test_peer_applies_delta_and_detects_stale_hash():
+    ap = create_agent("ap1")
+    controller = create_agent("controller")
+    device = add_device(ap, "phy0")
+
+    # controller learns full description of ap
+    ap.nodeManager.send_node_info()
+    controller.nodeManager.serve_node_info_msg(
+        ap.nodeManager._transportChannel.sent.pop())
+    node = controller.nodeManager.get_node_by_uuid(ap.uuid)
+    node._stop = True
+    assert node.infoHash == ap.nodeManager.get_node_info_hash()
+    assert node.get_device_by_name("phy0") is not None
+
+    # module added and removed at runtime produces deltas
+    add_device(ap, "phy1")
+    ap.moduleManager.remove_module(device.uuid)
+    sent = ap.nodeManager._transportChannel.sent
+    deltas = [m for m in sent
+              if m[1].msgType == msgs.get_msg_type(msgs.NodeInfoDelta)]
+    assert len(deltas) == 2
+    for delta in deltas:
+        controller.nodeManager.serve_node_info_delta(delta)
+
+    assert node.infoHash == ap.nodeManager.get_node_info_hash()
+    assert node.get_device_by_name("phy0") is None
+    assert node.get_device_by_name("phy1") is not None
+
+    # delta with unknown base hash triggers full node info request
+    requests = controller.nodeManager._transportChannel.sent
+    delta = msgs.NodeInfoDelta()
+    delta.agent_uuid = ap.uuid
+    delta.base_hash = "unknown"
+    delta.info_hash = "new"
+    controller.nodeManager.serve_node_info_delta(
+        ["NODE_INFO", None, delta.SerializeToString()])
+    assert requests[-1][0] == ap.uuid
+    assert (requests[-1][1].msgType ==
+            msgs.get_msg_type(msgs.NodeInfoRequest))
+
+
+def test_unanswered_node_info_request_is_repeated():
+    ap = create_agent("ap1")
+    controller = create_agent("controller")
+    add_device(ap, "phy0")
+
+    ap.nodeManager.send_node_info()
+    controller.nodeManager.serve_node_info_msg(
+        ap.nodeManager._transportChannel.sent.pop())
+    node = controller.nodeManager.get_node_by_uuid(ap.uuid)
+    node._stop = True
+
+    def is_request(m):
+        return m[1].msgType == msgs.get_msg_type(msgs.NodeInfoRequest)
+
+    hello = msgs.HelloMsg(uuid=ap.uuid, timeout=10, info_hash="changed")
+    requests = controller.nodeManager._transportChannel.sent
+    controller.nodeManager._serve_hello(hello)
+    controller.nodeManager._serve_hello(hello)
+    assert len([m for m in requests if is_request(m)]) == 1
+
+    # request got lost, next hello after timeout asks again
+    node._requestedInfoTime -= controller.nodeManager.nodeInfoRequestTimeout
+    controller.nodeManager._serve_hello(hello)
+    assert len([m for m in requests if is_request(m)]) == 2
+
+
+def test_directory_announces_joiner_and_serves_snapshot():
+    import json
+    from uniflex.core.directory import NodeDirectory
+
+    directory = NodeDirectory()
+    frames = {}
+    for name in ["ap1", "ap2"]:
+        agent = create_agent(name)
+        add_device(agent, "phy0")
+        agent.nodeManager.send_node_info("DIRECTORY")
+        topic, msgDesc, msg = agent.nodeManager._transportChannel.sent[-1]
+        msgDesc.sourceUuid = agent.uuid
+        msgDesc = json.dumps(msgDesc.serialize()).encode('utf-8')
+        frames[agent.uuid] = [topic.encode('utf-8'), msgDesc, msg]
+
+    uuids = list(frames.keys())
+    assert len(directory.process_msg(frames[uuids[0]])) == 2
+    announcement, snapshot = directory.process_msg(frames[uuids[1]])
+
+    assert announcement[0] == b"NODE_INFO"
+    assert announcement[2] == frames[uuids[1]][2]
+    assert snapshot[0] == uuids[1].encode('utf-8')
+    snapshotMsg = msgs.NodeInfoSnapshot()
+    snapshotMsg.ParseFromString(snapshot[2])
+    assert [n.agent_uuid for n in snapshotMsg.nodes] == [uuids[0]]
+
+    # other traffic is ignored
+    assert directory.process_msg([b"PingEvent", b"{}", b""]) == []
+
+
+def test_broker_aggregates_hellos_and_traffic():
+    import json
+    from uniflex.core.liveness import HelloAggregator
+
+    aggregator = HelloAggregator(interval=0)
+
+    def frames(topic, msgType, src, payload=b""):
+        msgDesc = msgs.MessageDescription(msgType, src)
+        msgDesc = json.dumps(msgDesc.serialize()).encode('utf-8')
+        return [topic, msgDesc, payload]
+
+    hello = msgs.HelloMsg(uuid="ap1", timeout=10, info_hash="abc")
+    assert aggregator.process_msg(frames(b"HELLO_MSG", "HelloMsg", "ap1",
+                                         hello.SerializeToString()))
+    assert not aggregator.process_msg(frames(b"PingEvent", "PingEvent",
+                                             "ap2"))
+
+    message = aggregator.create_aggregate_msg()
+    assert message[0] == b"HELLO_MSG"
+    msg = msgs.HelloAggregateMsg()
+    msg.ParseFromString(message[2])
+    hellos = {h.uuid: h for h in msg.hellos}
+    assert hellos["ap1"].info_hash == "abc"
+    assert not hellos["ap2"].HasField("info_hash")
+
+    # nothing seen during last interval
+    assert aggregator.create_aggregate_msg() is None
+
+
+def test_modules_are_managed_without_node_manager():
+    moduleManager = ModuleManager(Agent())
+    device = moduleManager.add_module_obj("dev", SimpleDevice())
+    assert moduleManager.remove_module(device.uuid) is device
+    assert moduleManager.get_module_by_uuid(device.uuid) is None
@@ -0,0 +1,64 @@
+from uniflex.core.agent import Agent
+from uniflex.core.profiling import (HookRegistry, HookPoint, HandlerProfiler,
+                                    TimeAccounting, AllocationTracer)
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class Module(object):
+    name = "TestModule"
+    uuid = "uuid"
+
+    def handler(self):
+        return [str(i) for i in range(1000)]
+
+
+def run_handler(hooks, module):
+    states = hooks.before(HookPoint.HANDLER, module, "handler")
+    module.handler()
+    hooks.after(HookPoint.HANDLER, module, "handler", states)
+
+
+def test_profilers_record_handlers_while_registered():
+    hooks = HookRegistry()
+    module = Module()
+    accounting = TimeAccounting()
+    profiler = HandlerProfiler(sampleRate=1.0)
+    tracer = AllocationTracer("TestModule")
+    for hook in [accounting, profiler, tracer]:
+        hook.start()
+        hooks.add(hook)
+    assert hooks.enabled
+    # serialization is not hooked by these profilers
+    assert hooks.before(HookPoint.SERIALIZE, None, "Event") is None
+
+    for i in range(3):
+        run_handler(hooks, module)
+    allocations = tracer.get_report()
+    for hook in [accounting, profiler, tracer]:
+        hooks.remove(hook)
+        hook.stop()
+    assert not hooks.enabled
+    run_handler(hooks, module)
+
+    assert accounting.get_report()["TestModule"]["calls"] == 3
+    report = profiler.get_report()
+    assert report["TestModule.handler"]["samples"] == 3
+    assert any("handler" in entry[0]
+               for entry in report["TestModule.handler"]["top"])
+    assert allocations["handlers"]["handler"]["calls"] == 3
+
+
+def test_profiling_service_is_enabled_by_config():
+    # service is disabled by default
+    for options, enabled in [({}, False), ({'profiling': True}, True)]:
+        config = {'name': 'agent', 'type': 'local', 'iface': 'lo'}
+        config.update(options)
+        agent = Agent()
+        agent.load_config({'config': config})
+        localNode = agent.nodeManager.get_local_node()
+        proxy = localNode.all_modules.get_by_name("ProfilingService")
+        assert (proxy is not None) == enabled
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from uniflex.core.registry import ModuleRegistry
+from uniflex.core.module_proxy import ModuleProxy, DeviceProxy
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def create_proxy(cls, uuid, name, deviceName=None):
+    proxy = cls()
+    proxy.uuid = uuid
+    proxy.name = name
+    proxy.deviceName = deviceName
+    return proxy
+
+
+def test_lookup_by_uuid_name_device_and_class():
+    registry = ModuleRegistry(deviceAttr="deviceName")
+    wifi0 = create_proxy(DeviceProxy, "1", "WifiModule", "phy0")
+    wifi1 = create_proxy(DeviceProxy, "2", "WifiModule", "phy1")
+    app = create_proxy(ModuleProxy, "3", "MyApp")
+    for p in [wifi0, wifi1, app]:
+        registry.add(p)
+
+    assert len(registry) == 3
+    assert registry["2"] is wifi1
+    assert registry.get_by_uuid("3") is app
+    assert registry.get_by_name("WifiModule") is wifi0
+    assert registry.get_all_by_name("WifiModule") == [wifi0, wifi1]
+    assert registry.get_by_device("phy1") is wifi1
+    assert registry.get_by_device("phy7") is None
+    assert registry.get_by_class(DeviceProxy) == [wifi0, wifi1]
+    assert registry.get_by_class(ModuleProxy) == [wifi0, wifi1, app]
+
+
+def test_remove_drops_all_indexes():
+    registry = ModuleRegistry(deviceAttr="deviceName")
+    wifi0 = create_proxy(DeviceProxy, "1", "WifiModule", "phy0")
+    registry["1"] = wifi0
+    del registry["1"]
+
+    assert "1" not in registry
+    assert registry.get_by_name("WifiModule") is None
+    assert registry.get_by_device("phy0") is None
+    assert registry.get_by_class(DeviceProxy) == []
@@ -0,0 +1,106 @@
+import pickle
+
+import pytest
+
+from uniflex.core import serialization
+from uniflex.msgs import SerializationType
+from uniflex.core.events import EventBase
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class SamplesEvent(EventBase):
+    def __init__(self, raw=None, view=None, name=None):
+        super().__init__()
+        self.raw = raw
+        self.view = view
+        self.name = name
+
+
+def test_large_buffers_are_sent_out_of_band():
+    raw = bytes(range(256)) * 1024
+    view = memoryview(bytearray(b"v" * 100000))
+    event = SamplesEvent(pickle.PickleBuffer(raw), view, b"small")
+    data, buffers, sType = serialization.dumps(event)
+    assert len(buffers) == 2
+    assert len(data) < 1024
+
+    # receiver gets buffers as frames
+    frames = [bytearray(b) for b in buffers]
+    event = serialization.loads(data, frames)
+    assert bytes(event.raw) == raw
+    assert event.name == b"small"
+    assert isinstance(event.view, memoryview)
+    frames[1][0] = ord("x")
+    assert event.view[0] == ord("x")
+
+
+class LambdaEvent(EventBase):
+    def __init__(self):
+        super().__init__()
+        self.callback = lambda x: x + 1
+
+
+class RawEvent(EventBase):
+    def __init__(self, value=0):
+        super().__init__()
+        self.value = value
+
+
+def test_type_pinned_to_dill_and_codec():
+    data, buffers, sType = serialization.dumps(LambdaEvent())
+    assert sType == SerializationType.DILL
+    assert serialization._typeSerializers[LambdaEvent] == sType
+    event = serialization.loads(data, buffers, sType)
+    assert event.callback(1) == 2
+
+    serialization.register_codec(
+        RawEvent, lambda e: str(e.value).encode(),
+        lambda data: RawEvent(int(bytes(data))))
+    data, buffers, sType = serialization.dumps(RawEvent(5))
+    assert (data, sType) == (b"5", SerializationType.CODEC)
+    assert serialization.loads(data, buffers, sType, "RawEvent").value == 5
+
+
+class OtherEvent(EventBase):
+    pass
+
+
+def test_whitelist_rejects_unknown_types():
+    allowed, _, _ = serialization.dumps(SamplesEvent(name=b"x"))
+    denied, _, _ = serialization.dumps(LambdaEvent())
+    serialization.set_whitelist([SamplesEvent])
+    try:
+        assert serialization.loads(allowed).name == b"x"
+        with pytest.raises(pickle.UnpicklingError):
+            serialization.loads(denied, (), SerializationType.DILL)
+        # data from processes of the same agent are not restricted
+        assert serialization.loads(denied, (), SerializationType.DILL,
+                                   trusted=True).callback(1) == 2
+        payload = pickle.dumps(OtherEvent())
+        with pytest.raises(pickle.UnpicklingError):
+            serialization.loads(payload)
+    finally:
+        serialization.set_whitelist(None)
+
+
+def test_whitelist_rejects_dotted_names_and_non_event_types():
+    # resolves uniflex.core.journal.os.getcwd without check of name
+    payload = (b"\x80\x04\x95\x00\x00\x00\x00\x00\x00\x00\x00"
+               b"\x8c\x14uniflex.core.journal\x94\x8c\tos.getcwd\x94"
+               b"\x93\x94)R\x94.")
+    serialization.set_whitelist(['mypkg.'])
+    try:
+        with pytest.raises(pickle.UnpicklingError):
+            serialization.loads(payload)
+        # core module prefix allows only events and exceptions
+        with pytest.raises(pickle.UnpicklingError):
+            serialization.loads(pickle.dumps(
+                serialization.OutOfBandPickler, protocol=4))
+        assert isinstance(serialization.loads(pickle.dumps(
+            ValueError("x"))), ValueError)
+    finally:
+        serialization.set_whitelist(None)
@@ -0,0 +1,127 @@
+import json
+import time
+import uuid
+import threading
+
+import uniflex.msgs as msgs
+from uniflex.core import events, modules, tracing
+from uniflex.core.agent import Agent
+from uniflex.core.tracing import Tracer, FileSpanExporter, SpanKind
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_spans_are_exported_as_otlp_json(tmp_path):
+    path = str(tmp_path / "traces.json")
+    tracer = Tracer()
+    tracer.configure(FileSpanExporter(path, "test"))
+
+    root = tracer.start_span("call get_channel", kind=SpanKind.CLIENT)
+    # context travels in message header
+    msgDesc = msgs.MessageDescription("CommandEvent", "uuid",
+                                      traceContext=root.context)
+    received = msgs.MessageDescription.parse(
+        json.loads(json.dumps(msgDesc.serialize())))
+    tracer.record_span("execute get_channel", received.traceContext,
+                       root.start, root.start + 1000, SpanKind.SERVER)
+    root.end()
+    tracer.shutdown()
+
+    with open(path) as f:
+        request = json.loads(f.readline())
+    resource = request["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"] == {
+        "stringValue": "test"}
+    child, parent = resource["scopeSpans"][0]["spans"]
+    assert parent["name"] == "call get_channel"
+    assert "parentSpanId" not in parent
+    assert child["traceId"] == parent["traceId"]
+    assert child["parentSpanId"] == parent["spanId"]
+    assert child["kind"] == int(SpanKind.SERVER)
+    assert child["endTimeUnixNano"] == str(root.start + 1000)
+
+
+class Store(modules.DeviceModule):
+    def append_value(self, values, value):
+        return values + [value]
+
+
+class Controller(modules.ControlApplication):
+    @modules.on_event(events.NewNodeEvent)
+    def add_node(self, event):
+        self._add_node(event.node)
+
+
+def create_agents():
+    url = "inproc://tracing-{}".format(uuid.uuid4())
+    config = {'type': 'global', 'iface': 'lo', 'discovery': 'directory',
+              'sub': url + "-xpub", 'pub': url + "-xsub"}
+    controller = Agent()
+    controller.load_config({
+        'config': dict(config, name='controller', info='controller'),
+        'broker': {'xpub': config['sub'], 'xsub': config['pub'],
+                   'directory': True},
+        'control_applications': {
+            'controller': {'module': __name__, 'class_name': 'Controller'}}})
+    agent = Agent()
+    agent.load_config({
+        'config': dict(config, name='agent', info='agent'),
+        'modules': {'store': {'module': __name__, 'class_name': 'Store',
+                              'devices': ['dev0']}}})
+    controller.moduleManager.start()
+    agent.moduleManager.start()
+    app = controller.moduleManager.modules.get_by_name("Controller")
+    # agent drops calls of nodes it does not know yet
+    for i in range(500):
+        if (app.get_nodes() and
+                agent.nodeManager.get_node_by_uuid(controller.uuid)):
+            break
+        time.sleep(0.01)
+    node = list(app.get_nodes())[0]
+    return controller, agent, app, list(node.get_devices())[0]
+
+
+def read_spans(path):
+    spans = []
+    with open(path) as f:
+        for line in f:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return spans
+
+
+def test_remote_call_spans_form_one_chain(tmp_path):
+    path = str(tmp_path / "traces.json")
+    tracing.tracer.configure(FileSpanExporter(path, "test"))
+    controller, agent, app, store = create_agents()
+    try:
+        threading.current_thread().module = app
+        assert store.blocking(True).append_value([1], 2) == [1, 2]
+        # receiver ends its spans after reply is delivered
+        for i in range(100):
+            tracing.tracer.flush()
+            spans = {s["name"]: s for s in read_spans(path)
+                     if s["name"] != "decode"}
+            if "receive ReturnValueEvent" in spans:
+                break
+            time.sleep(0.01)
+    finally:
+        del threading.current_thread().module
+        tracing.tracer.shutdown()
+        controller.stop()
+        agent.stop()
+
+    chain = ["call append_value", "send CommandEvent",
+             "receive CommandEvent", "execute append_value", "reply",
+             "send ReturnValueEvent", "receive ReturnValueEvent"]
+    root = spans[chain[0]]
+    assert "parentSpanId" not in root
+    assert root["kind"] == int(SpanKind.CLIENT)
+    assert spans["execute append_value"]["kind"] == int(SpanKind.SERVER)
+    for parent, child in zip(chain, chain[1:]):
+        assert spans[child]["traceId"] == root["traceId"]
+        assert spans[child]["parentSpanId"] == spans[parent]["spanId"]
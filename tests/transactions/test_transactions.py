@@ -0,0 +1,367 @@
+import time
+import uuid
+import threading
+
+from uniflex.core import modules
+from uniflex.core import events
+from uniflex.core.agent import Agent
+from uniflex.core.exceptions import FunctionCallTimeoutException
+from uniflex.core.journal import Journal, RecordType, read_records
+from uniflex.core.locks import LockMode
+from uniflex.core.transactions import Transaction, Task
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class Radio(modules.DeviceModule):
+    def __init__(self, maxChannel=13):
+        super().__init__()
+        self.channel = 1
+        self.maxChannel = maxChannel
+
+    def get_channel(self):
+        return self.channel
+
+    def set_channel(self, channel):
+        if channel > self.maxChannel:
+            raise ValueError("channel {} not supported".format(channel))
+        self.channel = channel
+
+
+class Coordinator(modules.ControlApplication):
+    pass
+
+
+def create_agent(transactions=True):
+    agent = Agent()
+    agent.load_config({
+        'config': {'name': 'agent', 'type': 'local', 'iface': 'lo',
+                   'transactions': transactions},
+        'control_applications': {
+            'coordinator': {'module': __name__, 'class_name': 'Coordinator'}},
+        'modules': {
+            'radio': {'module': __name__, 'class_name': 'Radio',
+                      'devices': ['wlan0']},
+            'radio_5g': {'module': __name__, 'class_name': 'Radio',
+                         'devices': ['wlan1'], 'kwargs': {'maxChannel': 11}}}})
+    get = agent.moduleManager.modules.get_by_name
+    return agent, get("Coordinator"), get("TransactionModule")
+
+
+class Controller(modules.ControlApplication):
+    @modules.on_event(events.NewNodeEvent)
+    def add_node(self, event):
+        self._add_node(event.node)
+
+    def get_devices(self):
+        return [device for node in self.get_nodes()
+                if node.uuid != self.localNode.uuid
+                for device in node.get_devices()]
+
+
+def create_agents(transactions=True):
+    # controller and agent connected through inproc broker of agent,
+    # so that controller can exit alone
+    url = "inproc://transactions-{}".format(uuid.uuid4())
+    config = {'type': 'global', 'iface': 'lo', 'discovery': 'directory',
+              'sub': url + "-xpub", 'pub': url + "-xsub"}
+    agent = Agent()
+    agent.load_config({
+        'config': dict(config, name='agent', info='agent',
+                       transactions=transactions),
+        'broker': {'xpub': config['sub'], 'xsub': config['pub'],
+                   'directory': True},
+        'modules': {
+            'radio': {'module': __name__, 'class_name': 'Radio',
+                      'devices': ['wlan0', 'wlan1']}}})
+    controller = Agent()
+    controller.load_config({
+        'config': dict(config, name='controller', info='controller'),
+        'control_applications': {
+            'controller': {'module': __name__, 'class_name': 'Controller'}}})
+    agent.moduleManager.start()
+    controller.moduleManager.start()
+
+    app = controller.moduleManager.modules.get_by_name("Controller")
+    # agent drops calls of nodes it does not know yet
+    for i in range(500):
+        if (len(app.get_devices()) == 2 and
+                agent.nodeManager.get_node_by_uuid(controller.uuid)):
+            break
+        time.sleep(0.01)
+    participant = agent.moduleManager.modules.get_by_name(
+        "TransactionModule")
+    return controller, agent, app, participant
+
+
+def create_transaction(app, channel, devices=None):
+    task = Task()
+    task.set_entities(devices or list(app.localNode.get_devices()))
+    task.set_save_point_func("get_channel")
+    task.set_function("set_channel", [channel])
+    transaction = Transaction(module=app, timeout=2)
+    transaction.add_task(task)
+    return transaction
+
+
+def test_commit_is_executed_on_all_entities():
+    agent, app, participant = create_agent()
+    transaction = create_transaction(app, 6)
+    transaction.commit()
+
+    assert transaction.is_executed()
+    assert [m.channel for m in agent.moduleManager.modules.get_by_class(
+        Radio)] == [6, 6]
+    # confirmation is sent without waiting for it
+    for i in range(100):
+        if not participant.transactions:
+            break
+        time.sleep(0.01)
+    assert participant.transactions == {}
+    assert participant.locks.locks == {}
+
+
+def test_failed_entity_rolls_back_whole_transaction():
+    agent, app, participant = create_agent()
+    transaction = create_transaction(app, 12)
+    transaction.commit()
+
+    assert transaction.is_rolled_back()
+    assert "do_commit" in str(transaction.error)
+    assert [m.channel for m in agent.moduleManager.modules.get_by_class(
+        Radio)] == [1, 1]
+    assert participant.locks.locks == {}
+
+
+def is_free(lock):
+    # lock is reentrant, so it is probed from other thread
+    free = []
+
+    def probe():
+        if lock.acquire(timeout=0.5):
+            lock.release()
+            free.append(True)
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    return free == [True]
+
+
+def test_module_functions_run_without_participant_lock():
+    agent, app, participant = create_agent()
+    probes = []
+    for radio in agent.moduleManager.modules.get_by_class(Radio):
+        get_channel, set_channel = radio.get_channel, radio.set_channel
+        radio.get_channel = lambda f=get_channel: (
+            probes.append(is_free(participant.lock)) or f())
+        radio.set_channel = lambda c, f=set_channel: (
+            probes.append(is_free(participant.lock)) or f(c))
+    # second radio fails, first one is rolled back
+    transaction = create_transaction(app, 12)
+    transaction.commit()
+
+    assert transaction.is_rolled_back()
+    assert [m.channel for m in agent.moduleManager.modules.get_by_class(
+        Radio)] == [1, 1]
+    # save points, functions and rollback of radio that ran first
+    assert probes in ([True] * 3, [True] * 5)
+    assert participant.transactions == {}
+    assert participant.locks.locks == {}
+
+
+def test_commit_rolled_back_when_coordinator_does_not_confirm():
+    agent, app, participant = create_agent()
+    radio = agent.moduleManager.modules.get_by_name("Radio")
+    participant.checkInterval = 0.05
+    participant.start_deadline_timer()
+    try:
+        assert participant.rx_can_commit(
+            "tx", "controller", [[radio.uuid, LockMode.EXCLUSIVE]], 1)
+        assert participant.rx_pre_commit(
+            "tx", [[radio.uuid, [["set_channel", [6], {"function":
+                                                       "get_channel"}]]]])
+        assert participant.rx_do_commit("tx", True, 0.1)
+        assert radio.channel == 6
+        time.sleep(0.5)
+        assert radio.channel == 1
+        assert participant.transactions == {}
+    finally:
+        participant.stop_deadline_timer()
+
+
+def test_transactions_in_flight_are_recovered_from_journal(tmp_path):
+    path = str(tmp_path / "tx.journal")
+    journal = Journal(path)
+    for txId, device, channel in [("replayed", "wlan0", 6),
+                                  ("rolled_back", "wlan1", 9)]:
+        journal.append(RecordType.PREPARE, txId, {
+            "coordinator": "controller",
+            "tasks": [["Radio", device, "set_channel", [channel], [3]]]})
+        journal.append(RecordType.COMMIT, txId, txId == "rolled_back")
+    journal.append(RecordType.PREPARE, "not_commited", {
+        "coordinator": "controller",
+        "tasks": [["Radio", "wlan0", "set_channel", [11], [3]]]})
+    journal.close()
+
+    agent, app, participant = create_agent({'journal': path})
+    participant.start_deadline_timer()
+    participant.stop_deadline_timer()
+
+    radios = agent.moduleManager.modules.get_by_class(Radio)
+    assert {m.device: m.channel for m in radios} == {"wlan0": 6, "wlan1": 3}
+    assert read_records(path) == []
+
+
+def test_concurrent_transactions_are_isolated():
+    agent, app, participant = create_agent()
+    radios = list(app.localNode.get_devices())
+    # second transaction waits for first one to release radio
+    participant.locks.acquire("other", [(radios[0].uuid, LockMode.SHARED)])
+    reader = Transaction(module=app, lockRetries=0)
+    reader.add_lock(radios[0], LockMode.SHARED)
+    reader.commit()
+    assert reader.is_executed()
+
+    transaction = create_transaction(app, 6)
+    transaction.lockRetries = 0
+    transaction.commit()
+    assert transaction.is_rolled_back()
+    assert "locked" in str(transaction.error)
+
+    threading.Timer(0.05, participant.locks.release, args=("other",)).start()
+    transaction = create_transaction(app, 6)
+    transaction.lockRetries = 8
+    transaction.commit()
+    assert transaction.is_executed()
+
+
+def test_checkpoint_before_sync_keeps_commit_record(tmp_path):
+    path = str(tmp_path / "tx.journal")
+    agent, app, participant = create_agent({'journal': path})
+    radio = agent.moduleManager.modules.get_by_name("Radio")
+    sync = participant.journal.sync
+    records = []
+
+    def checkpoint_and_sync(lsn=None):
+        # checkpoint of timer thread between append and sync of commit
+        participant.checkpoint()
+        records.append(read_records(path))
+        sync(lsn)
+
+    assert participant.rx_can_commit(
+        "tx", "controller", [[radio.uuid, LockMode.EXCLUSIVE]], 1)
+    assert participant.rx_pre_commit(
+        "tx", [[radio.uuid, [["set_channel", [6], {"args": [1]}]]]])
+    participant.journal.sync = checkpoint_and_sync
+    assert participant.rx_do_commit("tx")
+    participant.journal.close()
+
+    assert [r[0] for r in records[-1]] == [RecordType.PREPARE,
+                                          RecordType.COMMIT]
+    assert [r[0] for r in read_records(path)] == [RecordType.PREPARE,
+                                                  RecordType.COMMIT]
+
+
+def test_remote_commits_share_journal_syncs(tmp_path):
+    path = str(tmp_path / "tx.journal")
+    controller, agent, app, participant = create_agents(
+        {'journal': path, 'groupDelay': 0.05})
+    try:
+        # one transaction per radio, phases arrive at the same time
+        transactions = [create_transaction(app, 6, [device])
+                        for device in app.get_devices()]
+        threads = [threading.Thread(target=t.commit) for t in transactions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [t.is_executed() for t in transactions] == [True, True]
+        records = [r for r in read_records(path)
+                   if r[0] in [RecordType.PREPARE, RecordType.COMMIT]]
+        assert len(records) == 4
+        assert participant.journal.syncs < len(records)
+    finally:
+        controller.stop()
+        agent.stop()
+
+
+def test_vote_not_answered_in_time_aborts_transaction():
+    controller, agent, app, participant = create_agents()
+    try:
+        # can-commit of agent waits for lock longer than coordinator
+        participant.lockWait = 0.5
+        participant.locks.acquire("other", [(agent.uuid,
+                                             LockMode.EXCLUSIVE)])
+        transaction = create_transaction(app, 6, app.get_devices())
+        transaction.timeout = 0.2
+        transaction.lockRetries = 0
+        transaction.commit()
+
+        assert transaction.is_rolled_back()
+        assert "can_commit" in str(transaction.error)
+        assert isinstance(transaction.error.kwargs["reason"],
+                          FunctionCallTimeoutException)
+        time.sleep(0.6)
+        participant.locks.release("other")
+        assert participant.transactions == {}
+        assert participant.locks.locks == {}
+        assert [m.channel for m in agent.moduleManager.modules.get_by_class(
+            Radio)] == [1, 1]
+    finally:
+        controller.stop()
+        agent.stop()
+
+
+class UncheckedTransaction(Transaction):
+    # coordinator does not get to check and confirm phases
+    def _do_commit(self):
+        args = dict.fromkeys(self.nodes, (self.uuid, True, 5))
+        self._collect_votes("do_commit",
+                            self._call_participants("rx_do_commit", args))
+
+
+def test_commit_rolled_back_when_coordinator_is_lost():
+    controller, agent, app, participant = create_agents()
+    try:
+        transaction = UncheckedTransaction(module=app, timeout=2)
+        task = Task()
+        task.set_entities(app.get_devices())
+        task.set_save_point_func("get_channel")
+        task.set_function("set_channel", [6])
+        transaction.add_task(task)
+        transaction.commit()
+        radios = agent.moduleManager.modules.get_by_class(Radio)
+        assert [m.channel for m in radios] == [6, 6]
+
+        controller.stop()
+        for i in range(300):
+            if not participant.transactions:
+                break
+            time.sleep(0.01)
+        assert participant.transactions == {}
+        assert [m.channel for m in radios] == [1, 1]
+    finally:
+        controller.stop()
+        agent.stop()
+
+
+def test_commit_without_calling_module_is_rolled_back():
+    transaction = Transaction()
+    # thread of test is not thread of module
+    thread = threading.Thread(target=transaction.commit)
+    thread.start()
+    thread.join()
+    assert transaction.is_rolled_back()
+    assert "no calling module" in str(transaction.error)
+
+
+def test_participant_is_opt_in():
+    agent = Agent()
+    agent.load_config({'config': {'name': 'agent', 'type': 'local',
+                                  'iface': 'lo'}})
+    assert agent.moduleManager.modules.get_by_name(
+        "TransactionModule") is None
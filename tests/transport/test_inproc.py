@@ -0,0 +1,163 @@
+import time
+import uuid
+import threading
+from queue import Queue
+
+import pytest
+
+from uniflex.core import events, metrics, modules
+from uniflex.core.agent import Agent
+from uniflex.core.exceptions import FunctionCallTimeoutException
+from uniflex.core.module_proxy import CallingContext
+from uniflex.core.node import Node
+from uniflex.core.transport_channel import TransportChannel
+import uniflex.msgs as msgs
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class Store(modules.DeviceModule):
+    def append_value(self, values, value):
+        values.append(value)
+        return values
+
+    def wait(self, seconds):
+        time.sleep(seconds)
+
+
+class Controller(modules.ControlApplication):
+    def __init__(self):
+        super().__init__()
+        self.values = []
+
+    def on_value(self, event):
+        self.values.append(event.msg)
+
+    @modules.on_event(events.NewNodeEvent)
+    def add_node(self, event):
+        self._add_node(event.node)
+
+
+def test_inproc_events_are_copied_and_accounted():
+    sender = TransportChannel(Agent(), inproc=True)
+    receiver = TransportChannel(Agent(), inproc=True)
+    event = events.CommandEvent(CallingContext())
+    event.responseQueue = Queue()
+    msgDesc = msgs.MessageDescription()
+    msgDesc.msgType = "CommandEvent"
+    msgDesc.serializationType = msgs.SerializationType.PICKLE
+
+    metrics.registry.enabled = True
+    try:
+        before = metrics.registry.snapshot().get(
+            "uniflex_transport_messages_total", {}).get(("out",), 0)
+        sender.send_locally(receiver, [receiver.agent.uuid, msgDesc, event])
+        after = metrics.registry.snapshot()[
+            "uniflex_transport_messages_total"][("out",)]
+    finally:
+        metrics.registry.enabled = False
+    assert after == before + 1
+    # broker does not see local delivery, so hellos are not skipped
+    assert sender.lastSendTime == 0
+
+    # event is not serialized, but receiver does not share it
+    topic, msgDesc, payload = receiver.localInbox.get_nowait()
+    received = receiver.decode_msg(topic, msgDesc, payload)[2]
+    assert received is not event
+    assert received.ctx is not event.ctx
+    assert received.responseQueue is None
+    assert event.responseQueue is not None
+
+
+def create_agents():
+    url = "inproc://transport-{}".format(uuid.uuid4())
+    config = {'type': 'global', 'iface': 'lo', 'discovery': 'directory',
+              'sub': url + "-xpub", 'pub': url + "-xsub"}
+    controller = Agent()
+    controller.load_config({
+        'config': dict(config, name='controller', info='controller'),
+        'broker': {'xpub': config['sub'], 'xsub': config['pub'],
+                   'directory': True},
+        'control_applications': {
+            'controller': {'module': __name__, 'class_name': 'Controller'}}})
+    agent = Agent()
+    agent.load_config({
+        'config': dict(config, name='agent', info='agent'),
+        'modules': {'store': {'module': __name__, 'class_name': 'Store',
+                              'devices': ['dev0']}}})
+    controller.moduleManager.start()
+    agent.moduleManager.start()
+    app = controller.moduleManager.modules.get_by_name("Controller")
+    # agent drops calls of nodes it does not know yet
+    for i in range(500):
+        if (app.get_nodes() and
+                agent.nodeManager.get_node_by_uuid(controller.uuid)):
+            break
+        time.sleep(0.01)
+    node = list(app.get_nodes())[0]
+    return controller, agent, app, list(node.get_devices())[0]
+
+
+def test_remote_call_between_inproc_agents():
+    controller, agent, app, store = create_agents()
+    try:
+        threading.current_thread().module = app
+        values = [1]
+        assert store.blocking(True).append_value(values, 2) == [1, 2]
+        # arguments are not copied, as for modules of one agent
+        assert values == [1, 2]
+    finally:
+        del threading.current_thread().module
+        controller.stop()
+        agent.stop()
+
+
+def test_replies_remove_pending_calls():
+    controller, agent, app, store = create_agents()
+    moduleManager = controller.moduleManager
+    try:
+        threading.current_thread().module = app
+        store.blocking(True).append_value([], 1)
+        assert moduleManager.synchronousCalls == {}
+
+        store.callback(app.on_value).append_value([], 2)
+        for i in range(200):
+            if app.values:
+                break
+            time.sleep(0.01)
+        assert app.values == [[2]]
+        assert moduleManager.callCallbacks == {}
+
+        with pytest.raises(FunctionCallTimeoutException):
+            store.blocking(True).timeout(0.05).wait(0.2)
+        assert moduleManager.synchronousCalls == {}
+    finally:
+        del threading.current_thread().module
+        controller.stop()
+        agent.stop()
+
+
+def test_node_timeouts_share_one_thread():
+    nodeManager = Agent().nodeManager
+    # threads of agents stopped by other tests may still be exiting
+    threads = set(threading.enumerate())
+    for i in range(3):
+        node = Node(str(uuid.uuid4()))
+        node.local = False
+        node._stop = False
+        node._refresh_hello_timer()
+        nodeManager.nodes[node.uuid] = node
+        nodeManager._start_hello_timer()
+    assert len(set(threading.enumerate()) - threads) == 1
+
+    # node without hellos is removed by the same thread
+    node._helloTimeout = 1
+    for i in range(300):
+        if node.uuid not in nodeManager.nodes:
+            break
+        time.sleep(0.01)
+    assert node.uuid not in nodeManager.nodes
+    assert len(nodeManager.nodes) == 2
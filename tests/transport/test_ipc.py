@@ -0,0 +1,32 @@
+import zmq
+
+from uniflex.core.broker import Broker
+from uniflex.core.common import get_ipc_url, is_local_url
+from uniflex.core.common import is_ipc_endpoint_available
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def test_local_url():
+    assert is_local_url("tcp://127.0.0.1:8990")
+    assert is_local_url("tcp://localhost:8990")
+    assert not is_local_url("tcp://192.0.2.1:8990")
+    assert not is_local_url("ipc:///tmp/uniflex-8990.ipc")
+
+
+def test_broker_binds_ipc_endpoints():
+    broker = Broker("tcp://127.0.0.1:18690", "tcp://127.0.0.1:18689",
+                    ipc=True)
+    ipcUrl = get_ipc_url("tcp://127.0.0.1:18690")
+    assert ipcUrl in broker.urls["xpub"]
+    assert not is_ipc_endpoint_available(ipcUrl)
+
+    sock = zmq.Context.instance().socket(zmq.XPUB)
+    sock.bind(ipcUrl)
+    try:
+        assert is_ipc_endpoint_available(ipcUrl)
+    finally:
+        sock.close(linger=0)
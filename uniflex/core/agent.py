@@ -1,3 +1,4 @@
+import os
 import sys
 import time
 import uuid
@@ -5,9 +6,15 @@ import logging
 
 from .common import get_ip_address
 from .module_manager import ModuleManager
-from .transport_channel import TransportChannel
+from .transport_channel import TransportChannel, is_inproc_url
 from .broker import Broker
+from .compression import PayloadCompressor
+from .lazy_module import ModuleMetadataCache
+from . import serialization
+from . import metrics
+from . import tracing
 from .node_manager import NodeManager
+from .profiling_service import ProfilingService
 
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2015, Technische Universitat Berlin"
@@ -29,6 +36,10 @@ class Agent(object):
 
         self.broker = None
 
+        # modules with hosting: shard are dispatched by worker processes
+        self.shardNum = 1
+        self._nextShard = 0
+
         # extention of event bus
         self.transport = None
 
@@ -59,17 +70,55 @@ class Agent(object):
         if self.iface:
             self.ip = get_ip_address(self.iface)
 
+        # metrics: true or dict with file, interval, port and address
+        metricsConfig = agent_config.get('metrics', None)
+        if metricsConfig:
+            self.enable_metrics(metricsConfig)
+
+        # tracing: dict with file, sample_rate and service_name
+        tracingConfig = agent_config.get('tracing', None)
+        if tracingConfig:
+            self.enable_tracing(tracingConfig)
+
         sub = agent_config.get('sub', None)
         pub = agent_config.get('pub', None)
 
         self.agentType = agent_config.get('type', None)
 
+        # hello: peers exchange node info pairwise
+        # directory: node info snapshot is served by broker
+        self.nodeManager.discoveryMode = agent_config.get('discovery',
+                                                          'hello')
+
         if self.agentType != 'local':
-            self.transport = TransportChannel(self)
+            inproc = is_inproc_url(sub) or is_inproc_url(pub)
+            self.transport = TransportChannel(self, inproc)
             self.moduleManager.add_module_obj(
                 "transport_channel", self.transport)
             self.transport.set_downlink(sub)
             self.transport.set_uplink(pub)
+            # auto: use ipc:// endpoints of broker on the same host
+            self.transport.ipcSelection = agent_config.get('ipc', 'auto')
+
+            compression = agent_config.get('compression', None)
+            if compression:
+                if not isinstance(compression, dict):
+                    compression = {}
+                self.transport.compressor = PayloadCompressor(
+                    enabled=True, **compression)
+
+            # only whitelisted types are deserialized (process-wide)
+            whitelist = agent_config.get('whitelist', None)
+            if whitelist is not None:
+                serialization.set_whitelist(whitelist)
+
+            batching = agent_config.get('batching', None)
+            if batching:
+                if not isinstance(batching, dict):
+                    batching = {}
+                self.transport.enable_batching(
+                    batching.get('max_messages', 64),
+                    batching.get('max_delay', 500))
 
             client_key = agent_config.get('client_key', None)
             server_key = agent_config.get('server_key', None)
@@ -83,6 +132,21 @@ class Agent(object):
 
         self.nodeManager.create_local_node(self)
 
+        # profilers can be started at runtime with ProfilingControlEvent
+        if agent_config.get('profiling', False):
+            self.moduleManager._add_local_module(
+                "profiling", ProfilingService(), None)
+
+        # participant of transactions coordinated by control applications
+        # (opt-in), dict is passed to it, e.g. journal: path of journal
+        transactions = agent_config.get('transactions', False)
+        if transactions:
+            if not isinstance(transactions, dict):
+                transactions = {}
+            self.moduleManager.register_module(
+                "transactions", "uniflex.core.transactions",
+                "TransactionModule", None, transactions)
+
         if "broker" in config:
             broker_config = config["broker"]
             xpub = broker_config["xpub"]
@@ -91,11 +155,27 @@ class Agent(object):
                           .format(xpub, xsub))
             server_key = broker_config.get('server_key')
             client_keys = broker_config.get('client_keys')
-            self.broker = Broker(xpub, xsub, server_key, client_keys)
+            directory = broker_config.get('directory', False)
+            helloAggregation = broker_config.get('hello_aggregation', False)
+            ipc = broker_config.get('ipc', False)
+            capture = broker_config.get('capture', None)
+            self.broker = Broker(xpub, xsub, server_key, client_keys,
+                                 directory, helloAggregation, ipc, capture)
             # TODO: start broker in separate process
             self.broker.setDaemon(True)
             self.broker.start()
 
+        # modules are imported and created on first event or call
+        lazy = agent_config.get('lazy_loading', False)
+        metadataCache = agent_config.get('metadata_cache', None)
+        if metadataCache:
+            self.moduleManager.metadataCache = ModuleMetadataCache(
+                metadataCache)
+
+        self.shardNum = agent_config.get('shards', os.cpu_count() or 1)
+        # shard index -> specs of modules hosted by shard
+        shards = {}
+
         # load control programs
         controlApps = config.get('control_applications', {})
         for controlAppName, params in controlApps.items():
@@ -107,9 +187,15 @@ class Agent(object):
             pyClassName = params.get('class_name', None)
             kwargs = params.get('kwargs', {})
 
+            if params.get('hosting', 'thread') == 'shard':
+                self._add_to_shard(shards, params.get('shard', None),
+                                   (controlAppName, pyModuleName,
+                                    pyClassName, None, kwargs))
+                continue
+
             self.moduleManager.register_module(
                 controlAppName, pyModuleName, pyClassName,
-                None, kwargs)
+                None, kwargs, lazy=params.get('lazy', lazy))
 
         # load modules
         modules = config.get('modules', {})
@@ -119,16 +205,63 @@ class Agent(object):
             kwargs = m_params.get('kwargs', {})
             pyModuleName = m_params.get('module', None)
             className = m_params.get('class_name', None)
+            # thread (default), process or shard
+            hosting = m_params.get('hosting', 'thread')
 
+            if hosting == 'shard':
+                for device in devices or [None]:
+                    self._add_to_shard(shards, m_params.get('shard', None),
+                                       (moduleName, pyModuleName, className,
+                                        device, kwargs))
+                continue
+
+            moduleLazy = m_params.get('lazy', lazy)
             if devices:
                 for device in devices:
                     self.moduleManager.register_module(
                         moduleName, pyModuleName, className,
-                        device, kwargs)
+                        device, kwargs, hosting, moduleLazy)
             else:
                 self.moduleManager.register_module(
                     moduleName, pyModuleName, className,
-                    None, kwargs)
+                    None, kwargs, hosting, moduleLazy)
+
+        for shard, specs in sorted(shards.items()):
+            self.log.info("Start shard {} with {} modules"
+                          .format(shard, len(specs)))
+            self.moduleManager.register_hosted_modules(
+                specs, "shard-{}".format(shard))
+
+        if self.moduleManager.metadataCache:
+            self.moduleManager.metadataCache.save()
+
+    def enable_metrics(self, config):
+        if not isinstance(config, dict):
+            config = {}
+        metrics.registry.enabled = True
+        if config.get('file', None):
+            metrics.registry.start_file_exporter(config['file'],
+                                                 config.get('interval', 10))
+        if config.get('port', None) is not None:
+            port = metrics.registry.start_http_server(
+                config['port'], config.get('address', ''))
+            self.log.info("Metrics served on port {}".format(port))
+
+    def enable_tracing(self, config):
+        if not isinstance(config, dict):
+            config = {}
+        path = config.get('file', 'uniflex-traces.json')
+        serviceName = config.get('service_name', self.name or 'uniflex')
+        exporter = tracing.FileSpanExporter(path, serviceName)
+        tracing.tracer.configure(exporter, config.get('sample_rate', 1.0))
+        self.log.info("Spans are exported to {}".format(path))
+
+    def _add_to_shard(self, shards, shard, spec):
+        # modules without affinity are assigned round-robin
+        if shard is None:
+            shard = self._nextShard
+            self._nextShard = self._nextShard + 1
+        shards.setdefault(shard % self.shardNum, []).append(spec)
 
     def run(self):
         self.log.debug("Agent starts all modules".format())
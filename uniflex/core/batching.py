@@ -0,0 +1,125 @@
+import time
+import struct
+import logging
+import threading
+from collections import OrderedDict
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+BATCH_MSG_TYPE = "MessageBatch"
+
+
+recordHeader = struct.Struct("!II")
+
+
+def pack_records(records):
+    """
+    Pack list [desc1, payload1, desc2, payload2, ...] into single frame.
+    """
+    parts = []
+    for i in range(0, len(records), 2):
+        parts.append(recordHeader.pack(len(records[i]), len(records[i + 1])))
+        parts.append(records[i])
+        parts.append(records[i + 1])
+    return b"".join(parts)
+
+
+def unpack_records(frame):
+    """
+    Returns list of (desc, payload) memoryviews of packed frame.
+    """
+    frame = memoryview(frame)
+    records = []
+    offset = 0
+    while offset < len(frame):
+        descLen, payloadLen = recordHeader.unpack_from(frame, offset)
+        offset = offset + recordHeader.size
+        desc = frame[offset:offset + descLen]
+        offset = offset + descLen
+        records.append((desc, frame[offset:offset + payloadLen]))
+        offset = offset + payloadLen
+    return records
+
+
+class MessageBatcher(object):
+    """
+    Accumulates outbound messages per topic and sends them as single
+    message [topic, batchDesc, records] once batch has maxMessages
+    records or its first record is older
+    than maxDelay microseconds. Order of messages is kept per topic;
+    flush() has to be called before message is sent without batching.
+    """
+
+    def __init__(self, send_frames, create_batch_desc,
+                 maxMessages=64, maxDelay=500):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.send_frames = send_frames
+        self.create_batch_desc = create_batch_desc
+        self.maxMessages = maxMessages
+        self.maxDelay = maxDelay / 1e6
+        # topic -> (time of first record, list of frames)
+        self.batches = OrderedDict()
+        self.cv = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_expired)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        with self.cv:
+            self.running = False
+            self.cv.notify()
+        self.flush()
+
+    def add(self, topic, msgDesc, payload):
+        # batches are sent under lock to keep order of messages
+        with self.cv:
+            batch = self.batches.get(topic, None)
+            if batch is None:
+                batch = (time.time(), [])
+                self.batches[topic] = batch
+                if len(self.batches) == 1:
+                    self.cv.notify()
+            batch[1].extend([msgDesc, payload])
+            if len(batch[1]) >= 2 * self.maxMessages:
+                del self.batches[topic]
+                self._send_batch(topic, batch[1])
+
+    def flush(self):
+        with self.cv:
+            for topic, batch in self.batches.items():
+                self._send_batch(topic, batch[1])
+            self.batches.clear()
+
+    def _send_batch(self, topic, records):
+        if len(records) == 2:
+            # single record is sent as regular message
+            self.send_frames([topic] + records)
+            return
+        self.send_frames([topic, self.create_batch_desc(),
+                          pack_records(records)])
+
+    def _flush_expired(self):
+        with self.cv:
+            while self.running:
+                if not self.batches:
+                    self.cv.wait()
+                    continue
+                now = time.time()
+                expired = [topic for topic, batch in self.batches.items()
+                           if batch[0] + self.maxDelay <= now]
+                for topic in expired:
+                    self._send_batch(topic, self.batches.pop(topic)[1])
+                if self.batches:
+                    # batches are ordered by time of first record
+                    first = next(iter(self.batches.values()))
+                    self.cv.wait(max(first[0] + self.maxDelay - now, 0))
@@ -1,9 +1,19 @@
+import time
+import json
 import logging
 import threading
 import zmq
 import zmq.auth
 
 from zmq.auth.thread import ThreadAuthenticator
+import uniflex.msgs as msgs
+from .common import get_ipc_url
+from .directory import NodeDirectory
+from .liveness import HelloAggregator
+from .capture import CaptureWriter
+from . import metrics
+from . import tracing
+from .hot_logging import HotPathLogger, HOT_PATH_LOGGING
 
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2015, Technische Universitat Berlin"
@@ -11,6 +21,23 @@ __version__ = "0.1.0"
 __email__ = "gawlowicz@tkn.tu-berlin.de"
 
 
+class LocalPeerAuthenticator(ThreadAuthenticator):
+    """
+    ZAP authenticator that treats peers connected over ipc:// as
+    local ones. ZAP address of ipc peer is empty or has form of
+    localhost:uid:gid:pid, so it never matches allowed IP addresses.
+    """
+    localAddress = b"127.0.0.1"
+
+    def handle_zap_message(self, msg):
+        if len(msg) > 3:
+            address = msg[3]
+            if address == b"" or address.startswith(b"localhost"):
+                msg = list(msg)
+                msg[3] = self.localAddress
+        return super().handle_zap_message(msg)
+
+
 class Broker(threading.Thread):
     """docstring for Broker"""
 
@@ -19,19 +46,86 @@ class Broker(threading.Thread):
                  xsub="tcp://127.0.0.1:8989",
                  server_key=None,
                  client_keys=None,
+                 directory=False,
+                 hello_aggregation=False,
+                 ipc=False,
+                 capture=None,
                  ):
         self.log = logging.getLogger("{module}.{name}".format(
             module=self.__class__.__module__, name=self.__class__.__name__))
         super(Broker, self).__init__()
+        self.hotLog = HotPathLogger(self.log)
         self.running = False
         self.xpub_url = xpub
         self.xsub_url = xsub
-        self.ctx = zmq.Context()
+        # inproc:// endpoints require context shared with agents
+        if xpub.startswith("inproc://") or xsub.startswith("inproc://"):
+            self.ctx = zmq.Context.instance()
+        else:
+            self.ctx = zmq.Context()
+
+        # bind also ipc:// endpoints for agents on the same host
+        self.ipc = ipc
+        self.urls = {"xpub": [xpub], "xsub": [xsub]}
+        if self.ipc:
+            for name, url in [("xpub", xpub), ("xsub", xsub)]:
+                if url.startswith("tcp://"):
+                    self.urls[name].append(get_ipc_url(url))
 
         self.auth = None
         self.server_key = server_key
         self.client_keys = client_keys
 
+        # node directory serving snapshots to joining nodes
+        self.directory = None
+        if directory:
+            self.directory = NodeDirectory()
+
+        # single aggregated hello instead of hello of every node
+        self.helloAggregator = None
+        if hello_aggregation:
+            self.helloAggregator = HelloAggregator()
+
+        # messages received from publishers are appended to capture file
+        self.capture = None
+        if capture:
+            self.capture = CaptureWriter(capture)
+
+    def _trace_forward(self, message, msgDesc, received):
+        if msgDesc.traceContext is None:
+            return
+        tracing.tracer.record_span(
+            "broker forward", msgDesc.traceContext, received, time.time_ns(),
+            tracing.SpanKind.INTERNAL,
+            {"messaging.destination": message[0].decode('utf-8', 'replace')})
+
+    def _forward(self, message):
+        received = time.time_ns()
+        message[0] = message[0].bytes
+        message[1] = message[1].bytes
+        if metrics.registry.enabled:
+            metrics.brokerMessages.inc()
+            metrics.brokerBytes.inc(sum(len(frame) for frame in message))
+        if HOT_PATH_LOGGING:
+            self.hotLog.sampled_debug("publishing message", topic=message[0])
+        # header is parsed once for all services that need it
+        msgDesc = None
+        if self.helloAggregator or tracing.tracer.enabled:
+            msgDesc = msgs.MessageDescription.parse(
+                json.loads(message[1].decode('utf-8')))
+        consumed = False
+        if self.helloAggregator:
+            consumed = self.helloAggregator.process_msg(message, msgDesc)
+        if not consumed:
+            self.xpub.send_multipart(message, copy=False)
+        if tracing.tracer.enabled:
+            self._trace_forward(message, msgDesc, received)
+        if self.capture:
+            self.capture.write(message, received)
+        if self.directory:
+            for reply in self.directory.process_msg(message, msgDesc):
+                self.xpub.send_multipart(reply)
+
     def run(self):
         self.log.debug("Broker starts XPUB:{}, XSUB:{}"
                        .format(self.xpub_url, self.xsub_url))
@@ -40,7 +134,7 @@ class Broker(threading.Thread):
         self.xsub = self.ctx.socket(zmq.XSUB)
 
         if self.server_key is not None:
-            self.auth = ThreadAuthenticator(self.ctx)
+            self.auth = LocalPeerAuthenticator(self.ctx)
             self.auth.start()
             self.auth.allow('127.0.0.1')
             # Tell authenticator to use the certificate in a directory
@@ -59,8 +153,19 @@ class Broker(threading.Thread):
                 sock.curve_publickey = server_public
                 sock.curve_server = True  # must come before bind
 
-        self.xpub.bind(self.xpub_url)
-        self.xsub.bind(self.xsub_url)
+        for url in self.urls["xpub"]:
+            self.log.debug("Broker binds XPUB: {}".format(url))
+            self.xpub.bind(url)
+        for url in self.urls["xsub"]:
+            self.log.debug("Broker binds XSUB: {}".format(url))
+            self.xsub.bind(url)
+
+        # broker subscribes on its own for discovery messages
+        for service in [self.directory, self.helloAggregator]:
+            if not service:
+                continue
+            for topic in service.get_subscriptions():
+                self.xsub.send(b'\x01' + topic)
 
         # self.proxy.start()
         poller = zmq.Poller()
@@ -68,18 +173,37 @@ class Broker(threading.Thread):
         poller.register(self.xsub, zmq.POLLIN)
         self.running = True
         while self.running:
-            events = dict(poller.poll(1000))
+            timeout = 1000
+            if self.helloAggregator:
+                timeout = min(timeout, self.helloAggregator.get_timeout())
+            events = dict(poller.poll(timeout))
+            if not events and self.capture:
+                self.capture.flush()
             if self.xpub in events:
                 message = self.xpub.recv_multipart()
-                self.log.debug("subscription message: {}".format(message[0]))
+                if HOT_PATH_LOGGING:
+                    self.hotLog.debug("subscription message: {}", message[0])
                 self.xsub.send_multipart(message)
             if self.xsub in events:
-                message = self.xsub.recv_multipart()
-                self.log.debug("publishing message: {}".format(message))
-                self.xpub.send_multipart(message)
+                # payload frames are forwarded without copy
+                message = self.xsub.recv_multipart(copy=False)
+                try:
+                    self._forward(message)
+                except Exception as e:
+                    # malformed message must not stop the broker
+                    self.log.error("Cannot forward message on topic {}: {}"
+                                   .format(message[0], e))
+            if self.helloAggregator:
+                message = self.helloAggregator.create_aggregate_msg()
+                if message:
+                    self.xpub.send_multipart(message)
+                    if self.directory:
+                        self.directory.process_msg(message)
 
         for sock in [self.xpub, self.xsub]:
             sock.close()
+        if self.capture:
+            self.capture.close()
         if self.auth:
             self.auth.stop()
 
@@ -0,0 +1,237 @@
+import sys
+import atexit
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+
+from .events import EventBase
+from .exceptions import BulkDataOverwritten
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class BulkDataEvent(EventBase):
+    """
+    Descriptor of record written into shared memory ring buffer.
+    Only descriptor travels through transport channel, consumer
+    on the same host reads data with read_bulk_data().
+    """
+
+    def __init__(self, buffer=None, position=0, length=0, seq=0,
+                 dtype=None, shape=None):
+        super().__init__()
+        self.buffer = buffer
+        self.position = position
+        self.length = length
+        self.seq = seq
+        self.dtype = dtype
+        self.shape = shape
+
+
+class SharedRingBuffer(object):
+    """
+    Single producer ring buffer in shared memory. Records are
+    addressed by linear position; producer publishes end of reserved
+    space (head) in buffer header before it writes record, so reader
+    can detect that record was overwritten.
+    """
+    headerFormat = "!QQQ"  # head, seq, size
+    headerSize = 64
+    alignment = 64
+
+    def __init__(self, name=None, size=16 * 1024 * 1024, create=True):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        if create:
+            size = size + (-size % self.alignment)
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=self.headerSize + size)
+            self.size = size
+            self._set_header(0, 0)
+        else:
+            # consumer must not unlink memory of producer on exit
+            if sys.version_info >= (3, 13):
+                self.shm = shared_memory.SharedMemory(name=name, track=False)
+            else:
+                self.shm = shared_memory.SharedMemory(name=name)
+                # tracker registered name with leading slash
+                resource_tracker.unregister("/" + self.shm.name,
+                                            "shared_memory")
+            # mapping may be rounded up to page size, take size of producer
+            self.size = struct.unpack_from(
+                self.headerFormat, self.shm.buf, 0)[2]
+        self.name = self.shm.name
+        self.owner = create
+        self.data = self.shm.buf[self.headerSize:self.headerSize + self.size]
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name=name, create=False)
+
+    def _set_header(self, head, seq):
+        struct.pack_into(self.headerFormat, self.shm.buf, 0,
+                         head, seq, self.size)
+
+    def get_head(self):
+        return struct.unpack_from(self.headerFormat, self.shm.buf, 0)[0]
+
+    def write(self, data):
+        """
+        Copy data into buffer.
+        Returns (position, length, seq) of written record.
+        """
+        data = memoryview(data).cast('B')
+        length = data.nbytes
+        if length > self.size:
+            raise ValueError("record of {} bytes exceeds buffer of {} bytes"
+                             .format(length, self.size))
+
+        head, seq, _ = struct.unpack_from(self.headerFormat, self.shm.buf, 0)
+        position = head
+        offset = position % self.size
+        if offset + length > self.size:
+            # record must be contiguous, skip tail of buffer
+            position = position + self.size - offset
+            offset = 0
+
+        seq = seq + 1
+        end = position + length
+        end = end + (-end % self.alignment)
+        self._set_header(end, seq)
+        self.data[offset:offset + length] = data
+        return position, length, seq
+
+    def is_valid(self, position, length):
+        return self.get_head() <= position + self.size
+
+    def read(self, position, length):
+        """
+        Returns memoryview of record, no data is copied.
+        Check is_valid() after data was consumed.
+        """
+        if not self.is_valid(position, length):
+            raise BulkDataOverwritten(name=self.name, position=position)
+        offset = position % self.size
+        return self.data[offset:offset + length]
+
+    def close(self):
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+
+
+class BulkChannel(object):
+    """
+    Producer side of bulk data channel.
+    """
+
+    def __init__(self, size=16 * 1024 * 1024, name=None):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.ring = SharedRingBuffer(name=name, size=size)
+        self.name = self.ring.name
+        self._lock = threading.Lock()
+        with _attachedBuffersLock:
+            _localBuffers[self.name] = self.ring
+
+    def write(self, data, eventCls=BulkDataEvent, **kwargs):
+        """
+        Write data (bytes, buffer or numpy array) into buffer.
+        Returns descriptor event that has to be sent to consumers.
+        """
+        dtype = None
+        shape = None
+        if np is not None and isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data)
+            dtype = data.dtype.str
+            shape = data.shape
+
+        with self._lock:
+            position, length, seq = self.ring.write(data)
+
+        event = eventCls(**kwargs)
+        event.buffer = self.name
+        event.position = position
+        event.length = length
+        event.seq = seq
+        event.dtype = dtype
+        event.shape = shape
+        return event
+
+    def close(self):
+        with _attachedBuffersLock:
+            _localBuffers.pop(self.name, None)
+        self.ring.close()
+
+
+# buffers of producers in this process are read directly
+_localBuffers = {}
+_attachedBuffers = {}
+_attachedBuffersLock = threading.Lock()
+
+
+def _get_buffer(name):
+    with _attachedBuffersLock:
+        ring = _localBuffers.get(name, None)
+        if ring is not None:
+            return ring
+        ring = _attachedBuffers.get(name, None)
+        if ring is None:
+            ring = SharedRingBuffer.attach(name)
+            _attachedBuffers[name] = ring
+        return ring
+
+
+def read_bulk_data(event, copy=False):
+    """
+    Read data described by event. Returns numpy array if producer
+    wrote array and numpy is available; otherwise memoryview.
+    Without copy data is not copied, so consumer has to check
+    is_bulk_data_valid() after processing.
+    """
+    ring = _get_buffer(event.buffer)
+    data = ring.read(event.position, event.length)
+    if copy:
+        data = bytes(data)
+        if not ring.is_valid(event.position, event.length):
+            raise BulkDataOverwritten(name=event.buffer,
+                                      position=event.position)
+
+    if np is not None and event.dtype is not None:
+        data = np.frombuffer(data, dtype=event.dtype).reshape(event.shape)
+    return data
+
+
+def is_bulk_data_valid(event):
+    ring = _get_buffer(event.buffer)
+    return ring.is_valid(event.position, event.length)
+
+
+def release_bulk_buffer(name):
+    with _attachedBuffersLock:
+        ring = _attachedBuffers.pop(name, None)
+    if ring is not None:
+        ring.close()
+
+
+@atexit.register
+def _release_bulk_buffers():
+    for name in list(_attachedBuffers.keys()):
+        try:
+            release_bulk_buffer(name)
+        except BufferError:
+            pass
@@ -0,0 +1,175 @@
+import os
+import time
+import mmap
+import struct
+
+import zmq
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+# capture file: magic followed by records, each record is
+# header (receive time in ns, number of frames), then every frame
+# as length and data; record cut by crash is ignored on read
+CAPTURE_MAGIC = b"UFXCAP01"
+recordHeader = struct.Struct("!QH")
+frameHeader = struct.Struct("!I")
+
+
+class CaptureWriter(object):
+    """
+    Appends multipart messages to capture file.
+    """
+
+    def __init__(self, path, bufferSize=1024 * 1024):
+        super().__init__()
+        self.path = path
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.file = open(path, "ab", buffering=bufferSize)
+        if self.file.tell() == 0:
+            self.file.write(CAPTURE_MAGIC)
+        self.records = 0
+
+    def write(self, frames, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time_ns()
+        parts = [recordHeader.pack(timestamp, len(frames))]
+        for frame in frames:
+            if isinstance(frame, zmq.Frame):
+                frame = frame.buffer
+            parts.append(frameHeader.pack(len(frame)))
+            parts.append(frame)
+        self.file.write(b"".join(parts))
+        self.records = self.records + 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class CaptureReader(object):
+    """
+    Reads capture file through memory map; frames are returned as
+    memoryviews of the map, without copy, and have to be released
+    before reader is closed.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = None
+        size = os.fstat(self.file.fileno()).st_size
+        if size:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        if size < len(CAPTURE_MAGIC) or \
+                self.map[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError("Not a capture file: {}".format(path))
+
+    def __iter__(self):
+        """
+        Yields (timestamp in ns, list of frames).
+        """
+        data = memoryview(self.map)
+        size = len(data)
+        offset = len(CAPTURE_MAGIC)
+        try:
+            while offset + recordHeader.size <= size:
+                timestamp, frameNum = recordHeader.unpack_from(data, offset)
+                offset = offset + recordHeader.size
+                frames = []
+                for i in range(frameNum):
+                    if offset + frameHeader.size > size:
+                        return
+                    length = frameHeader.unpack_from(data, offset)[0]
+                    offset = offset + frameHeader.size
+                    if offset + length > size:
+                        return
+                    frames.append(data[offset:offset + length])
+                    offset = offset + length
+                yield timestamp, frames
+        finally:
+            data.release()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_capture_info(path):
+    """
+    Returns number of messages, bytes, duration and messages per topic.
+    """
+    info = {"messages": 0, "bytes": 0, "start": None, "end": None,
+            "topics": {}}
+    with CaptureReader(path) as reader:
+        for timestamp, frames in reader:
+            if info["start"] is None:
+                info["start"] = timestamp
+            info["end"] = timestamp
+            info["messages"] = info["messages"] + 1
+            info["bytes"] = info["bytes"] + sum(len(f) for f in frames)
+            topic = frames[0].tobytes().decode('utf-8', 'replace')
+            info["topics"][topic] = info["topics"].get(topic, 0) + 1
+            for frame in frames:
+                frame.release()
+    info["duration"] = 0
+    if info["start"] is not None:
+        info["duration"] = (info["end"] - info["start"]) / 1e9
+    return info
+
+
+def replay(path, xsub, speed=1.0, ctx=None, connectDelay=0.5):
+    """
+    Publishes captured messages to XSUB socket of broker. Messages
+    are sent with their original spacing divided by speed; speed 0
+    sends them as fast as possible. Returns number of messages and
+    duration of replay.
+    """
+    ownCtx = ctx is None
+    ctx = ctx or zmq.Context()
+    pub = ctx.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    pub.connect(xsub)
+    # broker has to forward subscriptions first
+    time.sleep(connectDelay)
+
+    sent = 0
+    start = time.perf_counter()
+    firstTimestamp = None
+    try:
+        with CaptureReader(path) as reader:
+            for timestamp, frames in reader:
+                if firstTimestamp is None:
+                    firstTimestamp = timestamp
+                if speed:
+                    delay = (timestamp - firstTimestamp) / 1e9 / speed - \
+                        (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                pub.send_multipart(frames)
+                sent = sent + 1
+                for frame in frames:
+                    frame.release()
+        return sent, time.perf_counter() - start
+    finally:
+        pub.close(linger=-1)
+        if ownCtx:
+            ctx.term()
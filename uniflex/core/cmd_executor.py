@@ -1,9 +1,13 @@
 import logging
 import datetime
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from . import events
+from . import tracing
+from . import profiling
+from .hot_logging import HotPathLogger, HOT_PATH_LOGGING
 
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2015, Technische Universitat Berlin"
@@ -12,10 +16,11 @@ __email__ = "gawlowicz@tkn.tu-berlin.de"
 
 
 class CommandExecutor(object):
-    def __init__(self, agent, moduleManager):
+    def __init__(self, agent, moduleManager, poolSize=16):
         super().__init__()
         self.log = logging.getLogger("{module}.{name}".format(
             module=self.__class__.__module__, name=self.__class__.__name__))
+        self.hotLog = HotPathLogger(self.log)
 
         self.agent = agent
         self.moduleManager = moduleManager
@@ -23,14 +28,23 @@ class CommandExecutor(object):
         apscheduler_logger.setLevel(logging.CRITICAL)
         self.jobScheduler = BackgroundScheduler()
         self.jobScheduler.start()
+        # serves remote calls of functions marked with run_in_pool
+        self.pool = ThreadPoolExecutor(poolSize,
+                                       thread_name_prefix="CommandPool")
 
     def stop(self):
         self.jobScheduler.shutdown()
+        self.pool.shutdown(wait=False)
+
+    def _runs_in_pool(self, event):
+        module = self.moduleManager.get_module_by_uuid(event.dstModule)
+        handler = getattr(module, event.ctx._name, None)
+        return getattr(handler, '_run_in_pool_', False)
 
     def _execute_command(self, module, handler, args, kwargs):
-        self.log.debug("Execute function: {} module: {} handler: {}"
-                       .format(handler.__name__, module.__class__.__name__,
-                               handler.__name__))
+        if HOT_PATH_LOGGING:
+            self.hotLog.debug("Execute function: {} module: {}",
+                              handler.__name__, module.__class__.__name__)
         returnValue = None
         # if there is function that has to be
         # called before function, call
@@ -38,7 +52,16 @@ class CommandExecutor(object):
             before_func = getattr(handler, "_before_call_")
             before_func(module)
 
-        returnValue = handler(*args, **kwargs)
+        states = None
+        if profiling.hooks.enabled:
+            states = profiling.hooks.before(profiling.HookPoint.RPC_EXECUTE,
+                                            module, handler.__name__)
+        try:
+            returnValue = handler(*args, **kwargs)
+        finally:
+            if states:
+                profiling.hooks.after(profiling.HookPoint.RPC_EXECUTE,
+                                      module, handler.__name__, states)
 
         # if there is function that has to be
         # called after function, call
@@ -70,16 +93,43 @@ class CommandExecutor(object):
             after_func(module)
 
     def _serve_ctx_command_event(self, event, local):
+        traceContext = getattr(event, 'traceContext', None)
+        if traceContext is None or not tracing.tracer.enabled:
+            self._serve_command(event, local)
+            return
+
+        span = tracing.tracer.start_span(
+            "execute {}".format(event.ctx._name), traceContext,
+            tracing.SpanKind.SERVER, attributes={"rpc.method": event.ctx._name})
+        previous = tracing.tracer.set_current(span.context)
+        try:
+            self._serve_command(event, local)
+        finally:
+            tracing.tracer.set_current(previous)
+            span.end()
+
+    def _send_reply(self, retEvent, dstNode):
+        parent = tracing.tracer.get_current()
+        if parent is None or not tracing.tracer.enabled:
+            self.agent.transport.send_event_outside(retEvent, dstNode)
+            return
+
+        span = tracing.tracer.start_span("reply", parent,
+                                         tracing.SpanKind.PRODUCER)
+        retEvent.traceContext = span.context
+        self.agent.transport.send_event_outside(retEvent, dstNode)
+        span.end()
+
+    def _serve_command(self, event, local):
         ctx = event.ctx
         retValue = None
 
         runInThread = False
-        self.log.debug("Get module with UUID: {}".format(event.dstModule))
         module = self.moduleManager.get_module_by_uuid(event.dstModule)
 
-        self.log.debug("Serving: {} {} THREAD:{}".format(ctx._type,
-                                                         ctx._name,
-                                                         runInThread))
+        if HOT_PATH_LOGGING:
+            self.hotLog.debug("Serving: {} {}", ctx._type, ctx._name,
+                              module=event.dstModule, thread=runInThread)
         args = ()
         kwargs = {}
         if ctx._kwargs:
@@ -114,9 +164,7 @@ class CommandExecutor(object):
                         retEvent = events.ReturnValueEvent(event.ctx, retValue)
                         retEvent.srcNode = self.agent.nodeManager.get_local_node()
                         retEvent.srcModule = event.dstModule
-                        self.log.debug("send response")
-                        self.agent.transport.send_event_outside(retEvent,
-                                                                event.srcNode)
+                        self._send_reply(retEvent, event.srcNode)
 
             else:
                 self.log.debug("Func: {} in module: {}"
@@ -147,9 +195,7 @@ class CommandExecutor(object):
                 retEvent = events.ReturnValueEvent(event.ctx, e)
                 retEvent.srcNode = self.agent.nodeManager.get_local_node()
                 retEvent.srcModule = event.dstModule
-                self.log.debug("send response")
-                self.agent.transport.send_event_outside(retEvent,
-                                                        event.srcNode)
+                self._send_reply(retEvent, event.srcNode)
 
     def serve_ctx_command_event(self, event, local=False):
         ctx = event.ctx
@@ -187,8 +233,14 @@ class CommandExecutor(object):
                                           'date', run_date=execTime,
                                           kwargs={"event": event,
                                                   "local": local})
+        elif not local and self._runs_in_pool(event):
+            # receiving thread does not wait for function
+            try:
+                self.pool.submit(self._serve_ctx_command_event, event, local)
+            except RuntimeError:
+                # pool is shut down, agent exits
+                self.log.debug("Drop command {}, agent exits"
+                               .format(event.ctx._name))
         else:
             # execute now
-            self.log.debug("Serves Cmd Event: Type: {} Func: {}".format(
-                           ctx._type, ctx._name))
             self._serve_ctx_command_event(event, local)
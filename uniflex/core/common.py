@@ -1,5 +1,10 @@
+import os
+import socket
 import inspect
+import tempfile
 import threading
+from collections import deque
+from queue import Queue
 import netifaces as ni
 from netifaces import AF_INET
 
@@ -68,6 +73,83 @@ def get_ip_address(ifname):
         raise e
 
 
+def get_local_ip_addresses():
+    addresses = set(["127.0.0.1", "localhost"])
+    for ifname in ni.interfaces():
+        for addr in ni.ifaddresses(ifname).get(AF_INET, []):
+            addresses.add(addr['addr'])
+    return addresses
+
+
+def is_local_url(url):
+    if not url or not url.startswith("tcp://"):
+        return False
+    host = url[len("tcp://"):].rsplit(":", 1)[0]
+    return host in get_local_ip_addresses()
+
+
+def get_ipc_url(url):
+    """
+    Get ipc endpoint bound by broker next to given tcp endpoint.
+    Endpoints are distinguished by tcp port.
+    """
+    port = url.rsplit(":", 1)[1]
+    path = os.path.join(tempfile.gettempdir(),
+                        "uniflex-{}.ipc".format(port))
+    return "ipc://" + path
+
+
+def is_ipc_endpoint_available(url):
+    # socket file may be left by crashed broker, check for listener
+    path = url[len("ipc://"):]
+    if not os.path.exists(path):
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class PriorityLaneQueue(Queue):
+    """
+    Queue with separate FIFO lane for every priority class.
+    Items are put as (priority, item) tuples and get() returns
+    only item; lanes are served in strict priority order,
+    i.e. lower priority value first.
+    """
+
+    def __init__(self, lanes=3, maxsize=0):
+        self.lanesNum = lanes
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.lanes = [deque() for _ in range(self.lanesNum)]
+        self.size = 0
+
+    def _qsize(self):
+        return self.size
+
+    def _put(self, item):
+        priority, item = item
+        priority = min(max(int(priority), 0), self.lanesNum - 1)
+        self.lanes[priority].append(item)
+        self.size = self.size + 1
+
+    def _get(self):
+        for lane in self.lanes:
+            if lane:
+                self.size = self.size - 1
+                return lane.popleft()
+
+    def lane_size(self, priority):
+        with self.mutex:
+            return len(self.lanes[priority])
+
+
 class UniFlexThread():
     """docstring for UniFlexThread"""
 
@@ -0,0 +1,174 @@
+import zlib
+import logging
+
+from uniflex.msgs import CompressionType
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def get_available_compressions():
+    available = [CompressionType.ZLIB]
+    if lz4 is not None:
+        available.append(CompressionType.LZ4)
+    if zstandard is not None:
+        available.append(CompressionType.ZSTD)
+    return available
+
+
+def get_best_compression():
+    for compression in [CompressionType.LZ4, CompressionType.ZSTD]:
+        if compression in get_available_compressions():
+            return compression
+    return CompressionType.ZLIB
+
+
+def compress(data, compression, level=None, dictionary=None):
+    if compression == CompressionType.ZLIB:
+        if level is None:
+            level = zlib.Z_DEFAULT_COMPRESSION
+        if dictionary is None:
+            return zlib.compress(data, level)
+        compressor = zlib.compressobj(level, zdict=dictionary)
+        return compressor.compress(data) + compressor.flush()
+
+    elif compression == CompressionType.LZ4:
+        if dictionary is None:
+            return lz4.block.compress(data)
+        return lz4.block.compress(data, dict=dictionary)
+
+    elif compression == CompressionType.ZSTD:
+        if dictionary is not None:
+            dictionary = zstandard.ZstdCompressionDict(dictionary)
+        compressor = zstandard.ZstdCompressor(level=level or 3,
+                                              dict_data=dictionary)
+        return compressor.compress(data)
+
+    raise ValueError("Unsupported compression: {}".format(compression))
+
+
+def decompress(data, compression, dictionary=None):
+    if compression == CompressionType.ZLIB:
+        if dictionary is None:
+            return zlib.decompress(data)
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        return decompressor.decompress(data) + decompressor.flush()
+
+    elif compression == CompressionType.LZ4:
+        if dictionary is None:
+            return lz4.block.decompress(data)
+        return lz4.block.decompress(data, dict=dictionary)
+
+    elif compression == CompressionType.ZSTD:
+        if dictionary is not None:
+            dictionary = zstandard.ZstdCompressionDict(dictionary)
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(data)
+
+    raise ValueError("Unsupported compression: {}".format(compression))
+
+
+def get_dictionary_id(dictionary):
+    return zlib.crc32(dictionary)
+
+
+class PayloadCompressor(object):
+    """
+    Compresses payload frames above threshold and marks
+    it in message description; receiver decompresses payload
+    before deserialization. Selected algorithm is used only for
+    receiver that advertises it in its NodeInfo, other messages (e.g.
+    broadcast) fall back to zlib that every node decompresses.
+    Threshold may be set per message type, None disables compression
+    of given type. Pre-trained dictionaries (bytes or path to file)
+    are given per message type and have to be configured also in
+    receivers.
+    """
+
+    def __init__(self, enabled=False, algorithm=None, threshold=1024,
+                 level=None, types=None, dictionaries=None):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.enabled = enabled
+        self.compression = get_best_compression()
+        if algorithm:
+            self.compression = CompressionType[algorithm.upper()]
+            if self.compression not in get_available_compressions():
+                self.log.warning("Compression {} not available, use zlib"
+                                 .format(algorithm))
+                self.compression = CompressionType.ZLIB
+        self.threshold = threshold
+        self.level = level
+        self.thresholds = dict(types or {})
+
+        self.dictionaries = {}
+        self.typeDictionaries = {}
+        for msgType, dictionary in (dictionaries or {}).items():
+            if isinstance(dictionary, str):
+                with open(dictionary, 'rb') as f:
+                    dictionary = f.read()
+            dictionaryId = get_dictionary_id(dictionary)
+            self.dictionaries[dictionaryId] = dictionary
+            self.typeDictionaries[msgType] = dictionaryId
+
+    def get_threshold(self, msgType):
+        return self.thresholds.get(msgType, self.threshold)
+
+    def get_compression(self, peerCompressions=None):
+        if self.compression in (peerCompressions or []):
+            return self.compression
+        return CompressionType.ZLIB
+
+    def compress(self, msgDesc, payload, peerCompressions=None):
+        """
+        Returns compressed payload if it pays off; otherwise payload.
+        peerCompressions are compressions supported by receiver.
+        """
+        if not self.enabled:
+            return payload
+
+        threshold = self.get_threshold(msgDesc.msgType)
+        if threshold is None or len(payload) < threshold:
+            return payload
+
+        dictionaryId = self.typeDictionaries.get(msgDesc.msgType, None)
+        dictionary = self.dictionaries.get(dictionaryId, None)
+        compression = self.get_compression(peerCompressions)
+        # level is given for selected algorithm
+        level = self.level if compression == self.compression else None
+        compressed = compress(payload, compression, level, dictionary)
+        if len(compressed) >= len(payload):
+            return payload
+
+        msgDesc.compression = compression
+        msgDesc.dictionaryId = dictionaryId
+        return compressed
+
+    def decompress(self, msgDesc, payload):
+        if msgDesc.compression == CompressionType.NONE:
+            return payload
+
+        dictionary = None
+        if msgDesc.dictionaryId is not None:
+            dictionary = self.dictionaries.get(msgDesc.dictionaryId, None)
+            if dictionary is None:
+                raise KeyError("Unknown compression dictionary {}"
+                               .format(msgDesc.dictionaryId))
+
+        payload = decompress(payload, msgDesc.compression, dictionary)
+        msgDesc.compression = CompressionType.NONE
+        msgDesc.dictionaryId = None
+        return payload
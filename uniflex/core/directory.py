@@ -0,0 +1,153 @@
+import copy
+import time
+import json
+import logging
+
+import uniflex.msgs as msgs
+from .compression import PayloadCompressor
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class NodeDirectory(object):
+    """
+    Authoritative directory of nodes kept by broker. It snoops
+    NodeInfo, NodeInfoDelta, NodeExit and (aggregated) Hello messages
+    forwarded by broker. Joining node publishes its NodeInfo on DIRECTORY topic;
+    directory stores it, re-publishes it on NODE_INFO topic and
+    answers with single snapshot of all known nodes. Later updates
+    reach joiners through regular NODE_INFO broadcasts.
+    """
+    topics = ["NODE_INFO", "NODE_EXIT", "HELLO_MSG", "DIRECTORY"]
+    sourceUuid = "DIRECTORY"
+
+    def __init__(self, timeout=10):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.timeout = timeout
+        self.nodes = {}
+        self.lastSeen = {}
+        self._topics = set([t.encode('utf-8') for t in self.topics])
+        self.compressor = PayloadCompressor()
+
+    def get_subscriptions(self):
+        return list(self._topics)
+
+    def process_msg(self, message, msgDesc=None):
+        """
+        Update directory with forwarded message; msgDesc is its
+        header if already parsed.
+        Returns list of multipart messages that have to be published.
+        """
+        if message[0] not in self._topics:
+            return []
+
+        if msgDesc is None:
+            msgDesc = msgs.MessageDescription.parse(
+                json.loads(message[1].decode('utf-8')))
+        src = msgDesc.sourceUuid
+        msgType = msgDesc.msgType
+        now = time.time()
+
+        payload = message[2]
+        if msgDesc.compression:
+            try:
+                # header is shared with other services of broker
+                payload = self.compressor.decompress(copy.copy(msgDesc),
+                                                     payload)
+            except Exception as e:
+                self.log.debug("Directory skips {}: {}".format(msgType, e))
+                return []
+
+        if msgType == msgs.get_msg_type(msgs.NodeInfoMsg):
+            msg = msgs.NodeInfoMsg()
+            msg.ParseFromString(bytes(payload))
+            self.nodes[str(msg.agent_uuid)] = msg
+            self.lastSeen[str(msg.agent_uuid)] = now
+            self.log.debug("Directory stores node: {}"
+                           .format(msg.agent_uuid))
+
+            if message[0] == b"DIRECTORY":
+                # announce joining node and answer with snapshot
+                announcement = [b"NODE_INFO"] + message[1:]
+                return [announcement, self.create_snapshot_msg(src)]
+
+        elif msgType == msgs.get_msg_type(msgs.NodeInfoDelta):
+            msg = msgs.NodeInfoDelta()
+            msg.ParseFromString(bytes(payload))
+            self._apply_delta(msg)
+
+        elif msgType == msgs.get_msg_type(msgs.NodeExitMsg):
+            msg = msgs.NodeExitMsg()
+            msg.ParseFromString(bytes(payload))
+            self.remove_node(str(msg.agent_uuid))
+
+        elif msgType == msgs.get_msg_type(msgs.HelloMsg):
+            if src in self.nodes:
+                self.lastSeen[src] = now
+
+        elif msgType == msgs.get_msg_type(msgs.HelloAggregateMsg):
+            msg = msgs.HelloAggregateMsg()
+            msg.ParseFromString(bytes(payload))
+            for hello in msg.hellos:
+                if hello.uuid in self.nodes:
+                    self.lastSeen[hello.uuid] = now
+
+        return []
+
+    def _apply_delta(self, delta):
+        agentUuid = str(delta.agent_uuid)
+        msg = self.nodes.get(agentUuid, None)
+        if msg is None:
+            return
+
+        if msg.info_hash != delta.base_hash:
+            # directory missed update, joiners will fetch
+            # full description after hash mismatch in hello
+            self.log.debug("Directory entry of node {} is stale"
+                           .format(agentUuid))
+            return
+
+        removed = set(delta.removed_modules)
+        modules = [m for m in msg.modules if m.uuid not in removed]
+        del msg.modules[:]
+        msg.modules.extend(modules)
+        msg.modules.extend(delta.added_modules)
+        msg.info_hash = delta.info_hash
+        self.lastSeen[agentUuid] = time.time()
+
+    def remove_node(self, agentUuid):
+        self.log.debug("Directory removes node: {}".format(agentUuid))
+        self.nodes.pop(agentUuid, None)
+        self.lastSeen.pop(agentUuid, None)
+
+    def remove_expired_nodes(self):
+        deadline = time.time() - self.timeout
+        expired = [u for u, t in self.lastSeen.items() if t < deadline]
+        for agentUuid in expired:
+            self.remove_node(agentUuid)
+
+    def create_snapshot_msg(self, dest):
+        self.remove_expired_nodes()
+
+        snapshot = msgs.NodeInfoSnapshot()
+        for agentUuid, msg in self.nodes.items():
+            if agentUuid == dest:
+                continue
+            snapshot.nodes.add().CopyFrom(msg)
+
+        self.log.debug("Directory sends snapshot with {} nodes to {}"
+                       .format(len(snapshot.nodes), dest))
+
+        msgDesc = msgs.MessageDescription()
+        msgDesc.msgType = msgs.get_msg_type(msgs.NodeInfoSnapshot)
+        msgDesc.sourceUuid = self.sourceUuid
+        msgDesc.serializationType = msgs.SerializationType.PROTOBUF
+        msgDesc = json.dumps(msgDesc.serialize())
+
+        return [dest.encode('utf-8'), msgDesc.encode('utf-8'),
+                snapshot.SerializeToString()]
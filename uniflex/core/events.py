@@ -1,9 +1,22 @@
+from enum import IntEnum
+
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2015, Technische Universitat Berlin"
 __version__ = "0.1.0"
 __email__ = "gawlowicz@tkn.tu-berlin.de"
 
 
+class EventPriority(IntEnum):
+    """
+    Priority class of event, lower value is served first.
+    Control-plane events (liveness, RPC requests and replies)
+    are HIGH, so bursts of data-plane events cannot delay them.
+    """
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
 class FunctionBase(object):
     # Nothing yet
     pass
@@ -16,6 +29,7 @@ class ParameterBase(object):
 
 class EventBase(object):
     """ event cannot be parametrized, user may only start it once"""
+    priority = EventPriority.NORMAL
 
     def __init__(self):
         super().__init__()
@@ -23,19 +37,27 @@ class EventBase(object):
         self.srcModule = None
         self.node = None
         self.device = None
+        # (traceId, spanId) of span that caused event, if traced
+        self.traceContext = None
 
 
 class AgentStartEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class AgentExitEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class BrokerDiscoveredEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self, dlink, ulink):
         super().__init__()
         self.dlink = dlink
@@ -43,43 +65,59 @@ class BrokerDiscoveredEvent(EventBase):
 
 
 class ConnectionEstablishedEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class ConnectionLostEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class NewNodeEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class NodeExitEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self, reason):
         super().__init__()
         self.reason = reason
 
 
 class NodeLostEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self, reason):
         super().__init__()
         self.reason = reason
 
 
 class HelloTimeoutEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class HelloMsgEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class ExceptionEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self, dest, cmdDesc, msg):
         super().__init__()
         self.dest = dest
@@ -88,6 +126,8 @@ class ExceptionEvent(EventBase):
 
 
 class CommandEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self, ctx):
         super().__init__()
         self.dstNode = None
@@ -97,6 +137,8 @@ class CommandEvent(EventBase):
 
 
 class ReturnValueEvent(EventBase):
+    priority = EventPriority.HIGH
+
     def __init__(self, ctx, msg):
         super().__init__()
         self.dstNode = None
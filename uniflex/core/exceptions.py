@@ -46,3 +46,23 @@ class FunctionExecutionFailedException(UniFlexException):
 
 
 FunctionExecutionFailed = FunctionExecutionFailedException
+
+
+class BulkDataOverwritten(UniFlexException):
+    message = ('bulk data at position %(position)s in buffer %(name)s' +
+               ' was overwritten')
+
+
+class FunctionCallTimeoutException(UniFlexException):
+    message = 'function %(func_name)s did not return within %(timeout)s s'
+
+
+FunctionCallTimeout = FunctionCallTimeoutException
+
+
+class TransactionAbortedException(UniFlexException):
+    message = 'transaction %(tx_id)s aborted in %(phase)s: %(reason)s'
+
+
+class EntityLockedException(UniFlexException):
+    message = 'entity %(entity)s is locked by %(owner)s'
@@ -0,0 +1,85 @@
+import os
+import logging
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def _get_env_flag(name, default):
+    value = os.environ.get(name, None)
+    if value is None:
+        return default
+    return value.lower() not in ["0", "false", "no", "off"]
+
+
+# hot-path logging is skipped entirely with UNIFLEX_HOT_PATH_LOGGING=0;
+# call sites check this flag before any argument is evaluated
+HOT_PATH_LOGGING = _get_env_flag("UNIFLEX_HOT_PATH_LOGGING", True)
+
+# only every n-th message of sampled call site is logged
+SAMPLE_EVERY = int(os.environ.get("UNIFLEX_HOT_PATH_LOG_SAMPLING", "1"))
+
+
+class LazyMessage(object):
+    """
+    Log message formatted with str.format only when it is emitted;
+    keyword fields are appended as key=value pairs.
+    """
+    __slots__ = ["fmt", "args", "fields"]
+
+    def __init__(self, fmt, args, fields):
+        self.fmt = fmt
+        self.args = args
+        self.fields = fields
+
+    def __str__(self):
+        msg = self.fmt.format(*self.args) if self.args else self.fmt
+        if self.fields:
+            msg = msg + " " + " ".join(
+                "{}={}".format(k, v) for k, v in self.fields.items())
+        return msg
+
+
+class HotPathLogger(object):
+    """
+    Logging facade for high-rate paths of core, e.g. per message or
+    per event. Message is formatted lazily and only if level is
+    enabled; sampled calls log every sampleEvery-th message only.
+    Fields are also passed to handlers as record.fields.
+    """
+
+    def __init__(self, logger, sampleEvery=None):
+        super().__init__()
+        self.logger = logger
+        self.sampleEvery = sampleEvery or SAMPLE_EVERY
+        # call site -> number of calls
+        self.counters = {}
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, fmt, args, fields):
+        # stacklevel points record to caller of debug()
+        self.logger.log(level, LazyMessage(fmt, args, fields),
+                        extra={"fields": fields}, stacklevel=3)
+
+    def debug(self, fmt, *args, **fields):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, fmt, args, fields)
+
+    def info(self, fmt, *args, **fields):
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, fmt, args, fields)
+
+    def sampled_debug(self, fmt, *args, **fields):
+        # format string identifies call site
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        count = self.counters.get(fmt, 0)
+        self.counters[fmt] = count + 1
+        if count % self.sampleEvery == 0:
+            if self.sampleEvery > 1:
+                fields["sampled"] = self.sampleEvery
+            self._log(logging.DEBUG, fmt, args, fields)
@@ -0,0 +1,194 @@
+import os
+import zlib
+import struct
+import pickle
+import logging
+import threading
+from enum import IntEnum
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+# journal file: magic followed by records, each record is header
+# (payload length, crc32, record type, length of transaction id),
+# transaction id and pickled payload; crc covers everything after it,
+# reading stops at first torn or corrupted record
+JOURNAL_MAGIC = b"UFXJRN01"
+recordHeader = struct.Struct("!IIBH")
+
+
+class RecordType(IntEnum):
+    PREPARE = 1
+    COMMIT = 2
+    CHECK = 3
+    ROLLBACK = 4
+    END = 5
+
+
+def pack_record(recordType, txId, data=None):
+    txId = txId.encode('utf-8')
+    payload = b""
+    if data is not None:
+        payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    body = struct.pack("!B", recordType) + txId + payload
+    crc = zlib.crc32(body)
+    return b"".join([recordHeader.pack(len(payload), crc, recordType,
+                                       len(txId)), txId, payload])
+
+
+def read_records(path):
+    """
+    Returns list of (record type, transaction id, data) read from
+    journal; empty list if journal does not exist.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        raise ValueError("Not a journal file: {}".format(path))
+
+    records = []
+    offset = len(JOURNAL_MAGIC)
+    while offset + recordHeader.size <= len(data):
+        length, crc, recordType, idLength = recordHeader.unpack_from(
+            data, offset)
+        start = offset + recordHeader.size
+        end = start + idLength + length
+        if end > len(data):
+            break
+        body = struct.pack("!B", recordType) + data[start:end]
+        if zlib.crc32(body) != crc:
+            break
+        txId = data[start:start + idLength].decode('utf-8')
+        payload = data[start + idLength:end]
+        records.append((RecordType(recordType), txId,
+                        pickle.loads(payload) if payload else None))
+        offset = end
+    return records
+
+
+class Journal(object):
+    """
+    Append-only write-ahead journal with group commit: records are
+    appended to buffer and sync() returns once they are on disk;
+    single fsync covers records of all threads waiting at that time.
+    Leader of group waits groupDelay seconds for more records.
+    """
+
+    def __init__(self, path, groupDelay=0):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.path = path
+        self.groupDelay = groupDelay
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.condition = threading.Condition()
+        # sequence number of last appended and last durable record
+        self.lsn = 0
+        self.durableLsn = 0
+        self.syncing = False
+        self.syncs = 0
+        self.file = None
+        self._open()
+
+    def _open(self):
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(JOURNAL_MAGIC)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def append(self, recordType, txId, data=None):
+        """
+        Appends record; returns its sequence number for sync().
+        """
+        record = pack_record(recordType, txId, data)
+        with self.condition:
+            self.file.write(record)
+            self.lsn = self.lsn + 1
+            return self.lsn
+
+    def sync(self, lsn=None):
+        """
+        Waits until record with given sequence number, or all
+        appended records, are on disk.
+        """
+        with self.condition:
+            if lsn is None:
+                lsn = self.lsn
+            while self.durableLsn < lsn:
+                if self.syncing:
+                    # record is written by fsync of current leader
+                    self.condition.wait()
+                    continue
+                self.syncing = True
+                try:
+                    if self.groupDelay:
+                        self.condition.wait(self.groupDelay)
+                    target = self.lsn
+                    self.file.flush()
+                    fd = self.file.fileno()
+                    self.condition.release()
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        self.condition.acquire()
+                    self.durableLsn = max(self.durableLsn, target)
+                    self.syncs = self.syncs + 1
+                finally:
+                    self.syncing = False
+                    self.condition.notify_all()
+
+    def get_size(self):
+        with self.condition:
+            if self.file.closed:
+                return 0
+            return self.file.tell()
+
+    def checkpoint(self, records):
+        """
+        Replaces journal with given records, i.e. state of unfinished
+        transactions; new journal is synced before it replaces old one.
+        """
+        with self.condition:
+            while self.syncing:
+                self.condition.wait()
+            tmpPath = self.path + ".tmp"
+            with open(tmpPath, "wb") as f:
+                f.write(JOURNAL_MAGIC)
+                for recordType, txId, data in records:
+                    f.write(pack_record(recordType, txId, data))
+                f.flush()
+                os.fsync(f.fileno())
+            self.file.close()
+            os.replace(tmpPath, self.path)
+            self._sync_directory()
+            self._open()
+            self.durableLsn = self.lsn
+            self.condition.notify_all()
+        self.log.debug("Checkpoint of {} with {} records"
+                       .format(self.path, len(records)))
+
+    def _sync_directory(self):
+        try:
+            fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def close(self):
+        with self.condition:
+            if self.file is not None and not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
@@ -0,0 +1,246 @@
+import os
+import json
+import types
+import inspect
+import logging
+import threading
+import importlib.util
+from importlib import import_module
+
+from . import events
+from .modules import (UniFlexModule, DeviceModule, ControlApplication,
+                      on_event, get_module_functions)
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+def get_default_cache_path():
+    return os.path.join(os.path.expanduser("~"), ".uniflex",
+                        "module_metadata.json")
+
+
+def describe_module_class(cls):
+    """
+    Returns metadata of module class: its kind, exported functions
+    and event handlers as [handler, event module, event class, priority].
+    """
+    if issubclass(cls, ControlApplication):
+        kind = "application"
+    elif issubclass(cls, DeviceModule):
+        kind = "device"
+    else:
+        kind = "module"
+
+    handlers = []
+    for name, handler in inspect.getmembers(cls, inspect.isfunction):
+        for evCls in getattr(handler, 'callers', {}):
+            priority = getattr(handler, 'priority', None)
+            if priority is not None:
+                priority = int(priority)
+            handlers.append([name, evCls.__module__, evCls.__name__,
+                             priority])
+
+    return {"kind": kind,
+            "functions": get_module_functions(cls),
+            "handlers": handlers}
+
+
+def get_class_modules(cls):
+    """
+    Returns names of python modules defining class and its bases,
+    except uniflex core.
+    """
+    names = []
+    for base in inspect.getmro(cls):
+        name = base.__module__
+        if (name == "builtins" or name.startswith("uniflex.core") or
+                name in names):
+            continue
+        names.append(name)
+    return names
+
+
+class ModuleMetadataCache(object):
+    """
+    Metadata of module classes stored in JSON file; entry is valid
+    as long as source files of python modules defining class and its
+    bases are not modified.
+    """
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.path = path or get_default_cache_path()
+        self.dirty = False
+        self.lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (IOError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def get_source_signature(pyModuleName):
+        try:
+            spec = importlib.util.find_spec(pyModuleName)
+        except (ImportError, ValueError):
+            return None
+        if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+            return None
+        stat = os.stat(spec.origin)
+        return [spec.origin, stat.st_mtime, stat.st_size]
+
+    def get(self, pyModuleName, className):
+        entry = self.entries.get("{}:{}".format(pyModuleName, className))
+        if entry is None or "modules" not in entry:
+            return None
+        if entry["source"] != [self.get_source_signature(name)
+                               for name in entry["modules"]]:
+            return None
+        return entry
+
+    def load(self, pyModuleName, className):
+        """
+        Returns metadata of module class; python module is imported
+        only if there is no valid entry in cache.
+        """
+        entry = self.get(pyModuleName, className)
+        if entry is not None:
+            return entry
+
+        pyModule = import_module(pyModuleName)
+        cls = getattr(pyModule, className)
+        entry = describe_module_class(cls)
+        # class can be also imported into python module
+        entry["modules"] = [pyModuleName] + [
+            name for name in get_class_modules(cls) if name != pyModuleName]
+        entry["source"] = [self.get_source_signature(name)
+                           for name in entry["modules"]]
+        with self.lock:
+            self.entries["{}:{}".format(pyModuleName, className)] = entry
+            self.dirty = True
+        return entry
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmpPath = self.path + ".tmp"
+                with open(tmpPath, "w") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmpPath, self.path)
+                self.dirty = False
+            except (IOError, OSError) as e:
+                self.log.warning("Cannot save module metadata to {}: {}"
+                                 .format(self.path, e))
+
+
+class LazyModule(UniFlexModule):
+    """
+    Stub of module declared in config (lazy: true). It is registered
+    with cached metadata of module class and imports and creates real
+    module on first event or function call; real module gets uuid,
+    device, description and worker of stub, so that it is stopped
+    and monitored together with stub.
+    """
+
+    def __init__(self, moduleName, pyModuleName, className, metadata,
+                 device=None, kwargs={}):
+        super().__init__()
+        self.name = className
+        self.device = device
+        self.pyModuleName = pyModuleName
+        self.className = className
+        self.lazyKwargs = kwargs
+        self.module = None
+        self._loadLock = threading.Lock()
+
+        self.functions = list(metadata["functions"])
+        for func in self.functions:
+            setattr(self, func, self._create_function_proxy(func))
+        for handlerName, evModule, evName, priority in metadata["handlers"]:
+            evCls = getattr(import_module(evModule), evName)
+            if priority is not None:
+                priority = events.EventPriority(priority)
+            self._add_event_forwarder(handlerName, evCls, priority)
+
+    def get_module(self):
+        """
+        Returns real module; it is created on first use.
+        """
+        if self.module is None:
+            with self._loadLock:
+                if self.module is None:
+                    self.module = self._create_module()
+        return self.module
+
+    def _create_module(self):
+        self.log.debug("Load module {}:{}".format(self.pyModuleName,
+                                                  self.className))
+        pyModule = import_module(self.pyModuleName)
+        module = getattr(pyModule, self.className)(**self.lazyKwargs)
+        module.uuid = self.uuid
+        if self.device:
+            module.device = self.device
+        module.set_module_manager(self.moduleManager)
+        module.set_agent(self.agent)
+        module.localNode = self.localNode
+        module.in_events = self.in_events
+        module.out_events = self.out_events
+        module.worker = self.worker
+        self.worker.module = module
+        return module
+
+    def _create_function_proxy(self, name):
+        def call(*args, **kwargs):
+            module = self.get_module()
+            handler = getattr(module, name)
+            if hasattr(handler, '_before_call_'):
+                handler._before_call_(module)
+            value = handler(*args, **kwargs)
+            if hasattr(handler, '_after_call_'):
+                handler._after_call_(module)
+            return value
+        call.__name__ = name
+        return call
+
+    def _add_event_forwarder(self, handlerName, evCls, priority):
+        def forward(self, event):
+            # module that was never used does not have to exit
+            if self.module is None and evCls is events.AgentExitEvent:
+                return
+            # forwarder already runs in worker shared with real module
+            handler = getattr(self.get_module(), handlerName)
+            if len(inspect.getfullargspec(handler)[0]) == 1:
+                handler()
+            else:
+                handler(event)
+        forward.__name__ = "_lazy_{}_{}".format(handlerName, evCls.__name__)
+        forward = on_event(evCls, priority=priority)(forward)
+        setattr(self, forward.__name__, types.MethodType(forward, self))
+
+
+class LazyDeviceModule(LazyModule, DeviceModule):
+    pass
+
+
+class LazyControlApplication(LazyModule, ControlApplication):
+    pass
+
+
+_lazyModuleClasses = {"module": LazyModule,
+                      "device": LazyDeviceModule,
+                      "application": LazyControlApplication}
+
+
+def create_lazy_module(moduleName, pyModuleName, className, metadata,
+                       device=None, kwargs={}):
+    lazyClass = _lazyModuleClasses[metadata["kind"]]
+    return lazyClass(moduleName, pyModuleName, className, metadata,
+                     device, kwargs)
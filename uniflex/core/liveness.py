@@ -0,0 +1,126 @@
+import copy
+import time
+import json
+import logging
+
+import uniflex.msgs as msgs
+from .compression import PayloadCompressor
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class HelloAggregator(object):
+    """
+    Aggregates liveness of nodes in broker. Every message forwarded
+    by broker refreshes its source node; explicit HelloMsgs are
+    consumed and once per interval single HelloAggregateMsg with all
+    nodes seen in that interval is published on HELLO_MSG topic.
+    """
+    topic = b"HELLO_MSG"
+    exitTopic = b"NODE_EXIT"
+    sourceUuid = "BROKER"
+
+    def __init__(self, interval=1, timeout=10):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.interval = interval
+        self.timeout = timeout
+        self.lastAggregation = time.time()
+        # last hello of every node, keeps its info hash
+        self.hellos = {}
+        self.seen = set()
+        self.compressor = PayloadCompressor()
+
+    def get_subscriptions(self):
+        # broker has to see traffic of all nodes, also events
+        # that nobody subscribed for, otherwise busy nodes that
+        # suppress hellos would be considered as lost
+        return [b""]
+
+    def process_msg(self, message, msgDesc=None):
+        """
+        Refresh source node of forwarded message; msgDesc is its
+        header if already parsed.
+        Returns True if message was consumed and must not be forwarded.
+        """
+        if msgDesc is None:
+            msgDesc = msgs.MessageDescription.parse(
+                json.loads(message[1].decode('utf-8')))
+        src = msgDesc.sourceUuid
+        if not src:
+            return False
+
+        # only hello and exit topics are interpreted, messages on
+        # other topics just refresh their source
+        if (message[0] == self.exitTopic and
+                msgDesc.msgType == msgs.get_msg_type(msgs.NodeExitMsg)):
+            self.remove_node(src)
+            return False
+
+        self.seen.add(src)
+
+        if (message[0] == self.topic and
+                msgDesc.msgType == msgs.get_msg_type(msgs.HelloMsg)):
+            payload = message[2]
+            if msgDesc.compression:
+                try:
+                    # header is shared with other services of broker
+                    payload = self.compressor.decompress(
+                        copy.copy(msgDesc), payload)
+                except Exception:
+                    return False
+            msg = msgs.HelloMsg()
+            msg.ParseFromString(bytes(payload))
+            self.hellos[src] = msg
+            return True
+
+        return False
+
+    def get_timeout(self):
+        """
+        Returns time in ms till next aggregated hello.
+        """
+        remaining = self.lastAggregation + self.interval - time.time()
+        return max(int(remaining * 1000), 0)
+
+    def create_aggregate_msg(self):
+        """
+        Returns aggregated hello if it is time to send it; otherwise None.
+        """
+        if self.get_timeout() > 0:
+            return None
+        self.lastAggregation = time.time()
+
+        if not self.seen:
+            return None
+
+        msg = msgs.HelloAggregateMsg()
+        for src in self.seen:
+            hello = msg.hellos.add()
+            knownHello = self.hellos.get(src, None)
+            if knownHello is not None:
+                hello.CopyFrom(knownHello)
+            else:
+                hello.uuid = src
+                hello.timeout = self.timeout
+        self.seen = set()
+
+        self.log.debug("Broker sends aggregated hello for {} nodes"
+                       .format(len(msg.hellos)))
+
+        msgDesc = msgs.MessageDescription()
+        msgDesc.msgType = msgs.get_msg_type(msgs.HelloAggregateMsg)
+        msgDesc.sourceUuid = self.sourceUuid
+        msgDesc.serializationType = msgs.SerializationType.PROTOBUF
+        msgDesc = json.dumps(msgDesc.serialize())
+
+        return [self.topic, msgDesc.encode('utf-8'),
+                msg.SerializeToString()]
+
+    def remove_node(self, agentUuid):
+        self.hellos.pop(agentUuid, None)
+        self.seen.discard(agentUuid)
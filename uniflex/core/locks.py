@@ -0,0 +1,120 @@
+import time
+import logging
+import threading
+from enum import IntEnum
+
+from .exceptions import EntityLockedException
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class LockMode(IntEnum):
+    INTENTION_SHARED = 1
+    INTENTION_EXCLUSIVE = 2
+    SHARED = 3
+    EXCLUSIVE = 4
+
+
+# mode -> modes of other owners it can be held together with
+COMPATIBLE = {
+    LockMode.INTENTION_SHARED: {LockMode.INTENTION_SHARED,
+                                LockMode.INTENTION_EXCLUSIVE,
+                                LockMode.SHARED},
+    LockMode.INTENTION_EXCLUSIVE: {LockMode.INTENTION_SHARED,
+                                   LockMode.INTENTION_EXCLUSIVE},
+    LockMode.SHARED: {LockMode.INTENTION_SHARED, LockMode.SHARED},
+    LockMode.EXCLUSIVE: set(),
+}
+
+
+def get_intention_mode(mode):
+    """
+    Returns mode of parent (node) lock for lock of its child.
+    """
+    if mode in [LockMode.INTENTION_SHARED, LockMode.SHARED]:
+        return LockMode.INTENTION_SHARED
+    return LockMode.INTENTION_EXCLUSIVE
+
+
+def combine_modes(mode, other):
+    """
+    Returns weakest mode covering both modes of the same owner.
+    """
+    if mode is None or mode == other:
+        return other
+    modes = {mode, other}
+    if modes <= {LockMode.INTENTION_SHARED, LockMode.SHARED}:
+        return LockMode.SHARED
+    if modes <= {LockMode.INTENTION_SHARED, LockMode.INTENTION_EXCLUSIVE}:
+        return LockMode.INTENTION_EXCLUSIVE
+    return LockMode.EXCLUSIVE
+
+
+class LockManager(object):
+    """
+    Shared, exclusive and intention locks of node and its modules.
+    Owner requests all its locks at once and they are granted one
+    by one in given order: node before modules, modules in order of
+    uuid. As all owners follow this order, owners waiting for each
+    other in one node cannot deadlock. Owner holding locks in many
+    nodes (a transaction) can still wait for other one in a cycle
+    across nodes; waits are bounded by timeout for this reason.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.condition = threading.Condition()
+        # key -> {owner: mode}
+        self.locks = {}
+        # owner -> set of keys
+        self.owned = {}
+
+    def _get_conflict(self, key, owner, mode):
+        for holder, held in self.locks.get(key, {}).items():
+            if holder != owner and held not in COMPATIBLE[mode]:
+                return holder
+        return None
+
+    def acquire(self, owner, requests, timeout=0):
+        """
+        Acquires (key, mode) requests in their order, waiting at
+        most timeout seconds for conflicting owners. If lock cannot
+        be granted, all locks of owner are released and
+        EntityLockedException is raised.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            for key, mode in requests:
+                mode = combine_modes(self.locks.get(key, {}).get(owner),
+                                     mode)
+                holder = self._get_conflict(key, owner, mode)
+                while holder is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._release(owner)
+                        raise EntityLockedException(entity=key, owner=holder)
+                    self.condition.wait(remaining)
+                    holder = self._get_conflict(key, owner, mode)
+                self.locks.setdefault(key, {})[owner] = mode
+                self.owned.setdefault(owner, set()).add(key)
+
+    def _release(self, owner):
+        for key in self.owned.pop(owner, ()):
+            holders = self.locks.get(key, {})
+            holders.pop(owner, None)
+            if not holders:
+                self.locks.pop(key, None)
+        self.condition.notify_all()
+
+    def release(self, owner):
+        with self.condition:
+            self._release(owner)
+
+    def get_holders(self, key):
+        with self.condition:
+            return dict(self.locks.get(key, {}))
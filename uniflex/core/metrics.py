@@ -0,0 +1,330 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+# seconds, from 10us to 10s
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    labels = ",".join('{}="{}"'.format(
+        name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values))
+    return "{" + labels + "}"
+
+
+class CounterValue(object):
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value = self.value + amount
+
+    def get(self):
+        return self.value
+
+
+class GaugeValue(CounterValue):
+    def __init__(self):
+        super().__init__()
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        # value is read from function on every collection
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class HistogramValue(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[idx] = self.counts[idx] + 1
+            self.sum = self.sum + value
+            self.count = self.count + 1
+
+    def get(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+            count = self.count
+        cumulative = []
+        acc = 0
+        for bound, num in zip(list(self.buckets) + [float("inf")], counts):
+            acc = acc + num
+            cumulative.append((bound, acc))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+class Metric(object):
+    """
+    Metric family; values are kept per tuple of label values.
+    """
+    type = None
+    valueClass = None
+
+    def __init__(self, name, documentation, labelNames=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = tuple(labelNames)
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+        if not self.labelNames:
+            self.values[()] = self._create_value()
+
+    def _create_value(self):
+        return self.valueClass()
+
+    def labels(self, *labelValues):
+        value = self.values.get(labelValues, None)
+        if value is None:
+            if len(labelValues) != len(self.labelNames):
+                raise ValueError("Metric {} has labels {}"
+                                 .format(self.name, self.labelNames))
+            with self.lock:
+                value = self.values.get(labelValues, None)
+                if value is None:
+                    value = self._create_value()
+                    self.values[labelValues] = value
+        return value
+
+    def remove(self, *labelValues):
+        with self.lock:
+            self.values.pop(labelValues, None)
+
+    def collect(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [(labelValues, value.get()) for labelValues, value in items]
+
+
+class Counter(Metric):
+    type = "counter"
+    valueClass = CounterValue
+
+    def inc(self, amount=1):
+        self.values[()].inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+    valueClass = GaugeValue
+
+    def set(self, value):
+        self.values[()].set(value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelNames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelNames)
+
+    def _create_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.values[()].observe(value)
+
+
+class MetricsRegistry(object):
+    """
+    Registry of metrics of single process. Instrumented code records
+    values only if registry is enabled; values can be read with
+    snapshot() or exported in Prometheus text format to file or
+    HTTP endpoint.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.enabled = False
+        self.metrics = OrderedDict()
+        self.lock = threading.Lock()
+        self.httpServer = None
+        self.fileExporter = None
+
+    def _register(self, metricClass, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name, None)
+            if metric is None:
+                metric = metricClass(name, *args, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, metricClass):
+                raise ValueError("Metric {} already registered as {}"
+                                 .format(name, metric.type))
+        return metric
+
+    def counter(self, name, documentation, labelNames=()):
+        return self._register(Counter, name, documentation, labelNames)
+
+    def gauge(self, name, documentation, labelNames=()):
+        return self._register(Gauge, name, documentation, labelNames)
+
+    def histogram(self, name, documentation, labelNames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelNames,
+                              buckets)
+
+    def snapshot(self):
+        """
+        Returns {metric name: {label values: value}}; value of
+        histogram is dict with cumulative buckets, sum and count.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: dict(metric.collect()) for metric in metrics}
+
+    def to_prometheus(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP {} {}".format(metric.name,
+                                               metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.type))
+            for labelValues, value in metric.collect():
+                if metric.type != "histogram":
+                    lines.append("{}{} {}".format(
+                        metric.name,
+                        _format_labels(metric.labelNames, labelValues),
+                        _format_value(value)))
+                    continue
+                for bound, count in value["buckets"]:
+                    lines.append("{}_bucket{} {}".format(
+                        metric.name,
+                        _format_labels(metric.labelNames + ("le",),
+                                       labelValues + (_format_value(bound),)),
+                        count))
+                labels = _format_labels(metric.labelNames, labelValues)
+                lines.append("{}_sum{} {}".format(metric.name, labels,
+                                                  _format_value(value["sum"])))
+                lines.append("{}_count{} {}".format(metric.name, labels,
+                                                    value["count"]))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # file is replaced atomically, e.g. for node_exporter textfile
+        tmpPath = path + ".tmp"
+        with open(tmpPath, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmpPath, path)
+
+    def start_file_exporter(self, path, interval=10):
+        def export():
+            while self.fileExporter is not None:
+                try:
+                    self.write_prometheus(path)
+                except (IOError, OSError) as e:
+                    self.log.warning("Cannot write metrics to {}: {}"
+                                     .format(path, e))
+                time.sleep(interval)
+
+        self.fileExporter = threading.Thread(target=export)
+        self.fileExporter.daemon = True
+        self.fileExporter.start()
+
+    def start_http_server(self, port, address=""):
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpServer = ThreadingHTTPServer((address, port), MetricsHandler)
+        self.httpServer.daemon_threads = True
+        thread = threading.Thread(target=self.httpServer.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.httpServer.server_address[1]
+
+    def stop(self):
+        self.fileExporter = None
+        if self.httpServer:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            self.httpServer = None
+
+
+registry = MetricsRegistry()
+
+eventsDispatched = registry.counter(
+    "uniflex_events_total", "Events dispatched to module handlers",
+    ["event"])
+handlerQueueTime = registry.histogram(
+    "uniflex_handler_queue_seconds",
+    "Time between event dispatch and start of handler", ["handler"])
+handlerExecutionTime = registry.histogram(
+    "uniflex_handler_execution_seconds", "Execution time of handler",
+    ["handler"])
+mailboxDepth = registry.gauge(
+    "uniflex_module_mailbox_depth", "Tasks waiting in module worker",
+    ["module", "device", "uuid"])
+rpcTime = registry.histogram(
+    "uniflex_rpc_seconds", "Round-trip time of function calls",
+    ["function"])
+transportMessages = registry.counter(
+    "uniflex_transport_messages_total", "Messages sent and received",
+    ["direction"])
+transportBytes = registry.counter(
+    "uniflex_transport_bytes_total", "Bytes sent and received",
+    ["direction"])
+serializationTime = registry.histogram(
+    "uniflex_serialization_seconds", "Serialization time per codec",
+    ["codec", "operation"])
+brokerMessages = registry.counter(
+    "uniflex_broker_forwarded_messages_total",
+    "Messages forwarded by broker")
+brokerBytes = registry.counter(
+    "uniflex_broker_forwarded_bytes_total", "Bytes forwarded by broker")
@@ -0,0 +1,714 @@
+import os
+import sys
+import copy
+import time
+import json
+import uuid
+import types
+import inspect
+import logging
+import tempfile
+import threading
+import subprocess
+from queue import Queue, Empty
+from importlib import import_module
+
+import zmq
+
+from . import events
+from . import serialization
+from .modules import UniFlexModule, on_event
+from .node import Node
+from .exceptions import FunctionCallTimeoutException
+import uniflex.msgs as msgs
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class BridgeDecodeError(Exception):
+    """
+    Message received over bridge cannot be deserialized; kind and id
+    of message are known from its header.
+    """
+
+    def __init__(self, kind, msgId, error):
+        super().__init__("Cannot decode {} message: {!r}"
+                         .format(kind, error))
+        self.kind = kind
+        self.msgId = msgId
+        self.error = error
+
+
+class Bridge(object):
+    """
+    Pair of PUSH/PULL sockets over ipc; messages are tuples of kind,
+    id or other data, serialized with serialization module. Kind and
+    id are also sent in header, so that message that cannot be
+    deserialized can be still answered.
+    """
+
+    def __init__(self, context, pushUrl, pullUrl, bind):
+        super().__init__()
+        self.push = context.socket(zmq.PUSH)
+        self.pull = context.socket(zmq.PULL)
+        for sock in [self.push, self.pull]:
+            sock.setsockopt(zmq.LINGER, 0)
+        self.boundUrls = []
+        if bind:
+            self.push.bind(pushUrl)
+            self.pull.bind(pullUrl)
+            self.boundUrls = [pushUrl, pullUrl]
+        else:
+            self.push.connect(pushUrl)
+            self.pull.connect(pullUrl)
+        self.lock = threading.Lock()
+
+    def send(self, msg, block=True):
+        data, buffers, sType = serialization.dumps(msg)
+        msgId = None
+        if len(msg) > 1 and isinstance(msg[1], int):
+            msgId = msg[1]
+        header = json.dumps([msg[0], msgId]).encode('utf-8')
+        frames = [str(int(sType)).encode('utf-8'), header, data] + buffers
+        flags = 0 if block else zmq.NOBLOCK
+        with self.lock:
+            self.push.send_multipart(frames, flags=flags, copy=False)
+
+    def recv(self, timeout=None):
+        if timeout is not None and not self.pull.poll(timeout):
+            return None
+        frames = self.pull.recv_multipart(copy=False)
+        sType = serialization.SerializationType(int(frames[0].bytes))
+        kind, msgId = json.loads(frames[1].bytes.decode('utf-8'))
+        buffers = [f.buffer for f in frames[3:]]
+        try:
+            # bridge connects processes of one agent
+            return serialization.loads(frames[2].buffer, buffers, sType,
+                                       trusted=True)
+        except Exception as e:
+            raise BridgeDecodeError(kind, msgId, e)
+
+    def close(self):
+        self.push.close()
+        self.pull.close()
+        for url in self.boundUrls:
+            path = url[len("ipc://"):]
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def flatten_event(event):
+    """
+    Returns copy of event that can be sent to other process;
+    nodes and modules are replaced by their uuids.
+    """
+    event = copy.copy(event)
+    for attr in ["srcNode", "node"]:
+        node = getattr(event, attr, None)
+        if isinstance(node, Node):
+            setattr(event, attr, node.uuid)
+    for attr in ["srcModule", "device"]:
+        module = getattr(event, attr, None)
+        if module is not None and not isinstance(module, str):
+            setattr(event, attr, module.uuid)
+    # response queue of local blocking call stays in agent
+    if hasattr(event, 'responseQueue'):
+        event.responseQueue = None
+    return event
+
+
+class ModuleHostProcess(object):
+    """
+    Child process hosting one or more modules (hosting: process or
+    shard). Agent talks to it over single ipc bridge; every hosted
+    module has its stand-in (ModuleHost) registered in agent. Nodes
+    known to agent are replicated read-only to child on demand.
+    """
+    startTimeout = 30
+    # seconds to wait for return value of hosted function
+    callTimeout = 60
+
+    def __init__(self, name="host"):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.name = name
+        self.uuid = str(uuid.uuid4())
+        # module uuid -> stand-in
+        self.hosts = {}
+        self.activeHosts = set()
+        self.process = None
+        self.running = False
+        self.calls = {}
+        self.callIdGen = 0
+        self._callLock = threading.Lock()
+        # node uuid -> version of replicated node
+        self.replicatedNodes = {}
+        self._replicationLock = threading.Lock()
+
+        path = os.path.join(tempfile.gettempdir(),
+                            "uniflex-host-{}".format(self.uuid))
+        self.urls = ["ipc://{}-in.ipc".format(path),
+                     "ipc://{}-out.ipc".format(path)]
+        self.context = zmq.Context()
+        self.bridge = Bridge(self.context, self.urls[0], self.urls[1],
+                             bind=True)
+
+    def add_module(self, host):
+        host.hostProcess = self
+        self.hosts[host.uuid] = host
+        self.activeHosts.add(host.uuid)
+
+    def start(self, agentUuid=None):
+        spec = {"modules": [h.get_spec() for h in self.hosts.values()],
+                "agent_uuid": agentUuid,
+                "in": self.urls[0],
+                "out": self.urls[1],
+                "log_level": logging.getLogger().getEffectiveLevel()}
+
+        env = dict(os.environ)
+        # child has to find the same modules as agent
+        env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uniflex.core.module_host",
+             json.dumps(spec)], env=env)
+        for host in self.hosts.values():
+            host.process = self.process
+
+        msg = self.bridge.recv(self.startTimeout * 1000)
+        if msg is None or msg[0] != "hello":
+            self.process.kill()
+            self.bridge.close()
+            raise RuntimeError("Module host {} did not start"
+                               .format(self.name))
+        self.log.debug("Module host {} started in process {}"
+                       .format(self.name, self.process.pid))
+
+        for moduleUuid, info in msg[1].items():
+            self.hosts[moduleUuid]._set_hosted_info(info)
+
+        self.running = True
+        thread = threading.Thread(target=self._recv_msgs)
+        thread.daemon = True
+        thread.start()
+
+    def replicate_node(self, node):
+        with self._replicationLock:
+            if self.replicatedNodes.get(node.uuid, None) == node.version:
+                return
+            self.replicatedNodes[node.uuid] = node.version
+            self.bridge.send(
+                ("node", node.create_node_info_msg().SerializeToString()))
+
+    def remove_node(self, nodeUuid):
+        with self._replicationLock:
+            if self.replicatedNodes.pop(nodeUuid, None) is None:
+                return
+            self.bridge.send(("remove_node", nodeUuid))
+
+    def forward_event(self, host, event):
+        if not self.running:
+            return
+        if host.localNode is not None:
+            self.replicate_node(host.localNode)
+        # removed node must not be replicated again
+        if not isinstance(event, (events.NodeExitEvent,
+                                  events.NodeLostEvent)):
+            for attr in ["srcNode", "node"]:
+                node = getattr(event, attr, None)
+                if isinstance(node, Node):
+                    self.replicate_node(node)
+        self.bridge.send(("event", host.uuid, flatten_event(event)))
+
+    def call(self, host, name, args, kwargs):
+        if not self.running:
+            raise RuntimeError("Hosted module {} is not running"
+                               .format(host.className))
+        with self._callLock:
+            self.callIdGen = self.callIdGen + 1
+            callId = self.callIdGen
+            queue = Queue()
+            self.calls[callId] = queue
+        try:
+            self.bridge.send(("call", callId, host.uuid, name, args, kwargs))
+            isException, value = queue.get(timeout=self.callTimeout)
+        except Empty:
+            raise FunctionCallTimeoutException(func_name=name,
+                                               timeout=self.callTimeout)
+        finally:
+            self.calls.pop(callId, None)
+        if isException:
+            raise value
+        return value
+
+    def _serve_cmd(self, cmdId, event, dstNodeUuid, reply):
+        # function call of hosted module is executed in its name by agent
+        host = self.hosts.get(event.srcModule, None)
+        try:
+            agent = host.agent
+            dstNode = agent.nodeManager.get_node_by_uuid(dstNodeUuid)
+            if dstNode is None:
+                raise RuntimeError("Unknown node: {}".format(dstNodeUuid))
+            event.srcModule = host
+            event.srcNode = agent.nodeManager.get_local_node()
+            value = dstNode.send_cmd_event(event)
+            isException = False
+        except Exception as e:
+            value = e
+            isException = True
+        if reply:
+            self.bridge.send(("cmdreturn", cmdId, isException, value))
+
+    def _recv_msgs(self):
+        try:
+            while self.running:
+                try:
+                    msg = self.bridge.recv(500)
+                except zmq.error.ZMQError:
+                    break
+                except BridgeDecodeError as e:
+                    self.log.error("Module host {}: {}".format(self.name, e))
+                    queue = self.calls.get(e.msgId, None)
+                    if e.kind == "return" and queue:
+                        queue.put((True, e))
+                    continue
+                if msg is None:
+                    if self.process.poll() is not None:
+                        self.log.error("Module host {} exited"
+                                       .format(self.name))
+                        break
+                    continue
+                self._serve_msg(msg)
+        finally:
+            # nobody would answer pending calls
+            self._fail_calls()
+
+    def _serve_msg(self, msg):
+        if msg[0] == "event":
+            host = self.hosts.get(msg[1], None)
+            if host is None:
+                return
+            event, dstNodeUuid = msg[2], msg[3]
+            dstNode = None
+            if dstNodeUuid is not None:
+                dstNode = host.agent.nodeManager.get_node_by_uuid(
+                    dstNodeUuid)
+                if dstNode is None:
+                    self.log.debug("Event {} to unknown node {} dropped"
+                                   .format(event.__class__.__name__,
+                                           dstNodeUuid))
+                    return
+            event.srcModule = None
+            event.srcNode = None
+            host.send_event(event, dstNode)
+        elif msg[0] == "return":
+            queue = self.calls.get(msg[1], None)
+            if queue:
+                queue.put((msg[2], msg[3]))
+        elif msg[0] == "cmd":
+            # call of local module may call back into this process
+            thread = threading.Thread(target=self._serve_cmd,
+                                      args=msg[1:])
+            thread.daemon = True
+            thread.start()
+
+    def _fail_calls(self):
+        self.running = False
+        for queue in list(self.calls.values()):
+            queue.put((True, RuntimeError("Hosted module exited")))
+
+    def release(self, host):
+        # process is stopped when all its modules exited
+        self.activeHosts.discard(host.uuid)
+        if not self.activeHosts:
+            self.stop()
+
+    def stop(self, timeout=2):
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.bridge.send(("exit",), block=False)
+            self.process.wait(timeout)
+        except (zmq.error.Again, subprocess.TimeoutExpired):
+            self.process.kill()
+        self._fail_calls()
+        self.bridge.close()
+        self.context.term()
+
+
+class ModuleHost(UniFlexModule):
+    """
+    Stand-in of module hosted in child process (hosting: process or
+    shard). It has the same uuid, name, device, functions and event
+    handlers as hosted module and forwards events and function calls
+    over ipc bridge of its host process. Events sent by hosted module
+    are sent by stand-in, so for the rest of agent and other nodes it
+    looks like any other module.
+    """
+
+    def __init__(self, moduleName, pyModuleName, className,
+                 device=None, kwargs={}, hostProcess=None):
+        super().__init__()
+        self.name = className
+        self.device = device
+        self.pyModuleName = pyModuleName
+        self.className = className
+        self.hostedKwargs = kwargs
+        self.hostProcess = None
+        self.process = None
+        self.forwardsExit = False
+        self.forwardedNodeEvents = set()
+
+        if hostProcess is None:
+            # module runs alone in its own process
+            hostProcess = ModuleHostProcess(className)
+            hostProcess.add_module(self)
+            hostProcess.start()
+        else:
+            hostProcess.add_module(self)
+
+    def get_spec(self):
+        return {"uuid": self.uuid,
+                "module": self.pyModuleName,
+                "class_name": self.className,
+                "device": self.device,
+                "kwargs": self.hostedKwargs}
+
+    def _set_hosted_info(self, info):
+        self.functions = info["functions"]
+        for func in self.functions:
+            setattr(self, func, self._create_function_proxy(func))
+        for evCls, priority in info["events"]:
+            self._add_event_forwarder(evCls, priority)
+
+    def _create_function_proxy(self, name):
+        def call(*args, **kwargs):
+            return self.hostProcess.call(self, name, args, kwargs)
+        call.__name__ = name
+        return call
+
+    def _add_event_forwarder(self, evCls, priority):
+        if evCls is events.AgentExitEvent:
+            # forwarded before host process is stopped
+            self.forwardsExit = True
+            return
+        if evCls in [events.NodeExitEvent, events.NodeLostEvent]:
+            # forwarded before node replica is removed
+            self.forwardedNodeEvents.add(evCls)
+            return
+
+        def forward(self, event):
+            # modules of the same process got event already
+            if getattr(event.srcModule, 'hostProcess', None) is \
+                    self.hostProcess:
+                return
+            self._forward_event(event)
+        forward.__name__ = "_forward_{}".format(evCls.__name__)
+        forward = on_event(evCls, priority=priority)(forward)
+        setattr(self, forward.__name__, types.MethodType(forward, self))
+
+    def _forward_event(self, event):
+        self.hostProcess.forward_event(self, event)
+
+    @on_event([events.NodeExitEvent, events.NodeLostEvent])
+    def _remove_node_replica(self, event):
+        if event.__class__ in self.forwardedNodeEvents:
+            self._forward_event(event)
+        if isinstance(event.node, Node):
+            self.hostProcess.remove_node(event.node.uuid)
+
+    @on_event(events.AgentExitEvent)
+    def _exit_host(self, event):
+        if self.forwardsExit:
+            self._forward_event(event)
+        self.hostProcess.release(self)
+
+    def stop_host(self, timeout=2):
+        self.hostProcess.stop(timeout)
+
+
+class _HostAgent(object):
+    # minimal agent seen by hosted modules
+    def __init__(self, manager):
+        self.nodeManager = manager
+        self.transport = None
+        self.moduleManager = manager
+
+
+class HostedModuleManager(object):
+    """
+    Module and node manager of child process. Events are dispatched
+    to hosted modules and sent to agent; function calls of hosted
+    modules to any node are executed by agent.
+    """
+
+    def __init__(self, spec):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.context = zmq.Context()
+        self.bridge = Bridge(self.context, spec["out"], spec["in"],
+                             bind=False)
+        self.agent = _HostAgent(self)
+        self.agentUuid = spec.get("agent_uuid", None)
+        self.running = True
+        # seconds workers have to serve exit event
+        self.exitTimeout = spec.get("exit_timeout", 5)
+        self.modules = {}
+        # module uuid -> event class -> handlers
+        self._event_handlers = {}
+
+        # read-only replicas of nodes known to agent
+        self.nodes = {}
+        self.removedNodes = {}
+        self.localNode = None
+
+        self.cmdIdGen = 0
+        self.cmdCalls = {}
+        self._cmdLock = threading.Lock()
+
+        hello = {}
+        for moduleSpec in spec["modules"]:
+            module = self._load_module(moduleSpec)
+            handlers = []
+            moduleHandlers = self._event_handlers.setdefault(module.uuid, {})
+            for _k, handler in inspect.getmembers(module, inspect.ismethod):
+                if hasattr(handler, 'callers'):
+                    for evCls in handler.callers:
+                        moduleHandlers.setdefault(evCls, []).append(handler)
+                        handlers.append(
+                            (evCls, getattr(handler, 'priority', None)))
+            hello[module.uuid] = {"functions": module.functions,
+                                  "events": handlers}
+
+        self.bridge.send(("hello", hello))
+
+    def _load_module(self, spec):
+        pyModule = import_module(spec["module"])
+        moduleClass = getattr(pyModule, spec["class_name"])
+        module = moduleClass(**spec["kwargs"])
+        module.uuid = spec["uuid"]
+        if spec["device"]:
+            module.device = spec["device"]
+        module.set_module_manager(self)
+        module.set_agent(self.agent)
+        self.modules[module.uuid] = module
+        return module
+
+    def get_local_node(self):
+        return self.localNode
+
+    def get_node_by_uuid(self, uuid):
+        return self.nodes.get(uuid, None)
+
+    def _update_node(self, data):
+        msg = msgs.NodeInfoMsg()
+        msg.ParseFromString(data)
+        node = self.nodes.get(msg.agent_uuid, None)
+        if node is not None:
+            node.update_from_msg(msg)
+        else:
+            node = Node.create_node_from_msg(msg)
+            node.nodeManager = self
+            self.nodes[node.uuid] = node
+
+        if node.uuid == self.agentUuid:
+            node.local = True
+            self.localNode = node
+            for module in self.modules.values():
+                module.localNode = node
+        if self.localNode is not None:
+            self.localNode.local = True
+            for n in self.nodes.values():
+                for proxy in n.all_modules.values():
+                    proxy._currentNode = self.localNode
+
+    def _remove_node(self, uuid):
+        node = self.nodes.pop(uuid, None)
+        if node is not None:
+            # handlers of node exit event may still refer to it
+            self.removedNodes[uuid] = node
+
+    def _resolve_event(self, event):
+        node = event.srcNode
+        if isinstance(node, str):
+            node = self.nodes.get(node, self.removedNodes.get(node, node))
+        event.srcNode = node
+        if isinstance(getattr(event, 'node', None), str):
+            event.node = self.nodes.get(
+                event.node, self.removedNodes.get(event.node, event.node))
+        elif node is not None:
+            event.node = node
+        if isinstance(node, Node) and isinstance(event.srcModule, str):
+            proxy = node.all_modules.get(event.srcModule, None)
+            if proxy is None:
+                proxy = self.modules.get(event.srcModule, event.srcModule)
+            event.srcModule = proxy
+            # alias
+            event.device = proxy
+        return event
+
+    def send_event_locally(self, event):
+        for handlers in self._event_handlers.values():
+            for handler in handlers.get(event.__class__, []):
+                self._add_task(handler, event)
+
+    def send_event(self, event, dstNode=None):
+        self.send_event_locally(event)
+        # agent sends event further in name of stand-in
+        dstNodeUuid = None
+        if dstNode is not None:
+            dstNodeUuid = getattr(dstNode, 'uuid', dstNode)
+        self.bridge.send(("event", event.srcModule.uuid,
+                          flatten_event(event), dstNodeUuid))
+
+    def send_event_cmd(self, event, dstNode):
+        # called by Node replica; agent calls real node
+        ctx = copy.copy(event.ctx)
+        reply = ctx._blocking or ctx._callback is not None
+        cmdId = None
+        if reply:
+            with self._cmdLock:
+                self.cmdIdGen = self.cmdIdGen + 1
+                cmdId = self.cmdIdGen
+            if ctx._blocking:
+                event.responseQueue = Queue()
+                self.cmdCalls[cmdId] = (event.responseQueue, None)
+            else:
+                self.cmdCalls[cmdId] = (ctx._callback, event)
+            # agent waits for return value in both cases
+            ctx._callback = None
+            ctx._blocking = True
+
+        cmdEvent = flatten_event(event)
+        cmdEvent.ctx = ctx
+        self.bridge.send(("cmd", cmdId, cmdEvent, dstNode.uuid, reply))
+
+    def remove_call(self, event):
+        with self._cmdLock:
+            for cmdId, (target, cmdEvent) in list(self.cmdCalls.items()):
+                if target is event.responseQueue:
+                    self.cmdCalls.pop(cmdId, None)
+
+    def _serve_cmd_return(self, cmdId, isException, value):
+        target, event = self.cmdCalls.pop(cmdId, (None, None))
+        if target is None:
+            return
+        if event is None:
+            # blocking call; Node raises exception
+            target.put(value)
+            return
+        if isException:
+            self.log.error("Call {} failed: {}"
+                           .format(event.ctx._name, value))
+            return
+        retEvent = events.ReturnValueEvent(event.ctx, value)
+        node = self.nodes.get(event.dstNode, None)
+        retEvent.srcNode = node
+        retEvent.node = node
+        if node is not None:
+            retEvent.srcModule = node.all_modules.get(event.dstModule, None)
+            retEvent.device = retEvent.srcModule
+        target.__self__.worker.add_task(target, retEvent)
+
+    def _add_task(self, handler, event):
+        module = handler.__self__
+        priority = getattr(handler, 'priority', event.priority)
+        if len(inspect.getfullargspec(handler)[0]) == 1:
+            module.worker.add_task(handler, None, priority)
+        else:
+            module.worker.add_task(handler, event, priority)
+
+    def _execute(self, callId, moduleUuid, name, args, kwargs):
+        module = self.modules[moduleUuid]
+        # function may call other modules
+        threading.current_thread().module = module
+        handler = getattr(module, name)
+        try:
+            if hasattr(handler, '_before_call_'):
+                handler._before_call_(module)
+            value = handler(*args, **kwargs)
+            if hasattr(handler, '_after_call_'):
+                handler._after_call_(module)
+            self.bridge.send(("return", callId, False, value))
+        except Exception as e:
+            try:
+                self.bridge.send(("return", callId, True, e))
+            except Exception:
+                # exception or return value cannot be serialized
+                self.bridge.send(("return", callId, True,
+                                  RuntimeError(repr(e))))
+
+    def _wait_for_workers(self, timeout):
+        deadline = time.monotonic() + timeout
+        for module in self.modules.values():
+            queue = module.worker.taskQueue
+            with queue.all_tasks_done:
+                # worker that died does not finish its tasks
+                while queue.unfinished_tasks and module.worker.is_alive():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.log.warning("Module {} did not finish {} tasks"
+                                         .format(module.name,
+                                                 queue.unfinished_tasks))
+                        break
+                    queue.all_tasks_done.wait(min(remaining, 0.1))
+
+    def run(self):
+        parent = os.getppid()
+        while self.running:
+            try:
+                msg = self.bridge.recv(1000)
+            except BridgeDecodeError as e:
+                self.log.error("Hosted modules: {}".format(e))
+                if e.kind == "call":
+                    self.bridge.send(("return", e.msgId, True,
+                                      RuntimeError(str(e))))
+                elif e.kind == "cmdreturn":
+                    self._serve_cmd_return(e.msgId, True, e)
+                continue
+            if msg is None:
+                # agent was killed
+                if os.getppid() != parent:
+                    break
+                continue
+
+            if msg[0] == "event":
+                event = self._resolve_event(msg[2])
+                handlers = self._event_handlers.get(msg[1], {})
+                for handler in handlers.get(event.__class__, []):
+                    self._add_task(handler, event)
+            elif msg[0] == "call":
+                thread = threading.Thread(target=self._execute,
+                                          args=msg[1:])
+                thread.daemon = True
+                thread.start()
+            elif msg[0] == "cmdreturn":
+                self._serve_cmd_return(*msg[1:])
+            elif msg[0] == "node":
+                self._update_node(msg[1])
+            elif msg[0] == "remove_node":
+                self._remove_node(msg[1])
+            elif msg[0] == "exit":
+                self.running = False
+
+        # let workers serve exit event
+        self._wait_for_workers(self.exitTimeout)
+        for module in self.modules.values():
+            module.worker.stop()
+        self.bridge.close()
+        self.context.term()
+
+
+def main(spec):
+    logging.basicConfig(level=spec.get("log_level", logging.INFO))
+    manager = HostedModuleManager(spec)
+    manager.run()
+
+
+if __name__ == "__main__":
+    main(json.loads(sys.argv[1]))
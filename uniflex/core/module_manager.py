@@ -1,11 +1,19 @@
+import time
 import logging
 import copy
 import inspect
 import threading
 from importlib import import_module
 from queue import Queue, Empty
+from .common import PriorityLaneQueue
+from .registry import ModuleRegistry
 from .cmd_executor import CommandExecutor
+from .module_host import ModuleHost, ModuleHostProcess
+from .lazy_module import ModuleMetadataCache, create_lazy_module
 from . import events
+from . import metrics
+from . import profiling
+from .hot_logging import HotPathLogger, HOT_PATH_LOGGING
 
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2015, Technische Universitat Berlin"
@@ -17,6 +25,7 @@ class ModuleManager(object):
     def __init__(self, agent):
         self.log = logging.getLogger("{module}.{name}".format(
             module=self.__class__.__module__, name=self.__class__.__name__))
+        self.hotLog = HotPathLogger(self.log)
 
         self.agent = agent
         self._transportChannel = None
@@ -28,25 +37,59 @@ class ModuleManager(object):
 
         self.moduleIdGen = 0
         self.deviceIdGen = 0
-        self.eventQueue = Queue()
+        self.eventQueue = PriorityLaneQueue(len(events.EventPriority))
 
-        self.modules = {}
+        self.modules = ModuleRegistry()
         self._event_handlers = {}
+        # metadata of lazily loaded modules
+        self.metadataCache = None
 
     def my_import(self, module_name):
-        pyModule = import_module(module_name)
-        globals()[module_name] = pyModule
-        return pyModule
+        return import_module(module_name)
 
     def register_module(self, moduleName, pyModuleName,
-                        className, device=None, kwargs={}):
+                        className, device=None, kwargs={},
+                        hosting="thread", lazy=False):
         self.log.debug("Add new module: {}:{}:{}:{}".format(
             moduleName, pyModuleName, className, device))
 
+        if hosting == "process":
+            # module runs in child process, agent keeps its stand-in
+            return self.register_hosted_modules(
+                [(moduleName, pyModuleName, className, device, kwargs)],
+                className)[0]
+
+        if lazy:
+            # module is imported and created on first event or call
+            if self.metadataCache is None:
+                self.metadataCache = ModuleMetadataCache()
+            metadata = self.metadataCache.load(pyModuleName, className)
+            uniflexModule = create_lazy_module(
+                moduleName, pyModuleName, className, metadata,
+                device, kwargs)
+            return self._add_local_module(moduleName, uniflexModule, device)
+
         pyModule = self.my_import(pyModuleName)
         uniflex_module_class = getattr(pyModule, className)
         uniflexModule = uniflex_module_class(**kwargs)
-
+        return self._add_local_module(moduleName, uniflexModule, device)
+
+    def register_hosted_modules(self, specs, name="host"):
+        """
+        Starts child process (shard) hosting all given modules;
+        specs are (moduleName, pyModuleName, className, device, kwargs).
+        Returns list of stand-ins registered in agent.
+        """
+        hostProcess = ModuleHostProcess(name)
+        hosts = [ModuleHost(moduleName, pyModuleName, className,
+                            device, kwargs, hostProcess)
+                 for moduleName, pyModuleName, className, device, kwargs
+                 in specs]
+        hostProcess.start(self.agent.uuid)
+        return [self._add_local_module(spec[0], host, spec[3])
+                for spec, host in zip(specs, hosts)]
+
+    def _add_local_module(self, moduleName, uniflexModule, device):
         if device:
             uniflexModule.device = device
 
@@ -69,14 +112,49 @@ class ModuleManager(object):
         self.subscribe_for_event(uniflexModule)
         self.register_event_handlers(uniflexModule)
 
-        self.modules[uniflexModule.uuid] = uniflexModule
+        self.modules.add(uniflexModule)
+        # modules of the same class and device differ only in uuid
+        metrics.mailboxDepth.labels(
+            uniflexModule.name, uniflexModule.device or "",
+            uniflexModule.uuid).set_function(
+            uniflexModule.worker.taskQueue.qsize)
+
+        if self._nodeManager:
+            self._nodeManager.local_modules_changed()
+        return uniflexModule
+
+    def remove_module(self, uuid):
+        uniflexModule = self.modules.remove(uuid)
+        if uniflexModule is None:
+            return None
+
+        self.log.debug("Remove module: {}".format(uniflexModule))
+        for ev_cls, handlers in self._event_handlers.items():
+            handlers[:] = [h for h in handlers
+                           if h.__self__ is not uniflexModule]
+        uniflexModule.worker.stop()
+        metrics.mailboxDepth.remove(uniflexModule.name,
+                                    uniflexModule.device or "",
+                                    uniflexModule.uuid)
+
+        if self._nodeManager:
+            localNode = self._nodeManager.get_local_node()
+            if localNode:
+                localNode.remove_module_proxy(uuid)
+            self._nodeManager.local_modules_changed()
         return uniflexModule
 
     def get_module_by_uuid(self, uuid):
-        for m in self.modules.values():
-            if m.uuid == uuid:
-                return m
-        return None
+        return self.modules.get_by_uuid(uuid)
+
+    def get_module_by_name(self, name):
+        return self.modules.get_by_name(name)
+
+    def get_module_by_device(self, deviceName):
+        return self.modules.get_by_device(deviceName)
+
+    def get_modules_by_class(self, cls):
+        return self.modules.get_by_class(cls)
 
     def start(self):
         self.log.debug("Notify START to modules".format())
@@ -132,7 +210,7 @@ class ModuleManager(object):
         return handlers
 
     def send_event_locally(self, event):
-        self.eventQueue.put(event)
+        self.eventQueue.put((event.priority, event))
 
     def send_event_outside(self, event, dstNode=None):
         if self.agent.transport:
@@ -141,7 +219,7 @@ class ModuleManager(object):
             self.agent.transport.send_event_outside(eventCopy, dstNode)
 
     def send_event(self, event, dstNode=None):
-        self.eventQueue.put(event)
+        self.eventQueue.put((event.priority, event))
         # quick hack to sent events also through transport channel
         # TODO: improve it
         if self.agent.transport:
@@ -156,17 +234,29 @@ class ModuleManager(object):
             except Empty:
                 continue
             handlers = self.get_event_handlers(event)
-            self.log.debug("Serving event: {}"
-                           .format(event.__class__.__name__))
+            states = None
+            if profiling.hooks.enabled:
+                states = profiling.hooks.before(
+                    profiling.HookPoint.DISPATCH, None,
+                    event.__class__.__name__)
+            if metrics.registry.enabled:
+                metrics.eventsDispatched.labels(
+                    event.__class__.__name__).inc()
+            if HOT_PATH_LOGGING:
+                self.hotLog.sampled_debug("Serving event: {}",
+                                          event.__class__.__name__)
             for handler in handlers:
                 module = handler.__self__
+                # handler may declare its own priority in on_event
+                priority = getattr(handler, 'priority', event.priority)
                 try:
-                    self.log.debug("Add task: {} to worker in module {}"
-                                   .format(handler.__name__, module.name))
-                    if len(inspect.getargspec(handler)[0]) == 1:
-                        module.worker.add_task(handler, None)
+                    if HOT_PATH_LOGGING:
+                        self.hotLog.debug("Add task: {} to worker in module {}",
+                                          handler.__name__, module.name)
+                    if len(inspect.getfullargspec(handler)[0]) == 1:
+                        module.worker.add_task(handler, None, priority)
                     else:
-                        module.worker.add_task(handler, event)
+                        module.worker.add_task(handler, event, priority)
                 except:
                     self.log.debug('Exception occurred during handler '
                                    'processing. Backtrace from offending '
@@ -174,6 +264,9 @@ class ModuleManager(object):
                                    'follows',
                                    handler.__name__,
                                    event.__class__.__name__)
+            if states:
+                profiling.hooks.after(profiling.HookPoint.DISPATCH, None,
+                                      event.__class__.__name__, states)
 
     def send_cmd_event(self, event, dstNode):
         if dstNode.local:
@@ -182,18 +275,33 @@ class ModuleManager(object):
             self.commandExecutor.serve_ctx_command_event(event, True)
         else:
             if event.ctx._blocking:
-                # save reference to response queue
-                self.synchronousCalls[event.ctx._callId] = Queue()
+                # save reference to response queue, reply can pop it
+                # before send returns
+                responseQueue = Queue()
+                self.synchronousCalls[event.ctx._callId] = responseQueue
             elif event.ctx._callback:
                 # save reference to callback
                 module = event.ctx._callback.__self__
-                self.callCallbacks[event.ctx._callId] = [module, event.ctx._callback]
+                # repeated call returns value on every execution
+                replies = 1
+                if event.ctx._interval and event.ctx._repetitionNum:
+                    replies = event.ctx._repetitionNum
+                self.callCallbacks[event.ctx._callId] = [
+                    module, event.ctx._callback, time.perf_counter(),
+                    replies]
                 event.ctx._callback = None
 
             self._transportChannel.send_event_outside(event, dstNode)
 
             if event.ctx._blocking:
-                event.responseQueue = self.synchronousCalls[event.ctx._callId]
+                event.responseQueue = responseQueue
+
+    def remove_call(self, event):
+        """
+        Forgets call that is not awaited any more, e.g. timed out.
+        """
+        self.synchronousCalls.pop(event.ctx._callId, None)
+        self.callCallbacks.pop(event.ctx._callId, None)
 
     def serve_event_msg(self, event):
         srcNodeUuid = event.srcNode
@@ -220,9 +328,6 @@ class ModuleManager(object):
             self._nodeManager.send_node_info_request(srcNodeUuid)
             return
 
-        self.log.debug("received event from node: {}, module: {}"
-                       .format(srcNodeUuid, srcModuleUuid))
-
         if event.srcModule is not None and isinstance(event.srcModule, str):
             event.srcModule = event.node.all_modules.get(event.srcModule, None)
             # alias
@@ -231,20 +336,30 @@ class ModuleManager(object):
         if not event.srcModule:
             return
 
-        self.log.debug("received event {} from node: {}, module: {}"
-                       .format(event.__class__.__name__, event.srcNode.uuid,
-                               event.srcModule.uuid))
+        if HOT_PATH_LOGGING:
+            self.hotLog.debug("received event {}", event.__class__.__name__,
+                              node=srcNodeUuid, module=srcModuleUuid)
 
         if isinstance(event, events.CommandEvent):
             self.commandExecutor.serve_ctx_command_event(event)
 
         elif isinstance(event, events.ReturnValueEvent):
-            if event.ctx._callId in self.synchronousCalls:
-                queue = self.synchronousCalls[event.ctx._callId]
+            # call ids are never reused, entries are removed with
+            # last reply
+            queue = self.synchronousCalls.pop(event.ctx._callId, None)
+            if queue is not None:
                 queue.put(event.msg)
             elif event.ctx._callId in self.callCallbacks:
-                self.log.debug("received cmd: {}".format(event.ctx._name))
-                [module, callback] = self.callCallbacks[event.ctx._callId]
+                if HOT_PATH_LOGGING:
+                    self.hotLog.debug("received cmd: {}", event.ctx._name)
+                entry = self.callCallbacks[event.ctx._callId]
+                module, callback, sent, replies = entry
+                entry[3] = replies - 1
+                if entry[3] <= 0:
+                    self.callCallbacks.pop(event.ctx._callId, None)
+                if metrics.registry.enabled:
+                    metrics.rpcTime.labels(event.ctx._name).observe(
+                        time.perf_counter() - sent)
                 module.worker.add_task(callback, event)
 
         else:
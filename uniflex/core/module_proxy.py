@@ -1,5 +1,7 @@
+import os
 import inspect
 import copy
+import itertools
 import threading
 import logging
 import datetime
@@ -10,6 +12,10 @@ __copyright__ = "Copyright (c) 2015, Technische Universitat Berlin"
 __version__ = "0.1.0"
 __email__ = "{gawlowicz|zubow}@tkn.tu-berlin.de"
 
+# replies are matched by call id in module manager, so ids have to be
+# unique among all proxies; pid keeps ids of module host processes apart
+_callIds = itertools.count((os.getpid() << 32) + 1)
+
 
 class CallingContext(object):
     def __init__(self):
@@ -40,12 +46,12 @@ class ModuleProxy(object):
         self.uuid = None
         self.type = None
         self.name = None
+        self.deviceName = None
         self.node = None
 
-        self._callIdGen = 0
-
-        self._callingCtx = CallingContext()
-        self._clear_call_context()
+        # options of call are set by chained calls in calling thread,
+        # so every thread has its own context
+        self._threadCtx = threading.local()
         self._currentNode = None
 
         # containers for unit description
@@ -53,6 +59,14 @@ class ModuleProxy(object):
         self.in_events = []
         self.out_events = []
 
+    @property
+    def _callingCtx(self):
+        ctx = getattr(self._threadCtx, 'ctx', None)
+        if ctx is None:
+            ctx = CallingContext()
+            self._threadCtx.ctx = ctx
+        return ctx
+
     def __call__(self, method, *args, **kwargs):
         # some magis is here :)
         return self.cmd_wrapper(ftype="function",
@@ -118,6 +132,15 @@ class ModuleProxy(object):
         return self
 
     def timeout(self, value):
+        """
+        Limit waiting for return value of blocking call to
+        given number of seconds; FunctionCallTimeoutException
+        is raised when it expires.
+        Returns the same ModuleProxy object -> function
+        chaning.
+        Example:
+        device.timeout(2).get_channel().
+        """
         self._callingCtx._timeout = value
         return self
 
@@ -152,8 +175,7 @@ class ModuleProxy(object):
         self._callingCtx._callback = None
 
     def generate_call_id(self):
-        self._callIdGen = self._callIdGen + 1
-        return self._callIdGen
+        return next(_callIds)
 
     def send_event(self, event):
         self.log.info("{}".format(event.__class__.__name__))
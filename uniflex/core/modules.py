@@ -1,11 +1,15 @@
+import time
 import uuid
 import logging
 import inspect
-from queue import Queue, Empty
-from threading import Thread
+from queue import Empty
+from threading import Thread, Lock
 from functools import partial
-from uniflex.core.common import is_func_implemented
+from uniflex.core.common import is_func_implemented, PriorityLaneQueue
 from . import events
+from . import metrics
+from . import tracing
+from . import profiling
 
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
@@ -25,12 +29,15 @@ def _is_method(f):
     return inspect.isfunction(f) or inspect.ismethod(f)
 
 
-def on_event(ev_cls, dispatchers=None):
+def on_event(ev_cls, dispatchers=None, priority=None):
     def _set_ev_cls_dec(handler):
         if 'callers' not in dir(handler):
             handler.callers = {}
         for e in _listify(ev_cls):
             handler.callers[e] = e.__module__
+        # overrides priority declared in event class
+        if priority is not None:
+            handler.priority = priority
         return handler
     return _set_ev_cls_dec
 
@@ -49,6 +56,15 @@ def on_first_call_to_module():
     return _set_ev_cls_dec
 
 
+def run_in_pool():
+    # remote calls are served by thread pool instead of receiving
+    # thread, return value is sent once function returns
+    def _set_ev_cls_dec(handler):
+        handler._run_in_pool_ = True
+        return handler
+    return _set_ev_cls_dec
+
+
 def before_call(func):
     def _set_ev_cls_dec(handler):
         if '_before_call_' not in dir(handler):
@@ -65,28 +81,78 @@ def after_call(func):
     return _set_ev_cls_dec
 
 
+_filterFunc = set(["set_agent", "set_module_manager",
+                   "send_event", "get_device",
+                   "get_functions", "get_in_events",
+                   "get_out_events",
+                   "_add_node", "_remove_node",
+                   "get_nodes", "get_node",
+                   "get_node_by_uuid",
+                   "get_node_by_hostname",
+                   "__init__", "recv_msgs"])
+
+# module class -> names of exported functions
+_moduleFunctions = {}
+
+
+def get_module_functions(cls):
+    """
+    Returns names of functions exported by module class;
+    reflection is done once per class.
+    """
+    functions = _moduleFunctions.get(cls, None)
+    if functions is None:
+        funcs = [m for m in dir(cls) if _is_method(getattr(cls, m))]
+        funcs = sorted(list(set(funcs) - _filterFunc))
+
+        # filter not implemented funcs
+        funcs = [getattr(cls, f) for f in funcs]
+        funcs = filter(is_func_implemented, funcs)
+        funcs = [f.__name__ for f in funcs]
+        # filter private functions starring with _
+        funcs = filter(lambda x: not x.startswith("_"), funcs)
+        functions = list(funcs)
+        _moduleFunctions[cls] = functions
+    return list(functions)
+
+
 class ModuleWorker(Thread):
     def __init__(self, module):
         super().__init__()
         self.log = logging.getLogger("{module}.{name}".format(
             module=self.__class__.__module__, name=self.__class__.__name__))
         self.module = module
-        self.taskQueue = Queue()
+        self.taskQueue = PriorityLaneQueue(len(events.EventPriority))
         self.setDaemon(True)
         self.running = True
-        self.start()
+        # thread is started with first task
+        self.started = False
+        self._startLock = Lock()
 
     def run(self):
         while self.running:
             try:
-                (func, event) = self.taskQueue.get(0.2)
+                (func, event, enqueued) = self.taskQueue.get(0.2)
                 if not self.running:
                     break
 
-                if event:
-                    func(event)
-                else:
-                    func()
+                states = None
+                if profiling.hooks.enabled:
+                    states = profiling.hooks.before(
+                        profiling.HookPoint.HANDLER, self.module,
+                        func.__name__)
+                try:
+                    if enqueued is not None:
+                        self._execute_measured(func, event, enqueued)
+                    elif event:
+                        func(event)
+                    else:
+                        func()
+                finally:
+                    if states:
+                        profiling.hooks.after(
+                            profiling.HookPoint.HANDLER, self.module,
+                            func.__name__, states)
             except Empty:
                 continue
             except:
@@ -94,11 +160,54 @@ class ModuleWorker(Thread):
 
             self.taskQueue.task_done()
 
+    def _execute_measured(self, func, event, enqueued):
+        start = time.perf_counter()
+        handler = "{}.{}".format(self.module.name, func.__name__)
+        span = None
+        traceContext = getattr(event, 'traceContext', None)
+        if traceContext is not None and tracing.tracer.enabled:
+            now = time.time_ns()
+            tracing.tracer.record_span(
+                "queue wait", traceContext,
+                now - int((start - enqueued) * 1e9), now)
+            span = tracing.tracer.start_span(
+                "handle {}".format(handler), traceContext,
+                attributes={"uniflex.handler": handler})
+            previous = tracing.tracer.set_current(span.context)
+        try:
+            if event:
+                func(event)
+            else:
+                func()
+        finally:
+            if span is not None:
+                tracing.tracer.set_current(previous)
+                span.end()
+        end = time.perf_counter()
+        if metrics.registry.enabled:
+            metrics.handlerQueueTime.labels(handler).observe(start - enqueued)
+            metrics.handlerExecutionTime.labels(handler).observe(end - start)
+
     def stop(self):
         self.running = False
 
-    def add_task(self, func, event):
-        self.taskQueue.put((func, event))
+    def add_task(self, func, event, priority=None):
+        if priority is None:
+            if event is not None:
+                priority = event.priority
+            else:
+                priority = events.EventPriority.NORMAL
+        enqueued = None
+        if metrics.registry.enabled or (
+                tracing.tracer.enabled and
+                getattr(event, 'traceContext', None) is not None):
+            enqueued = time.perf_counter()
+        self.taskQueue.put((priority, (func, event, enqueued)))
+        if not self.started:
+            with self._startLock:
+                if not self.started and self.running:
+                    self.start()
+                    self.started = True
 
 
 class UniFlexModule(object):
@@ -123,27 +232,7 @@ class UniFlexModule(object):
         self.firstCallToModule = False
 
         if not isinstance(self, CoreModule):
-            funcs = [m for m in dir(self) if _is_method(getattr(self, m))]
-
-            filterFunc = set(["set_agent", "set_module_manager",
-                              "send_event", "get_device",
-                              "get_functions", "get_in_events",
-                              "get_out_events",
-                              "_add_node", "_remove_node",
-                              "get_nodes", "get_node",
-                              "get_node_by_uuid",
-                              "get_node_by_hostname",
-                              "__init__", "recv_msgs"])
-
-            funcs = sorted(list(set(funcs) - filterFunc))
-
-            # filter not implemented funcs
-            funcs = [getattr(self, f) for f in funcs]
-            funcs = filter(is_func_implemented, funcs)
-            funcs = [f.__name__ for f in funcs]
-            # filter private functions starring with _
-            funcs = filter(lambda x: not x.startswith("_"), funcs)
-            self.functions = funcs
+            self.functions = get_module_functions(self.__class__)
 
         # TODO: move to DeviceModule
         self.device = None
@@ -178,8 +267,21 @@ class UniFlexModule(object):
         # stamp event with node
         if not event.srcNode:
             event.srcNode = self.agent.nodeManager.get_local_node()
+        if tracing.tracer.enabled:
+            self._trace_event(event)
         self.moduleManager.send_event(event, dstNode)
 
+    def _trace_event(self, event):
+        parent = getattr(event, 'traceContext', None)
+        if parent is None:
+            parent = tracing.tracer.get_current()
+        span = tracing.tracer.start_span(
+            "publish {}".format(event.__class__.__name__), parent,
+            tracing.SpanKind.PRODUCER, attributes={"uniflex.module": self.name})
+        if span is not None:
+            event.traceContext = span.context
+            span.end()
+
 
 class CoreModule(UniFlexModule):
     def __init__(self):
@@ -205,6 +307,7 @@ class ControlApplication(UniFlexModule):
     def __init__(self):
         super(ControlApplication, self).__init__()
         self._nodes = {}
+        self._nodesByHostname = {}
 
     def get_local_node(self):
         """
@@ -240,12 +343,19 @@ class ControlApplication(UniFlexModule):
         pass
 
     def _add_node(self, node):
+        self._remove_node(node)
         self._nodes[node.uuid] = node
+        self._nodesByHostname.setdefault(node.hostname, []).append(node)
         return True
 
     def _remove_node(self, node):
         if node.uuid in self._nodes:
-            del self._nodes[node.uuid]
+            oldNode = self._nodes.pop(node.uuid)
+            nodes = self._nodesByHostname.get(oldNode.hostname, [])
+            if oldNode in nodes:
+                nodes.remove(oldNode)
+            if not nodes:
+                self._nodesByHostname.pop(oldNode.hostname, None)
             return True
         return False
 
@@ -259,7 +369,5 @@ class ControlApplication(UniFlexModule):
         return self._nodes.get(uuid, None)
 
     def get_node_by_hostname(self, hostname):
-        for n in self._nodes:
-            if n.hostname == hostname:
-                return n
-        return None
+        nodes = self._nodesByHostname.get(hostname, None)
+        return nodes[0] if nodes else None
@@ -1,7 +1,13 @@
 import time
 import logging
+from queue import Empty
 from .modules import DeviceModule, ControlApplication
 from .module_proxy import ModuleProxy, DeviceProxy, ApplicationProxy
+from .registry import ModuleRegistry
+from . import metrics
+from . import tracing
+from .hot_logging import HotPathLogger, HOT_PATH_LOGGING
+from .exceptions import FunctionCallTimeoutException
 import uniflex.msgs as msgs
 
 __author__ = "Piotr Gawlowicz"
@@ -15,6 +21,7 @@ class Node(object):
         super().__init__()
         self.log = logging.getLogger("{module}.{name}".format(
             module=self.__class__.__module__, name=self.__class__.__name__))
+        self.hotLog = HotPathLogger(self.log)
         self.uuid = uuid
         self.ip = None
         self.name = None
@@ -22,20 +29,20 @@ class Node(object):
         self.info = None
         self.nodeManager = None
         self.local = True  # Local or remote
-        self.all_modules = {}
+        self.all_modules = ModuleRegistry(deviceAttr="deviceName")
         self.apps = {}
         self.modules = {}
         self.devices = {}
+        self.infoHash = None
+        # compressions node can decompress, as advertised in NodeInfo
+        self.compressions = [msgs.CompressionType.ZLIB]
+        # incremented on every change of module proxies
+        self.version = 0
 
-    def _set_timer_callback(self, cb):
-        self._timerCallback = cb
-
-    def _hello_timer(self):
-        while not self._stop and self._helloTimeout:
-            time.sleep(1)
-            self._helloTimeout = self._helloTimeout - 1
-        # remove node
-        self._timerCallback(self)
+    def _hello_timer_tick(self):
+        # called every second, returns True if node timed out
+        self._helloTimeout = self._helloTimeout - 1
+        return self._stop or self._helloTimeout <= 0
 
     def _refresh_hello_timer(self):
         self._helloTimeout = 9
@@ -74,39 +81,110 @@ class Node(object):
 
         node._stop = False
         node._helloTimeout = 9
-        node._timerCallback = None
+        node._requestedInfoHash = None
+        node._requestedInfoTime = 0
+
+        node.infoHash = None
+        if msg.HasField('info_hash'):
+            node.infoHash = str(msg.info_hash)
+        node.set_compressions(msg.compressions)
 
         for module in msg.modules:
-            moduleProxy = None
-            if module.type == msgs.Module.APPLICATION:
-                moduleProxy = ApplicationProxy()
-                node.apps[module.uuid] = moduleProxy
-                moduleProxy.name = str(module.name)
-            elif module.type == msgs.Module.DEVICE:
-                moduleProxy = DeviceProxy()
-                if module.HasField('device'):
-                    moduleProxy.name = module.device.name
-                node.devices[module.uuid] = moduleProxy
+            node.add_module_proxy_from_msg(module)
+
+        return node
+
+    def set_compressions(self, compressions):
+        # every node decompresses zlib, also the ones not advertising it
+        self.compressions = [msgs.CompressionType.ZLIB]
+        for compression in compressions:
+            if compression in list(msgs.CompressionType):
+                self.compressions.append(msgs.CompressionType(compression))
+
+    def create_node_info_msg(self):
+        """
+        Returns NodeInfoMsg describing node as seen by its proxies.
+        """
+        msg = msgs.NodeInfoMsg()
+        msg.agent_uuid = self.uuid
+        msg.ip = self.ip or ""
+        msg.name = self.name or ""
+        msg.hostname = self.hostname or ""
+        msg.info = self.info or ""
+        if self.infoHash:
+            msg.info_hash = self.infoHash
+        msg.compressions.extend(self.compressions)
+
+        for proxy in self.all_modules.values():
+            moduleMsg = msg.modules.add()
+            moduleMsg.uuid = proxy.uuid
+            moduleMsg.name = proxy.type or proxy.name or ""
+            if isinstance(proxy, DeviceProxy):
+                moduleMsg.type = msgs.Module.DEVICE
+                moduleMsg.device.name = proxy.deviceName or ""
+            elif isinstance(proxy, ApplicationProxy):
+                moduleMsg.type = msgs.Module.APPLICATION
             else:
-                moduleProxy = ModuleProxy()
-                node.modules[module.uuid] = moduleProxy
-                moduleProxy.name = str(module.name)
+                moduleMsg.type = msgs.Module.MODULE
+            for name in proxy.functions:
+                moduleMsg.functions.add().name = name
+            for name in proxy.in_events:
+                moduleMsg.in_events.add().name = name
+            for name in proxy.out_events:
+                moduleMsg.out_events.add().name = name
+        return msg
+
+    def update_from_msg(self, msg):
+        for uuid in list(self.all_modules.keys()):
+            self.remove_module_proxy(uuid)
+
+        self.infoHash = None
+        if msg.HasField('info_hash'):
+            self.infoHash = str(msg.info_hash)
+        self.set_compressions(msg.compressions)
 
-            node.all_modules[module.uuid] = moduleProxy
-            moduleProxy.node = node
-            moduleProxy.uuid = module.uuid
-            moduleProxy.type = str(module.name)
+        for module in msg.modules:
+            self.add_module_proxy_from_msg(module)
 
-            for func in module.functions:
-                moduleProxy.functions.append(str(func.name))
+    def add_module_proxy_from_msg(self, module):
+        moduleProxy = None
+        if module.type == msgs.Module.APPLICATION:
+            moduleProxy = ApplicationProxy()
+            self.apps[module.uuid] = moduleProxy
+            moduleProxy.name = str(module.name)
+        elif module.type == msgs.Module.DEVICE:
+            moduleProxy = DeviceProxy()
+            if module.HasField('device'):
+                moduleProxy.name = module.device.name
+                moduleProxy.deviceName = module.device.name
+            self.devices[module.uuid] = moduleProxy
+        else:
+            moduleProxy = ModuleProxy()
+            self.modules[module.uuid] = moduleProxy
+            moduleProxy.name = str(module.name)
 
-            for event in module.in_events:
-                moduleProxy.in_events.append(str(event.name))
+        moduleProxy.node = self
+        moduleProxy.uuid = module.uuid
+        moduleProxy.type = str(module.name)
+        self.all_modules.add(moduleProxy)
+        self.version = self.version + 1
 
-            for event in module.out_events:
-                moduleProxy.out_events.append(str(event.name))
+        for func in module.functions:
+            moduleProxy.functions.append(str(func.name))
 
-        return node
+        for event in module.in_events:
+            moduleProxy.in_events.append(str(event.name))
+
+        for event in module.out_events:
+            moduleProxy.out_events.append(str(event.name))
+
+        return moduleProxy
+
+    def remove_module_proxy(self, uuid):
+        for proxies in [self.apps, self.devices, self.modules]:
+            proxies.pop(uuid, None)
+        self.version = self.version + 1
+        return self.all_modules.remove(uuid)
 
     def add_module_proxy(self, module):
         moduleProxy = None
@@ -121,11 +199,11 @@ class Node(object):
             moduleProxy = ModuleProxy()
             self.modules[module.uuid] = moduleProxy
 
-        self.all_modules[module.uuid] = moduleProxy
-
         moduleProxy.node = self
         moduleProxy.uuid = module.uuid
         moduleProxy.name = module.name
+        self.all_modules.add(moduleProxy)
+        self.version = self.version + 1
 
         moduleProxy.functions = module.functions
         moduleProxy.in_events = module.in_events
@@ -161,16 +239,13 @@ class Node(object):
         Get Device Module proxy object by its UUID.
         Returns DeviceModuleProxy object.
         """
-        pass
+        return self.devices.get(uuid, None)
 
     def get_device(self, devId):
         return list(self.devices.values())[devId]
 
     def get_device_by_name(self, name):
-        for dev in self.devices:
-            if dev.name == name:
-                return dev
-        return None
+        return self.all_modules.get_by_device(name)
 
     def get_protocols(self):
         """
@@ -200,7 +275,7 @@ class Node(object):
         Get Control Application proxy object by its UUID.
         Returns ControlApplicationProxy object.
         """
-        pass
+        return self.apps.get(uuid, None)
 
     def send_event(self, event):
         """
@@ -266,17 +341,45 @@ class Node(object):
     def send_cmd_event(self, event):
         event.dstNode = self.uuid
         ctx = event.ctx
-        self.log.debug("{}:{}".format(ctx._type, ctx._name))
-
+        if HOT_PATH_LOGGING:
+            self.hotLog.debug("{}:{}", ctx._type, ctx._name)
+
+        span = None
+        if tracing.tracer.enabled:
+            span = tracing.tracer.start_span(
+                "call {}".format(ctx._name), tracing.tracer.get_current(),
+                tracing.SpanKind.CLIENT,
+                attributes={"rpc.method": ctx._name, "uniflex.node": self.uuid,
+                            "uniflex.blocking": bool(ctx._blocking)})
+            if span is not None:
+                event.traceContext = span.context
+
+        sent = time.perf_counter()
         response = self.nodeManager.send_event_cmd(event, self)
 
         if ctx._blocking:
-            self.log.debug("Waiting for return value for {}:{}"
-                           .format(ctx._type, ctx._name))
-            returnValue = event.responseQueue.get()
+            if HOT_PATH_LOGGING:
+                self.hotLog.debug("Waiting for return value for {}:{}",
+                                  ctx._type, ctx._name)
+            try:
+                returnValue = event.responseQueue.get(timeout=ctx._timeout)
+            except Empty:
+                # late reply must not find the call
+                self.nodeManager.remove_call(event)
+                returnValue = FunctionCallTimeoutException(
+                    func_name=ctx._name, timeout=ctx._timeout)
+            if metrics.registry.enabled:
+                metrics.rpcTime.labels(ctx._name).observe(
+                    time.perf_counter() - sent)
+            if span is not None:
+                if isinstance(returnValue, Exception):
+                    span.set_error(returnValue)
+                span.end()
             if issubclass(returnValue.__class__, Exception):
                 raise returnValue
             else:
                 return returnValue
 
+        if span is not None:
+            span.end()
         return response
@@ -1,5 +1,7 @@
+import time
 import logging
 import socket
+import hashlib
 import threading
 
 from . import modules
@@ -7,6 +9,8 @@ from . import events
 
 import uniflex.msgs as msgs
 from .node import Node
+from .compression import get_available_compressions
+from .timer import Timer
 
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2015, Technische Universitat Berlin"
@@ -25,23 +29,35 @@ class NodeManager(object):
         self._moduleManager = None
 
         self.local_node = None
-        self.nodes = []
+        self.nodes = {}
         self.receivedAddNotifications = []
 
         self.helloMsgInterval = 3
         self.helloTimeout = 3 * self.helloMsgInterval
+        # repeat unanswered node info request after this time
+        self.nodeInfoRequestTimeout = self.helloMsgInterval
+
+        # single thread checks hello timeouts of all nodes
+        self._helloTimerThread = None
+
+        self.discoveryMode = "hello"
+        self.directorySynced = False
+        self.directorySyncInterval = 0.2
+        self.directorySyncTimer = Timer(self._directory_sync)
+
+        # cached description of local node, rebuilt only
+        # when set of local modules changes
+        self._nodeInfoLock = threading.RLock()
+        self._nodeInfoMsg = None
+        self._nodeInfoBytes = None
+        self.infoHash = None
 
     def get_node_by_uuid(self, uuid):
-        node = None
-        for n in self.nodes:
-            if n.uuid == uuid:
-                node = n
-                break
-        return node
+        return self.nodes.get(uuid, None)
 
     def create_local_node(self, agent):
         self.local_node = Node(agent.uuid)
-        self.nodes.append(self.local_node)
+        self.nodes[self.local_node.uuid] = self.local_node
         self.local_node.hostname = socket.gethostname()
         self.local_node.nodeManager = self
 
@@ -51,31 +67,43 @@ class NodeManager(object):
     def serve_node_info_msg(self, msgContainer):
         msg = msgs.NodeInfoMsg()
         msg.ParseFromString(msgContainer[2])
+        return self.add_node_from_msg(msg)
+
+    def add_node_from_msg(self, msg):
         agentUuid = str(msg.agent_uuid)
         agentName = msg.name
         agentInfo = msg.info
 
-        for n in self.nodes:
-            if agentUuid == n.uuid:
-                self.log.debug("Already known Node UUID: {},"
-                               " Name: {}, Info: {}"
-                               .format(agentUuid, agentName, agentInfo))
+        n = self.nodes.get(agentUuid, None)
+        if n is not None:
+            if (msg.HasField('info_hash') and
+                    msg.info_hash != n.infoHash):
+                self.log.debug("Update description of Node UUID: {},"
+                               " Hash: {}"
+                               .format(agentUuid, msg.info_hash))
+                n.update_from_msg(msg)
+                self._set_current_node(n)
                 return
+            self.log.debug("Already known Node UUID: {},"
+                           " Name: {}, Info: {}"
+                           .format(agentUuid, agentName, agentInfo))
+            return
 
         node = Node.create_node_from_msg(msg)
         node.nodeManager = self
-        node._currentNode = self.local_node
-        for m in node.all_modules.values():
-            m._currentNode = self.local_node
+        self._set_current_node(node)
 
-        self.nodes.append(node)
+        self.nodes[node.uuid] = node
         self.log.debug("New node with UUID: {}, Name: {},"
                        " Info: {}".format(agentUuid, agentName, agentInfo))
         # start hello timeout timer
-        node._set_timer_callback(self.remove_node_hello_timer)
-        d = threading.Thread(target=node._hello_timer)
-        d.setDaemon(True)
-        d.start()
+        self._start_hello_timer()
+
+        # node info comes from broadcast or directory snapshot,
+        # so there is no need to confirm it pairwise
+        if self.discoveryMode == "directory":
+            self.notify_new_node_event(node)
+            return node
 
         # if he already knows me
         if node.uuid in self.receivedAddNotifications:
@@ -85,6 +113,74 @@ class NodeManager(object):
         self.send_node_add_notification(node.uuid)
         return node
 
+    def start_directory_sync(self):
+        self.directorySynced = False
+        self.directorySyncInterval = 0.2
+        self._directory_sync()
+
+    def stop_directory_sync(self):
+        self.directorySynced = False
+        self.directorySyncTimer.cancel()
+
+    def _directory_sync(self):
+        if self.directorySynced:
+            return
+        # directory announces node info to peers and replies with
+        # snapshot, so snapshot reply implies that peers received it
+        self.send_node_info("DIRECTORY")
+
+        # retry until broker answers, e.g. slow joiner
+        self.directorySyncTimer.start(self.directorySyncInterval)
+        self.directorySyncInterval = min(2 * self.directorySyncInterval,
+                                         self.helloMsgInterval)
+
+    def serve_node_info_snapshot(self, msgContainer):
+        msg = msgs.NodeInfoSnapshot()
+        msg.ParseFromString(msgContainer[2])
+        self.log.debug("Received directory snapshot with {} nodes"
+                       .format(len(msg.nodes)))
+        self.directorySynced = True
+        self.directorySyncTimer.cancel()
+
+        for nodeInfo in msg.nodes:
+            if nodeInfo.agent_uuid == self.agent.uuid:
+                continue
+            self.add_node_from_msg(nodeInfo)
+
+    def _set_current_node(self, node):
+        node._currentNode = self.local_node
+        for m in node.all_modules.values():
+            m._currentNode = self.local_node
+
+    def serve_node_info_delta(self, msgContainer):
+        msg = msgs.NodeInfoDelta()
+        msg.ParseFromString(msgContainer[2])
+        agentUuid = str(msg.agent_uuid)
+
+        node = self.get_node_by_uuid(agentUuid)
+        if not node:
+            return
+
+        if node.infoHash == msg.info_hash:
+            return
+
+        if node.infoHash != msg.base_hash:
+            # missed some update, ask for full description
+            self.log.debug("Node UUID: {} has hash {}, delta is for {};"
+                           " request full node info"
+                           .format(agentUuid, node.infoHash, msg.base_hash))
+            self.send_node_info_request(agentUuid)
+            return
+
+        for uuid in msg.removed_modules:
+            node.remove_module_proxy(str(uuid))
+        for module in msg.added_modules:
+            moduleProxy = node.add_module_proxy_from_msg(module)
+            moduleProxy._currentNode = self.local_node
+        node.infoHash = str(msg.info_hash)
+        self.log.debug("Applied node info delta of Node UUID: {},"
+                       " Hash: {}".format(agentUuid, node.infoHash))
+
     def serve_node_add_notification(self, msgContainer):
         self.log.debug("add node notification")
         msg = msgs.NodeAddNotification()
@@ -104,13 +200,29 @@ class NodeManager(object):
         self._moduleManager.send_event(event)
         self.log.debug("New node event sent")
 
+    def _start_hello_timer(self):
+        if self._helloTimerThread:
+            return
+        self._helloTimerThread = threading.Thread(target=self._hello_timer)
+        self._helloTimerThread.setDaemon(True)
+        self._helloTimerThread.start()
+
+    def _hello_timer(self):
+        while True:
+            time.sleep(1)
+            for node in list(self.nodes.values()):
+                if node.local:
+                    continue
+                if node._hello_timer_tick():
+                    self.remove_node_hello_timer(node)
+
     def remove_node_hello_timer(self, node):
         reason = "HelloTimeout"
         self.log.debug("Remove node with UUID: {},"
                        " Reason: {}".format(node.uuid, reason))
 
-        if node and node in self.nodes:
-            self.nodes.remove(node)
+        if node and self.nodes.get(node.uuid, None) is node:
+            del self.nodes[node.uuid]
 
             event = events.NodeLostEvent(reason)
             event.node = node
@@ -130,8 +242,8 @@ class NodeManager(object):
         self.log.debug("Remove node with UUID: {},"
                        " Reason: {}".format(agentId, reason))
 
-        if node and node in self.nodes:
-            self.nodes.remove(node)
+        if node and self.nodes.get(node.uuid, None) is node:
+            del self.nodes[node.uuid]
 
             event = events.NodeExitEvent(reason)
             event.node = node
@@ -149,18 +261,54 @@ class NodeManager(object):
                            .format(sourceUuid))
         msg = msgs.HelloMsg()
         msg.ParseFromString(msgContainer[2])
+        self._serve_hello(msg)
 
-        node = self.get_node_by_uuid(str(msg.uuid))
+    def serve_hello_aggregate_msg(self, msgContainer):
+        msg = msgs.HelloAggregateMsg()
+        msg.ParseFromString(msgContainer[2])
+        self.log.debug("Received aggregated HELLO MESSAGE for {} nodes"
+                       .format(len(msg.hellos)))
+        for hello in msg.hellos:
+            if hello.uuid == self.agent.uuid:
+                continue
+            self._serve_hello(hello)
+
+    def refresh_node(self, uuid):
+        # any message from node proves that it is alive
+        node = self.nodes.get(uuid, None)
+        if node is not None and not node.local:
+            node._refresh_hello_timer()
+
+    def _serve_hello(self, msg):
+        sourceUuid = str(msg.uuid)
+        node = self.nodes.get(sourceUuid, None)
         if node is None:
             self.log.debug("Unknown node: {}"
                            .format(sourceUuid))
+            # directory snapshot will describe it
+            if (self.discoveryMode == "directory" and
+                    not self.directorySynced):
+                return
             self.send_node_info_request(sourceUuid)
             return
         node._refresh_hello_timer()
 
+        # description of node changed and we missed the delta
+        if msg.HasField('info_hash') and msg.info_hash != node.infoHash:
+            now = time.time()
+            if (node._requestedInfoHash != msg.info_hash or
+                    now - node._requestedInfoTime >=
+                    self.nodeInfoRequestTimeout):
+                node._requestedInfoHash = msg.info_hash
+                node._requestedInfoTime = now
+                self.send_node_info_request(sourceUuid)
+
     def send_event_cmd(self, event, dstNode):
         self._moduleManager.send_cmd_event(event, dstNode)
 
+    def remove_call(self, event):
+        self._moduleManager.remove_call(event)
+
     def send_hello_msg(self, timeout=10):
         self.log.debug("Agent sends HelloMsg")
         topic = "HELLO_MSG"
@@ -171,6 +319,7 @@ class NodeManager(object):
         msg = msgs.HelloMsg()
         msg.uuid = str(self.agent.uuid)
         msg.timeout = timeout
+        msg.info_hash = self.get_node_info_hash()
         msgContainer = [topic, msgDesc, msg]
         self._transportChannel.send(msgContainer)
 
@@ -188,52 +337,124 @@ class NodeManager(object):
         self.log.debug("Agent sends node info request")
         self._transportChannel.send(msgContainer)
 
-    def send_node_info(self, dest=None):
-        topic = "NODE_INFO"
-        if dest:
-            topic = dest
+    def _create_module_msg(self, moduleMsg, module):
+        moduleMsg.uuid = module.uuid
+        moduleMsg.name = module.name
+        moduleMsg.type = msgs.Module.MODULE
 
-        msgDesc = msgs.MessageDescription()
-        msgDesc.msgType = msgs.get_msg_type(msgs.NodeInfoMsg)
-        msgDesc.serializationType = msgs.SerializationType.PROTOBUF
+        if isinstance(module, modules.ControlApplication):
+            moduleMsg.type = msgs.Module.APPLICATION
+        else:
+            moduleMsg.type = msgs.Module.MODULE
 
+        if module.device:
+            moduleMsg.type = msgs.Module.DEVICE
+            deviceDesc = msgs.Device()
+            deviceDesc.name = module.device
+            moduleMsg.device.CopyFrom(deviceDesc)
+
+        for name in module.get_functions():
+            function = moduleMsg.functions.add()
+            function.name = name
+        for name in module.get_in_events():
+            event = moduleMsg.in_events.add()
+            event.name = name
+        for name in module.get_out_events():
+            event = moduleMsg.out_events.add()
+            event.name = name
+
+    def _create_node_info_msg(self):
         msg = msgs.NodeInfoMsg()
         msg.agent_uuid = self.agent.uuid
         msg.ip = self.agent.ip
         msg.name = self.agent.name
         msg.hostname = socket.gethostname()
         msg.info = self.agent.info
+        # senders use other compression than zlib only if it is here
+        msg.compressions.extend(get_available_compressions())
 
-        for uuid, module in self.agent.moduleManager.modules.items():
+        localModules = sorted(self.agent.moduleManager.modules.values(),
+                              key=lambda m: m.uuid)
+        for module in localModules:
             if isinstance(module, modules.CoreModule):
                 continue
-
             moduleMsg = msg.modules.add()
-            moduleMsg.uuid = module.uuid
-            moduleMsg.name = module.name
-            moduleMsg.type = msgs.Module.MODULE
+            self._create_module_msg(moduleMsg, module)
+
+        # content hash identifies version of node description
+        msgHash = hashlib.sha1(msg.SerializeToString(deterministic=True))
+        msg.info_hash = msgHash.hexdigest()
+        return msg
+
+    def _update_node_info(self):
+        with self._nodeInfoLock:
+            if self._nodeInfoMsg is None:
+                self._nodeInfoMsg = self._create_node_info_msg()
+                self._nodeInfoBytes = self._nodeInfoMsg.SerializeToString()
+                self.infoHash = str(self._nodeInfoMsg.info_hash)
+            return self._nodeInfoMsg, self._nodeInfoBytes
+
+    def get_node_info_hash(self):
+        self._update_node_info()
+        return self.infoHash
+
+    def local_modules_changed(self):
+        with self._nodeInfoLock:
+            oldMsg = self._nodeInfoMsg
+            self._nodeInfoMsg = None
+            self._nodeInfoBytes = None
+
+            if oldMsg is None or not self._transportChannel:
+                # nobody received description of this node yet
+                return
+            if not self._transportChannel.connected:
+                return
+
+            newMsg, _ = self._update_node_info()
+            if newMsg.info_hash == oldMsg.info_hash:
+                return
+
+            oldModules = {m.uuid: m for m in oldMsg.modules}
+            newModules = {m.uuid: m for m in newMsg.modules}
+
+            msg = msgs.NodeInfoDelta()
+            msg.agent_uuid = self.agent.uuid
+            msg.base_hash = oldMsg.info_hash
+            msg.info_hash = newMsg.info_hash
+            for uuid, module in newModules.items():
+                if uuid not in oldModules:
+                    msg.added_modules.add().CopyFrom(module)
+                elif module != oldModules[uuid]:
+                    msg.removed_modules.append(uuid)
+                    msg.added_modules.add().CopyFrom(module)
+            for uuid in oldModules:
+                if uuid not in newModules:
+                    msg.removed_modules.append(uuid)
+
+        self.send_node_info_delta(msg)
+
+    def send_node_info_delta(self, msg):
+        topic = "NODE_INFO"
+        msgDesc = msgs.MessageDescription()
+        msgDesc.msgType = msgs.get_msg_type(msgs.NodeInfoDelta)
+        msgDesc.serializationType = msgs.SerializationType.PROTOBUF
+
+        msgContainer = [topic, msgDesc, msg]
+        self.log.debug("Agent sends node info delta, hash: {} -> {}"
+                       .format(msg.base_hash, msg.info_hash))
+        self._transportChannel.send(msgContainer)
 
-            if isinstance(module, modules.ControlApplication):
-                moduleMsg.type = msgs.Module.APPLICATION
-            else:
-                moduleMsg.type = msgs.Module.MODULE
-
-            if module.device:
-                moduleMsg.type = msgs.Module.DEVICE
-                deviceDesc = msgs.Device()
-                deviceDesc.name = module.device
-                moduleMsg.device.CopyFrom(deviceDesc)
-
-            for name in module.get_functions():
-                function = moduleMsg.functions.add()
-                function.name = name
-            for name in module.get_in_events():
-                event = moduleMsg.in_events.add()
-                event.name = name
-            for name in module.get_out_events():
-                event = moduleMsg.out_events.add()
-                event.name = name
+    def send_node_info(self, dest=None):
+        topic = "NODE_INFO"
+        if dest:
+            topic = dest
+
+        msgDesc = msgs.MessageDescription()
+        msgDesc.msgType = msgs.get_msg_type(msgs.NodeInfoMsg)
+        msgDesc.serializationType = msgs.SerializationType.PROTOBUF
 
+        # serialized description is reused until modules change
+        _, msg = self._update_node_info()
         msgContainer = [topic, msgDesc, msg]
 
         self.log.debug("Agent sends node info")
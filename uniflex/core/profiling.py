@@ -0,0 +1,319 @@
+import os
+import time
+import random
+import pstats
+import cProfile
+import inspect
+import logging
+import threading
+import tracemalloc
+from enum import IntEnum
+
+from . import events
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class HookPoint(IntEnum):
+    DISPATCH = 0
+    HANDLER = 1
+    RPC_EXECUTE = 2
+    SERIALIZE = 3
+    DESERIALIZE = 4
+
+
+class ProfilingHook(object):
+    """
+    Hook called before and after work at its hook points; value
+    returned by before() is passed to after() of the same call.
+    Module is None for dispatch and serialization, name is name of
+    handler, function or event class.
+    """
+    points = ()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def before(self, point, module, name):
+        return None
+
+    def after(self, point, module, name, state):
+        pass
+
+    def get_report(self):
+        return {}
+
+
+class HookRegistry(object):
+    """
+    Hooks of agent process; instrumented code checks enabled
+    before calling hooks, so there is no cost without hooks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.enabled = False
+        self.lock = threading.Lock()
+        # hook point -> tuple of hooks, replaced on change
+        self.hooks = {point: () for point in HookPoint}
+
+    def add(self, hook, points=None):
+        with self.lock:
+            for point in points or hook.points:
+                if hook not in self.hooks[point]:
+                    self.hooks[point] = self.hooks[point] + (hook,)
+            self.enabled = any(self.hooks.values())
+
+    def remove(self, hook):
+        with self.lock:
+            for point, hooks in self.hooks.items():
+                self.hooks[point] = tuple(h for h in hooks if h is not hook)
+            self.enabled = any(self.hooks.values())
+
+    def before(self, point, module, name):
+        hooks = self.hooks[point]
+        if not hooks:
+            return None
+        states = []
+        for hook in hooks:
+            try:
+                states.append((hook, hook.before(point, module, name)))
+            except Exception as e:
+                self.log.warning("Hook {} failed: {}".format(
+                    hook.__class__.__name__, e))
+        return states
+
+    def after(self, point, module, name, states):
+        if not states:
+            return
+        # hooks are finished in reverse order
+        for hook, state in reversed(states):
+            try:
+                hook.after(point, module, name, state)
+            except Exception as e:
+                self.log.warning("Hook {} failed: {}".format(
+                    hook.__class__.__name__, e))
+
+
+hooks = HookRegistry()
+
+
+def _get_key(module, name):
+    if module is None:
+        return name
+    return "{}.{}".format(module.name, name)
+
+
+class HandlerProfiler(ProfilingHook):
+    """
+    Runs cProfile for sampled executions of handlers and functions;
+    statistics are merged per handler.
+    """
+    points = (HookPoint.HANDLER, HookPoint.RPC_EXECUTE)
+
+    def __init__(self, sampleRate=0.01, modules=None):
+        super().__init__()
+        self.sampleRate = sampleRate
+        # names of profiled modules, all if None
+        self.modules = set(modules) if modules else None
+        self.stats = {}
+        self.samples = {}
+        self.lock = threading.Lock()
+        # only one profiler can be active in thread
+        self.local = threading.local()
+
+    def before(self, point, module, name):
+        if self.modules is not None and module.name not in self.modules:
+            return None
+        if getattr(self.local, 'active', False):
+            return None
+        if random.random() >= self.sampleRate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # other profiler is active in this thread
+            return None
+        self.local.active = True
+        return profile
+
+    def after(self, point, module, name, profile):
+        if profile is None:
+            return
+        profile.disable()
+        self.local.active = False
+        key = _get_key(module, name)
+        with self.lock:
+            stats = self.stats.get(key, None)
+            if stats is None:
+                self.stats[key] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def get_report(self, limit=10):
+        """
+        Returns {handler: {samples, top}}; top entries are
+        [function, calls, own time, cumulative time] sorted by
+        cumulative time.
+        """
+        report = {}
+        with self.lock:
+            for key, stats in self.stats.items():
+                entries = []
+                for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+                    entries.append(["{}:{}({})".format(*func), nc, tt, ct])
+                entries.sort(key=lambda e: e[3], reverse=True)
+                report[key] = {"samples": self.samples[key],
+                               "top": entries[:limit]}
+        return report
+
+    def dump_stats(self, directory):
+        """
+        Writes statistics of every handler to <handler>.prof,
+        to be read with pstats or snakeviz.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        with self.lock:
+            for key, stats in self.stats.items():
+                path = os.path.join(directory, "{}.prof".format(key))
+                stats.dump_stats(path)
+                paths.append(path)
+        return paths
+
+
+class TimeAccounting(ProfilingHook):
+    """
+    Accounts wall and CPU time of handlers and functions per module.
+    """
+    points = (HookPoint.HANDLER, HookPoint.RPC_EXECUTE)
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        # module name -> [calls, wall time, cpu time]
+        self.modules = {}
+
+    def before(self, point, module, name):
+        return (time.perf_counter(), time.thread_time())
+
+    def after(self, point, module, name, state):
+        wall = time.perf_counter() - state[0]
+        cpu = time.thread_time() - state[1]
+        with self.lock:
+            entry = self.modules.setdefault(module.name, [0, 0.0, 0.0])
+            entry[0] = entry[0] + 1
+            entry[1] = entry[1] + wall
+            entry[2] = entry[2] + cpu
+
+    def get_report(self):
+        with self.lock:
+            return {name: {"calls": calls, "wall_s": wall, "cpu_s": cpu}
+                    for name, (calls, wall, cpu) in self.modules.items()}
+
+
+class AllocationTracer(ProfilingHook):
+    """
+    Traces memory allocations of chosen module with tracemalloc:
+    net allocated size per handler and top allocating lines of
+    module source. Allocations of other threads running at the
+    same time are included in per handler sizes.
+    """
+    points = (HookPoint.HANDLER, HookPoint.RPC_EXECUTE)
+
+    def __init__(self, module, frames=1):
+        super().__init__()
+        # module name or uuid
+        self.module = module
+        self.frames = frames
+        self.sourceFiles = set()
+        self.startedTracing = False
+        self.lock = threading.Lock()
+        # handler -> [calls, allocated bytes]
+        self.handlers = {}
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.startedTracing = True
+
+    def stop(self):
+        if self.startedTracing:
+            tracemalloc.stop()
+            self.startedTracing = False
+
+    def before(self, point, module, name):
+        if self.module not in (module.name, module.uuid):
+            return None
+        if not self.sourceFiles:
+            try:
+                self.sourceFiles.add(inspect.getsourcefile(module.__class__))
+            except TypeError:
+                pass
+        return tracemalloc.get_traced_memory()[0]
+
+    def after(self, point, module, name, size):
+        if size is None:
+            return
+        allocated = tracemalloc.get_traced_memory()[0] - size
+        with self.lock:
+            entry = self.handlers.setdefault(name, [0, 0])
+            entry[0] = entry[0] + 1
+            entry[1] = entry[1] + allocated
+
+    def get_report(self, limit=10):
+        report = {"module": self.module,
+                  "handlers": {name: {"calls": calls,
+                                      "allocated_bytes": size}
+                               for name, (calls, size)
+                               in self.handlers.items()},
+                  "top": []}
+        if not tracemalloc.is_tracing() or not self.sourceFiles:
+            return report
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(True, path) for path in self.sourceFiles])
+        for stat in snapshot.statistics("lineno")[:limit]:
+            frame = stat.traceback[0]
+            report["top"].append(["{}:{}".format(frame.filename,
+                                                 frame.lineno),
+                                  stat.size, stat.count])
+        return report
+
+
+# name used in ProfilingControlEvent -> profiler class
+profilers = {"handler": HandlerProfiler,
+             "time": TimeAccounting,
+             "allocation": AllocationTracer}
+
+
+class ProfilingControlEvent(events.EventBase):
+    """
+    Starts (options are passed to profiler), stops or requests
+    report of profiler in given agent or in all agents if agentUuid
+    is None. Report is sent in ProfilingReportEvent.
+    """
+
+    def __init__(self, command, profiler, options=None, agentUuid=None):
+        super().__init__()
+        self.command = command
+        self.profiler = profiler
+        self.options = options or {}
+        self.agentUuid = agentUuid
+
+
+class ProfilingReportEvent(events.EventBase):
+    def __init__(self, profiler, report, agentUuid=None):
+        super().__init__()
+        self.profiler = profiler
+        self.report = report
+        self.agentUuid = agentUuid
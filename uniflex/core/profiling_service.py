@@ -0,0 +1,80 @@
+from . import modules
+from . import profiling
+from .profiling import ProfilingControlEvent, ProfilingReportEvent
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class ProfilingService(modules.UniFlexModule):
+    """
+    Starts and stops profilers of agent on ProfilingControlEvent,
+    so live agent can be profiled without restart. It is not core
+    module, as events of core modules are not accepted by other
+    nodes; its functions can be also called remotely.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # profiler name -> running profiler
+        self.profilers = {}
+
+    def start_profiler(self, name, **options):
+        self.stop_profiler(name)
+        profiler = profiling.profilers[name](**options)
+        profiler.start()
+        profiling.hooks.add(profiler)
+        self.profilers[name] = profiler
+        self.log.info("Profiler {} started".format(name))
+        return profiler
+
+    def stop_profiler(self, name):
+        profiler = self.profilers.pop(name, None)
+        if profiler is None:
+            return None
+        profiling.hooks.remove(profiler)
+        # report is taken before tracing of allocations stops
+        report = profiler.get_report()
+        profiler.stop()
+        self.log.info("Profiler {} stopped".format(name))
+        return report
+
+    def get_report(self, name):
+        profiler = self.profilers.get(name, None)
+        if profiler is None:
+            return None
+        return profiler.get_report()
+
+    @modules.on_event(ProfilingControlEvent)
+    def serve_profiling_control_event(self, event):
+        if event.agentUuid not in (None, self.agent.uuid):
+            return
+        if event.profiler not in profiling.profilers:
+            self.log.error("Unknown profiler: {}".format(event.profiler))
+            return
+
+        report = None
+        try:
+            if event.command == "start":
+                self.start_profiler(event.profiler, **event.options)
+            elif event.command == "stop":
+                report = self.stop_profiler(event.profiler)
+            elif event.command == "report":
+                report = self.get_report(event.profiler)
+            else:
+                self.log.error("Unknown command: {}".format(event.command))
+                return
+        except Exception as e:
+            self.log.error("Profiler {} failed: {}".format(event.profiler, e))
+            return
+
+        if report is not None:
+            self.send_event(ProfilingReportEvent(event.profiler, report,
+                                                 self.agent.uuid))
+
+    @modules.on_exit()
+    def stop_profilers(self):
+        for name in list(self.profilers):
+            self.stop_profiler(name)
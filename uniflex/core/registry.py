@@ -0,0 +1,119 @@
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class ModuleRegistry(object):
+    """
+    Registry of modules or module proxies with constant time lookup
+    by UUID, name, device name and class. It behaves like dict keyed
+    by module UUID, so it can replace plain dicts of modules.
+    Attributes used as keys have to be set before module is added.
+    """
+
+    def __init__(self, deviceAttr="device"):
+        super().__init__()
+        self._deviceAttr = deviceAttr
+        self._byUuid = {}
+        self._byName = {}
+        self._byDevice = {}
+        self._byClass = {}
+
+    @staticmethod
+    def _index_add(index, key, module):
+        if key is None:
+            return
+        index.setdefault(key, []).append(module)
+
+    @staticmethod
+    def _index_remove(index, key, module):
+        entries = index.get(key, None)
+        if not entries:
+            return
+        if module in entries:
+            entries.remove(module)
+        if not entries:
+            del index[key]
+
+    def _keys(self, module):
+        deviceName = module.__dict__.get(self._deviceAttr, None)
+        classes = type(module).__mro__[:-1]
+        return module.name, deviceName, classes
+
+    def add(self, module):
+        if module.uuid in self._byUuid:
+            self.remove(module.uuid)
+
+        self._byUuid[module.uuid] = module
+        name, deviceName, classes = self._keys(module)
+        self._index_add(self._byName, name, module)
+        self._index_add(self._byDevice, deviceName, module)
+        for cls in classes:
+            self._index_add(self._byClass, cls, module)
+        return module
+
+    def remove(self, uuid):
+        module = self._byUuid.pop(uuid, None)
+        if module is None:
+            return None
+
+        name, deviceName, classes = self._keys(module)
+        self._index_remove(self._byName, name, module)
+        self._index_remove(self._byDevice, deviceName, module)
+        for cls in classes:
+            self._index_remove(self._byClass, cls, module)
+        return module
+
+    def get_by_uuid(self, uuid):
+        return self._byUuid.get(uuid, None)
+
+    def get_by_name(self, name):
+        entries = self._byName.get(name, None)
+        return entries[0] if entries else None
+
+    def get_all_by_name(self, name):
+        return list(self._byName.get(name, []))
+
+    def get_by_device(self, deviceName):
+        entries = self._byDevice.get(deviceName, None)
+        return entries[0] if entries else None
+
+    def get_all_by_device(self, deviceName):
+        return list(self._byDevice.get(deviceName, []))
+
+    def get_by_class(self, cls):
+        return list(self._byClass.get(cls, []))
+
+    # dict interface, keyed by module UUID
+    def get(self, uuid, default=None):
+        return self._byUuid.get(uuid, default)
+
+    def keys(self):
+        return self._byUuid.keys()
+
+    def values(self):
+        return self._byUuid.values()
+
+    def items(self):
+        return self._byUuid.items()
+
+    def __getitem__(self, uuid):
+        return self._byUuid[uuid]
+
+    def __setitem__(self, uuid, module):
+        assert uuid == module.uuid, "Registry is keyed by module UUID"
+        self.add(module)
+
+    def __delitem__(self, uuid):
+        if self.remove(uuid) is None:
+            raise KeyError(uuid)
+
+    def __contains__(self, uuid):
+        return uuid in self._byUuid
+
+    def __iter__(self):
+        return iter(self._byUuid)
+
+    def __len__(self):
+        return len(self._byUuid)
@@ -0,0 +1,202 @@
+import io
+import sys
+import builtins
+import importlib
+import dill  # for pickling what standard pickle can’t cope with
+import pickle
+
+from uniflex.msgs import SerializationType
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+# buffers smaller than threshold are pickled in-band,
+# zmq copies such frames anyway (zmq.COPY_THRESHOLD)
+OUT_OF_BAND_THRESHOLD = 64 * 1024
+
+
+class OutOfBandPickler(pickle.Pickler):
+    """
+    Pickler that sends memoryview objects out-of-band, in addition to
+    objects reduced to PickleBuffer (numpy arrays, pickle.PickleBuffer).
+    Pickle saves bytes and bytearray itself, they stay in-band.
+    """
+
+    def reducer_override(self, obj):
+        if type(obj) is memoryview and obj.contiguous:
+            return memoryview, (pickle.PickleBuffer(obj),)
+        return NotImplemented
+
+
+def _keep_in_band(buf):
+    return buf.raw().nbytes < OUT_OF_BAND_THRESHOLD
+
+
+class RestrictedUnpickler(pickle.Unpickler):
+    """
+    Unpickler that creates only objects of whitelisted types.
+    """
+
+    def find_class(self, module, name):
+        # dotted name is resolved attribute by attribute, so it could
+        # reach anything imported into allowed module
+        if "." in name or not is_allowed_type(module, name):
+            raise pickle.UnpicklingError("Type {}.{} is not allowed"
+                                         .format(module, name))
+        return super().find_class(module, name)
+
+
+# serializer pinned to type on first use: SerializationType.PICKLE,
+# SerializationType.DILL (pickle failed) or SerializationType.CODEC
+_typeSerializers = {}
+# event class name -> (cls, encode, decode)
+_codecs = {}
+# None means that all types are allowed on receive
+_allowedTypes = None
+_allowedModules = None
+_defaultAllowedTypes = set([
+    "builtins.set", "builtins.frozenset", "builtins.complex",
+    "builtins.bytearray", "builtins.memoryview", "builtins.slice",
+    "builtins.range", "copyreg._reconstructor", "builtins.object",
+    "collections.OrderedDict", "collections.deque",
+    "collections.defaultdict", "uuid.UUID",
+    "datetime.datetime", "datetime.date", "datetime.time",
+    "datetime.timedelta", "datetime.timezone",
+    "uniflex.core.module_proxy.CallingContext"])
+
+
+def register_codec(cls, encode, decode):
+    """
+    Register codec for event class; encode(obj) returns bytes,
+    decode(bytes) returns object. Codec is used instead of pickle
+    and has to be registered in receivers as well.
+    """
+    _codecs[cls.__name__] = (cls, encode, decode)
+    _typeSerializers[cls] = SerializationType.CODEC
+
+
+def set_whitelist(types):
+    """
+    Allow only given types on receive. Entries are classes,
+    full names (module.Name) or module prefixes ending with dot
+    (e.g. "mypkg."); prefix allows only events and exceptions
+    defined in its modules. None removes restriction.
+    """
+    global _allowedTypes, _allowedModules
+    if types is None:
+        _allowedTypes = None
+        _allowedModules = None
+        return
+
+    allowedTypes = set(_defaultAllowedTypes)
+    # core events carry calling context and other core objects
+    allowedModules = ["uniflex.core."]
+    for entry in types:
+        if isinstance(entry, type):
+            entry = "{}.{}".format(entry.__module__, entry.__qualname__)
+        if entry.endswith("."):
+            allowedModules.append(entry)
+        else:
+            allowedTypes.add(entry)
+    _allowedTypes = allowedTypes
+    _allowedModules = tuple(allowedModules)
+
+
+def _get_class(module, name):
+    if module not in sys.modules:
+        importlib.import_module(module)
+    cls = getattr(sys.modules[module], name, None)
+    if not isinstance(cls, type):
+        return None
+    return cls
+
+
+def is_allowed_type(module, name):
+    if _allowedTypes is None:
+        return True
+    if "." in name:
+        return False
+    if "{}.{}".format(module, name) in _allowedTypes:
+        return True
+    for cls, encode, decode in _codecs.values():
+        if cls.__module__ == module and cls.__qualname__ == name:
+            return True
+    if module == "builtins":
+        cls = getattr(builtins, name, None)
+        return isinstance(cls, type) and issubclass(cls, BaseException)
+    if not (module + ".").startswith(_allowedModules):
+        return False
+
+    from .events import EventBase
+    from .exceptions import UniFlexException
+    try:
+        cls = _get_class(module, name)
+    except ImportError:
+        return False
+    # only classes defined in module, not names imported into it
+    return (cls is not None and cls.__module__ == module and
+            issubclass(cls, (EventBase, UniFlexException)))
+
+
+def _pickle_dumps(obj):
+    buffers = []
+
+    def buffer_callback(buf):
+        if _keep_in_band(buf):
+            return True
+        buffers.append(buf.raw())
+        return False
+
+    stream = io.BytesIO()
+    OutOfBandPickler(stream, protocol=5,
+                     buffer_callback=buffer_callback).dump(obj)
+    return stream.getvalue(), buffers
+
+
+def dumps(obj):
+    """
+    Serialize object with serializer pinned to its type.
+    Returns serialized object, list of out-of-band buffers
+    that have to be sent as separate frames and serialization type.
+    """
+    objType = type(obj)
+    serializer = _typeSerializers.get(objType, SerializationType.PICKLE)
+
+    if serializer == SerializationType.CODEC:
+        encode = _codecs[objType.__name__][1]
+        return encode(obj), [], SerializationType.CODEC
+
+    if serializer == SerializationType.PICKLE:
+        try:
+            data, buffers = _pickle_dumps(obj)
+            return data, buffers, SerializationType.PICKLE
+        except Exception:
+            # do not try pickle for this type again
+            _typeSerializers[objType] = SerializationType.DILL
+
+    return dill.dumps(obj), [], SerializationType.DILL
+
+
+def loads(data, buffers=(), serializationType=SerializationType.PICKLE,
+          msgType=None, trusted=False):
+    """
+    Deserialize object; out-of-band buffers are used without copy.
+    Whitelist applies only to untrusted data, i.e. data received from
+    network, not from processes of the same agent.
+    """
+    if serializationType == SerializationType.CODEC:
+        codec = _codecs.get(msgType, None)
+        if codec is None:
+            raise pickle.UnpicklingError("No codec for {}".format(msgType))
+        return codec[2](data)
+
+    if serializationType == SerializationType.DILL:
+        if _allowedTypes is not None and not trusted:
+            raise pickle.UnpicklingError("Dill is not allowed with whitelist")
+        return dill.loads(data)
+
+    if _allowedTypes is not None and not trusted:
+        return RestrictedUnpickler(io.BytesIO(data), buffers=buffers).load()
+    return pickle.loads(data, buffers=buffers)
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from enum import IntEnum
+
+__author__ = "Piotr Gawlowicz"
+__copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
+__version__ = "0.1.0"
+__email__ = "gawlowicz@tkn.tu-berlin.de"
+
+
+class SpanKind(IntEnum):
+    # values as in OpenTelemetry protocol
+    UNSPECIFIED = 0
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+    PRODUCER = 4
+    CONSUMER = 5
+
+
+def generate_id(size):
+    return "{:0{}x}".format(random.getrandbits(size * 8), size * 2)
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span(object):
+    """
+    Span of trace; its context (traceId, spanId) is propagated
+    in message header and in traceContext attribute of events.
+    """
+
+    def __init__(self, tracer, name, traceId, parentId=None,
+                 kind=SpanKind.INTERNAL, start=None, attributes=None):
+        super().__init__()
+        self.tracer = tracer
+        self.name = name
+        self.traceId = traceId
+        self.spanId = generate_id(8)
+        self.parentId = parentId
+        self.kind = kind
+        self.start = start or time.time_ns()
+        self.stop = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    @property
+    def context(self):
+        return (self.traceId, self.spanId)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.error = repr(error)
+
+    def end(self, stop=None):
+        if self.stop is not None:
+            return
+        self.stop = stop or time.time_ns()
+        self.tracer._finish(self)
+
+    def to_otlp(self):
+        span = {"traceId": self.traceId,
+                "spanId": self.spanId,
+                "name": self.name,
+                "kind": int(self.kind),
+                "startTimeUnixNano": str(self.start),
+                "endTimeUnixNano": str(self.stop),
+                "attributes": [{"key": k, "value": _attribute_value(v)}
+                               for k, v in self.attributes.items()],
+                "status": {}}
+        if self.parentId:
+            span["parentSpanId"] = self.parentId
+        if self.error is not None:
+            span["status"] = {"code": 2, "message": self.error}
+        return span
+
+
+class FileSpanExporter(object):
+    """
+    Appends spans to file in OpenTelemetry protocol JSON encoding,
+    one ExportTraceServiceRequest per line.
+    """
+
+    def __init__(self, path, serviceName="uniflex"):
+        super().__init__()
+        self.path = path
+        self.serviceName = serviceName
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name",
+                 "value": {"stringValue": self.serviceName}}]},
+            "scopeSpans": [{
+                "scope": {"name": "uniflex", "version": __version__},
+                "spans": [span.to_otlp() for span in spans]}]}]}
+        with self.lock:
+            self.file.write(json.dumps(request) + "\n")
+            self.file.flush()
+
+    def shutdown(self):
+        with self.lock:
+            self.file.close()
+
+
+class Tracer(object):
+    """
+    Records spans of events and function calls. New traces are
+    sampled with sampleRate; spans of sampled traces are buffered
+    and exported in batches.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.enabled = False
+        self.sampleRate = 1.0
+        self.exporter = None
+        self.maxBatch = 512
+        self.flushInterval = 1.0
+        self.spans = []
+        self.cv = threading.Condition()
+        self.local = threading.local()
+        self.thread = None
+
+    def configure(self, exporter, sampleRate=1.0, flushInterval=1.0):
+        self.exporter = exporter
+        self.sampleRate = sampleRate
+        self.flushInterval = flushInterval
+        self.enabled = True
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._export_spans)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def get_current(self):
+        """
+        Returns context of span executed by current thread.
+        """
+        return getattr(self.local, 'context', None)
+
+    def set_current(self, context):
+        previous = getattr(self.local, 'context', None)
+        self.local.context = context
+        return previous
+
+    def start_span(self, name, parent=None, kind=SpanKind.INTERNAL,
+                   start=None, attributes=None):
+        """
+        Starts span in trace of parent context; without parent new
+        trace is started if sampled, otherwise None is returned.
+        """
+        if not self.enabled:
+            return None
+        if parent is None:
+            if random.random() >= self.sampleRate:
+                return None
+            return Span(self, name, generate_id(16), None, kind, start,
+                        attributes)
+        return Span(self, name, parent[0], parent[1], kind, start,
+                    attributes)
+
+    def record_span(self, name, parent, start, stop,
+                    kind=SpanKind.INTERNAL, attributes=None):
+        span = self.start_span(name, parent, kind, start, attributes)
+        if span is not None:
+            span.end(stop)
+        return span
+
+    def _finish(self, span):
+        with self.cv:
+            self.spans.append(span)
+            if len(self.spans) >= self.maxBatch:
+                self.cv.notify()
+
+    def flush(self):
+        with self.cv:
+            spans = self.spans
+            self.spans = []
+        if spans and self.exporter:
+            try:
+                self.exporter.export(spans)
+            except (IOError, OSError, ValueError) as e:
+                self.log.warning("Cannot export spans: {}".format(e))
+
+    def _export_spans(self):
+        while True:
+            with self.cv:
+                self.cv.wait(self.flushInterval)
+            self.flush()
+
+    def shutdown(self):
+        self.enabled = False
+        self.flush()
+        if self.exporter:
+            self.exporter.shutdown()
+            self.exporter = None
+
+
+tracer = Tracer()
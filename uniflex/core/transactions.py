@@ -1,7 +1,21 @@
+import time
+import uuid
+import random
 import logging
+import threading
 from enum import IntEnum
+from concurrent import futures
 
 from uniflex.core import modules
+from uniflex.core import events
+from uniflex.core.node import Node
+from uniflex.core.timer import Timer
+from uniflex.core.locks import (LockManager, LockMode, get_intention_mode,
+                                combine_modes)
+from uniflex.core.journal import Journal, RecordType, read_records
+from uniflex.core.exceptions import (FunctionCallTimeoutException,
+                                     TransactionAbortedException,
+                                     EntityLockedException)
 
 __author__ = "Piotr Gawlowicz"
 __copyright__ = "Copyright (c) 2017, Technische Universitat Berlin"
@@ -25,10 +39,42 @@ class TransactionStatus(IntEnum):
     SUCCESS = 4
 
 
+class ParticipantStatus(IntEnum):
+    VOTED = 1
+    PREPARED = 2
+    COMMITED = 3
+    CHECKED = 4
+    CONFIRMED = 5
+    ROLLED_BACK = 6
+    ABORTED = 7
+    ROLLING_BACK = 8
+
+
+def _get_function_name(func):
+    if isinstance(func, str):
+        return func
+    return func.__name__
+
+
+def _set_calling_module(module):
+    # calls of pool threads are sent in name of coordinating module
+    threading.current_thread().module = module
+
+
 class Transaction(object):
-    """docstring for Transaction"""
-    def __init__(self):
+    """
+    Coordinator of two-phase commit. Every phase is sent to
+    TransactionModules of all involved nodes in parallel and has
+    to be answered within timeout, otherwise transaction is
+    rolled back. If entity is locked by other transaction,
+    can-commit is retried lockRetries times after random backoff.
+    """
+    def __init__(self, module=None, timeout=5, maxParallel=64,
+                 lockRetries=3, retryDelay=0.05):
         super(Transaction, self).__init__()
+        self.log = logging.getLogger("{module}.{name}".format(
+            module=self.__class__.__module__, name=self.__class__.__name__))
+        self.uuid = str(uuid.uuid4())
         self.tasks = []
         self.rollbackIfConnectionLost_ = False
         self.connectionLostTimeout = 0
@@ -37,50 +83,230 @@ class Transaction(object):
 
         self.entities = []
 
+        # module in which name calls are sent, calling one if None
+        self.module = module
+        self.timeout = timeout
+        self.maxParallel = maxParallel
+        # node uuid -> [participant proxy, list of EntityTasks]
+        self.nodes = {}
+        # nodes that received can_commit and have to be rolled back
+        self.contacted = set()
+        self.executor = None
+        self.error = None
+        self.lockRetries = lockRetries
+        self.retryDelay = retryDelay
+        # [entity, mode] locked without task
+        self.locks = []
+
     def add_task(self, task):
         self.tasks.append(task)
 
+    def add_lock(self, entity, mode=LockMode.SHARED):
+        """
+        Locks entity for duration of transaction without executing
+        any function on it; entity can be module or whole node.
+        """
+        self.locks.append([entity, mode])
+
     def _sort_tasks_by_entity(self):
-        pass
+        byEntity = {}
+
+        def get_entity_tasks(entity):
+            entityTasks = byEntity.get(entity.uuid, None)
+            if entityTasks is None:
+                entityTasks = EntityTasks()
+                entityTasks.entity = entity
+                byEntity[entity.uuid] = entityTasks
+            return entityTasks
+
+        for task in self.tasks:
+            for entity in task.entities:
+                entityTasks = get_entity_tasks(entity)
+                entityTasks.tasks.append(task)
+                entityTasks.lockMode = combine_modes(entityTasks.lockMode,
+                                                     task.lockMode)
+        for entity, mode in self.locks:
+            entityTasks = get_entity_tasks(entity)
+            entityTasks.lockMode = combine_modes(entityTasks.lockMode, mode)
+        # entities are locked in global order of their uuids
+        self.entities = sorted(byEntity.values(),
+                               key=lambda e: e.entity.uuid)
+
+        self.nodes = {}
+        for entityTasks in self.entities:
+            node = entityTasks.entity
+            if not isinstance(node, Node):
+                node = node.node
+            if node.uuid not in self.nodes:
+                participant = node.all_modules.get_by_name(
+                    TransactionModule.__name__)
+                if participant is None:
+                    raise TransactionAbortedException(
+                        tx_id=self.uuid, phase="can_commit",
+                        reason="no TransactionModule in node {}"
+                        .format(node.uuid))
+                self.nodes[node.uuid] = [participant, []]
+            self.nodes[node.uuid][1].append(entityTasks)
+
+    def _call(self, nodeUuid, name, deadline, args):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FunctionCallTimeoutException(func_name=name,
+                                               timeout=self.timeout)
+        participant = self.nodes[nodeUuid][0]
+        func = getattr(participant.blocking(True).timeout(remaining), name)
+        return func(*args)
+
+    def _call_participants(self, name, args, nodeUuids=None, timeout=None):
+        """
+        Calls function of participants in parallel; args maps node
+        uuid to arguments. Returns node uuid -> return value or
+        exception.
+        """
+        if nodeUuids is None:
+            nodeUuids = list(self.nodes)
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        calls = {self.executor.submit(self._call, nodeUuid, name, deadline,
+                                      args[nodeUuid]): nodeUuid
+                 for nodeUuid in nodeUuids}
+        done, notDone = futures.wait(calls, timeout=timeout)
+
+        results = {}
+        for call in done:
+            try:
+                results[calls[call]] = call.result()
+            except Exception as e:
+                results[calls[call]] = e
+        for call in notDone:
+            results[calls[call]] = FunctionCallTimeoutException(
+                func_name=name, timeout=timeout)
+        return results
+
+    def _collect_votes(self, phase, results):
+        for nodeUuid, result in results.items():
+            if result is not True:
+                reason = result if isinstance(result, Exception) \
+                    else "node {} voted no".format(nodeUuid)
+                raise TransactionAbortedException(
+                    tx_id=self.uuid, phase=phase, reason=reason)
 
     def _can_commit(self):
         # check if all nodes are ready for commit
+        coordinator = self.module.agent.uuid
+        args = {}
+        for nodeUuid, (participant, entities) in self.nodes.items():
+            args[nodeUuid] = (self.uuid, coordinator,
+                              [[e.entity.uuid, int(e.lockMode)]
+                               for e in entities],
+                              self.timeout)
+        self.contacted.update(self.nodes)
+        self._collect_votes("can_commit",
+                            self._call_participants("rx_can_commit", args))
         return True
 
     def _pre_commit(self):
-        # deliver tasks to all nodes
+        # deliver tasks to all nodes, they run save points
+        args = {}
+        for nodeUuid, (participant, entities) in self.nodes.items():
+            entityTasks = []
+            for e in entities:
+                entityTasks.append([e.entity.uuid,
+                                    [task.get_description()
+                                     for task in e.tasks]])
+            args[nodeUuid] = (self.uuid, entityTasks)
+        self._collect_votes("pre_commit",
+                            self._call_participants("rx_pre_commit", args))
         return True
 
     def _do_commit(self):
         # execute commit
-        # schedule this call to be executed in few seconds
-        # it is required in case of inband control
+        args = dict.fromkeys(self.nodes, (self.uuid,
+                                          self.rollbackIfConnectionLost_,
+                                          self.connectionLostTimeout))
+        self._collect_votes("do_commit",
+                            self._call_participants("rx_do_commit", args))
+
+        if self.rollbackIfConnectionLost_:
+            # nodes unreachable after commit roll back on their own
+            args = dict.fromkeys(self.nodes, (self.uuid,))
+            self._collect_votes("check", self._call_participants(
+                "rx_check", args, timeout=self.connectionLostTimeout))
+
+        # confirmation is not awaited, nodes finish on their own
+        for participant, entities in self.nodes.values():
+            self.executor.submit(self._confirm, participant)
         return True
 
+    def _confirm(self, participant):
+        participant.blocking(False).rx_confirm(self.uuid)
+
     def _rollback(self):
         # rollback last commit
+        if not self.contacted:
+            return True
+        args = dict.fromkeys(self.contacted, (self.uuid,))
+        results = self._call_participants("rx_rollback", args,
+                                          nodeUuids=list(self.contacted))
+        for nodeUuid, result in results.items():
+            if result is not True:
+                # node rolls back on its own after timeout
+                self.log.warning("Rollback of {} in node {} failed: {}"
+                                 .format(self.uuid, nodeUuid, result))
         return True
 
     def rollback_if_connection_lost(self, value, timeout):
         self.rollbackIfConnectionLost_ = value
         self.connectionLostTimeout = timeout
 
+    def _is_lock_conflict(self, error):
+        reason = getattr(error, "kwargs", {}).get("reason", None)
+        return isinstance(reason, EntityLockedException)
+
     def commit(self):
         self.transactionStatus = TransactionStatus.COMMITED
 
-        self._sort_tasks_by_entity()
-
         try:
             # all steps can raise an exception
-            self._can_commit()
+            if self.module is None:
+                self.module = getattr(threading.current_thread(), 'module',
+                                      None)
+            if self.module is None:
+                raise TransactionAbortedException(
+                    tx_id=self.uuid, phase="can_commit",
+                    reason="no calling module, pass module to Transaction")
+            self._sort_tasks_by_entity()
+            self.executor = futures.ThreadPoolExecutor(
+                max_workers=max(1, min(self.maxParallel, len(self.nodes))),
+                initializer=_set_calling_module, initargs=(self.module,))
+            for attempt in range(self.lockRetries + 1):
+                try:
+                    self._can_commit()
+                    break
+                except TransactionAbortedException as e:
+                    if (attempt == self.lockRetries or
+                            not self._is_lock_conflict(e)):
+                        raise
+                    # release locks taken so far and let other win
+                    self._rollback()
+                    self.contacted = set()
+                    time.sleep(random.uniform(
+                        0, self.retryDelay * 2 ** attempt))
             self._pre_commit()
             self._do_commit()
             self.transactionStatus = TransactionStatus.SUCCESS
 
         except Exception as e:
-            self._rollback()
+            self.log.warning("Transaction {} failed: {}".format(self.uuid, e))
+            self.error = e
+            if self.executor is not None:
+                self._rollback()
             self.transactionStatus = TransactionStatus.ROLLED_BACK
-            return
+        finally:
+            if self.executor is not None:
+                # do not wait for calls that did not return in time
+                self.executor.shutdown(wait=False)
+                self.executor = None
 
     def get_status(self):
         return self.transactionStatus
@@ -99,24 +325,36 @@ class Transaction(object):
 
 
 class EntityTasks(object):
-    """docstring for EntityTasks"""
+    """Tasks of transaction executed on single entity"""
     def __init__(self):
         super(EntityTasks, self).__init__()
         self.entity = None
         self.tasks = []
+        # strongest lock mode required by tasks
+        self.lockMode = None
 
 
 class Task(object):
-    """docstring for Task"""
+    """
+    Function executed on all entities of task. Task with save
+    point can be reverted: value returned by save point function
+    (called in pre-commit) or saved value is passed to function
+    on rollback.
+    """
     def __init__(self):
         super(Task, self).__init__()
         self.entities = []
         self.save_point = {}
         self.function = {}
+        self.lockMode = LockMode.EXCLUSIVE
 
     def set_entities(self, entities):
         self.entities = entities
 
+    def set_lock_mode(self, mode):
+        # tasks that only read entity can share it
+        self.lockMode = mode
+
     def set_save_point_func(self, func, args=[]):
         self.save_point["function"] = func
         self.save_point["args"] = args
@@ -128,21 +366,416 @@ class Task(object):
         self.function["function"] = func
         self.function["args"] = args
 
+    def get_description(self):
+        # functions are sent to nodes by name
+        savePoint = dict(self.save_point)
+        if "function" in savePoint:
+            savePoint["function"] = _get_function_name(savePoint["function"])
+        return [_get_function_name(self.function["function"]),
+                list(self.function.get("args", [])), savePoint]
+
+
+class ParticipantTransaction(object):
+    """Transaction as seen by single node"""
+    def __init__(self, uuid, coordinator, entities, timeout):
+        super(ParticipantTransaction, self).__init__()
+        self.uuid = uuid
+        self.coordinator = coordinator
+        self.entities = entities
+        self.timeout = timeout
+        self.status = ParticipantStatus.VOTED
+        self.rollbackIfConnectionLost = False
+        # [module, function name, args, rollback args or None]
+        self.tasks = []
+        self.executed = []
+        # functions of transaction run outside participant lock; abort
+        # requested meanwhile is done by thread running them
+        self.running = False
+        self.abortPending = False
+        # data of PREPARE record, None if not journaled
+        self.record = None
+        # data of COMMIT record, None until it is appended
+        self.commitRecord = None
+        self.deadline = None
+        self.refresh(2 * timeout)
+
+    def refresh(self, timeout):
+        self.deadline = time.monotonic() + timeout
+
 
 class TransactionModule(modules.ControlApplication):
-    def __init__(self):
+    """
+    Participant of transactions; runs in every agent and executes
+    tasks on its local modules. Transaction not finished by its
+    coordinator in time, or whose coordinator is lost, is aborted;
+    committed one is rolled back if rollback on connection loss
+    was requested, otherwise it is kept.
+    With journal, prepared transactions are written ahead to file
+    and transactions in flight during crash are finished on start.
+    Entities are locked from can-commit until transaction ends, so
+    locks are leased for as long as coordinator is alive and keeps
+    transaction going.
+    Phases are served by thread pool, so journal syncs of concurrent
+    transactions are grouped and do not block receive of messages.
+    """
+    def __init__(self, checkInterval=0.5, journal=None, groupDelay=0,
+                 checkpointSize=1024 * 1024, lockWait=0):
         super(TransactionModule, self).__init__()
         self.log = logging.getLogger('TransactionModule')
-        self.state = None
-        self.tasks = []
+        self.lock = threading.RLock()
+        # transaction uuid -> ParticipantTransaction
+        self.transactions = {}
+        # locks of node and its modules, owned by transactions
+        self.locks = LockManager()
+        # seconds can-commit waits for conflicting transactions;
+        # coordinators lock nodes in parallel, so waits of two of them
+        # in different nodes can block each other until this timeout,
+        # by default conflicting can-commit votes no at once and
+        # coordinator retries after random backoff
+        self.lockWait = lockWait
+        self.checkInterval = checkInterval
+        self.timer = Timer(self._check_deadlines)
 
         # check if journal file exist, if so, load and execute commands
+        # on start, when all modules are loaded
+        self.journal = None
+        self.checkpointSize = checkpointSize
+        self.recovered = []
+        if journal:
+            self.recovered = read_records(journal)
+            self.journal = Journal(journal, groupDelay)
+
+    def _append(self, recordType, tx, data=None):
+        if self.journal is None:
+            return None
+        return self.journal.append(recordType, tx.uuid, data)
+
+    def _sync(self, lsn):
+        if lsn is not None:
+            self.journal.sync(lsn)
+
+    def _get_transaction(self, txId, statuses):
+        tx = self.transactions.get(txId, None)
+        if tx is None or tx.running or tx.status not in statuses:
+            return None
+        return tx
+
+    def _release(self, tx, status):
+        tx.status = status
+        self.transactions.pop(tx.uuid, None)
+        self.locks.release(tx.uuid)
+        if tx.record is not None:
+            self._append(RecordType.END, tx)
+
+    def _undo(self, tx):
+        for module, name, args, rollbackArgs in reversed(tx.executed):
+            if rollbackArgs is None:
+                self.log.warning("Function {} of transaction {} cannot be "
+                                 "reverted".format(name, tx.uuid))
+                continue
+            try:
+                getattr(module, name)(*rollbackArgs)
+            except Exception as e:
+                self.log.error("Rollback of {} in transaction {} failed: {}"
+                               .format(name, tx.uuid, e))
+        tx.executed = []
+
+    def _rollback(self, tx):
+        # called without lock, after _abort
+        with self.lock:
+            lsn = self._append(RecordType.ROLLBACK, tx)
+        # decision is on disk before any function is reverted
+        self._sync(lsn)
+        self._undo(tx)
+        with self.lock:
+            tx.running = False
+            self._release(tx, ParticipantStatus.ROLLED_BACK)
+
+    def _abort(self, tx):
+        """
+        Aborts transaction, lock is held. Returns True if executed
+        functions are to be reverted by _rollback after lock is
+        released.
+        """
+        if tx.running:
+            tx.abortPending = True
+            return False
+        if tx.status in [ParticipantStatus.COMMITED,
+                         ParticipantStatus.CHECKED]:
+            tx.status = ParticipantStatus.ROLLING_BACK
+            tx.running = True
+            return True
+        self._release(tx, ParticipantStatus.ABORTED)
+        return False
+
+    def _expire(self, tx):
+        if tx.status == ParticipantStatus.CHECKED or (
+                tx.status == ParticipantStatus.COMMITED and
+                not tx.rollbackIfConnectionLost):
+            # coordinator saw commit, only confirmation was lost
+            self._release(tx, ParticipantStatus.CONFIRMED)
+            return False
+        self.log.warning("Transaction {} not finished in {}, abort"
+                         .format(tx.uuid, tx.status.name))
+        return self._abort(tx)
+
+    def _get_records(self, tx):
+        records = [(RecordType.PREPARE, tx.uuid, tx.record)]
+        if tx.commitRecord is not None:
+            records.append((RecordType.COMMIT, tx.uuid, tx.commitRecord))
+        if tx.status == ParticipantStatus.CHECKED:
+            records.append((RecordType.CHECK, tx.uuid, None))
+        elif tx.status == ParticipantStatus.ROLLING_BACK:
+            records.append((RecordType.ROLLBACK, tx.uuid, None))
+        return records
+
+    def checkpoint(self):
+        """
+        Truncates journal to records of unfinished transactions.
+        """
+        with self.lock:
+            records = []
+            for tx in self.transactions.values():
+                if tx.record is not None:
+                    records.extend(self._get_records(tx))
+            self.journal.checkpoint(records)
+
+    def _check_deadlines(self):
+        now = time.monotonic()
+        with self.lock:
+            # running transactions are left to deadline set after
+            # their functions return
+            reverted = [tx for tx in list(self.transactions.values())
+                        if tx.deadline <= now and not tx.running and
+                        self._expire(tx)]
+            if (self.journal is not None and
+                    self.journal.get_size() >= self.checkpointSize):
+                self.checkpoint()
+        for tx in reverted:
+            self._rollback(tx)
+        self.timer.start(self.checkInterval)
+
+    def _find_module(self, name, device):
+        for module in self.moduleManager.modules.get_all_by_name(name):
+            if module.device == device:
+                return module
+        return None
+
+    def _recover(self):
+        # last record of every transaction tells how far it got
+        transactions = {}
+        for recordType, txId, data in self.recovered:
+            entry = transactions.setdefault(txId, [None, None, False])
+            entry[0] = recordType
+            if recordType == RecordType.PREPARE:
+                entry[1] = data
+            elif recordType == RecordType.COMMIT:
+                entry[2] = data
+
+        for txId, (last, record, rollbackIfConnectionLost) in \
+                transactions.items():
+            if last in [RecordType.END, RecordType.PREPARE] or \
+                    record is None:
+                continue
+            rollback = last == RecordType.ROLLBACK or (
+                last == RecordType.COMMIT and rollbackIfConnectionLost)
+            self.log.warning("Recover transaction {}: {}".format(
+                txId, "rollback" if rollback else "replay"))
+            tasks = record["tasks"]
+            if rollback:
+                tasks = reversed(tasks)
+            for name, device, function, args, rollbackArgs in tasks:
+                if rollback:
+                    args = rollbackArgs
+                if args is None:
+                    continue
+                module = self._find_module(name, device)
+                try:
+                    getattr(module, function)(*args)
+                except Exception as e:
+                    self.log.error("Recovery of {} in transaction {} "
+                                   "failed: {}".format(function, txId, e))
+        self.recovered = []
+        # all transactions are finished now
+        self.checkpoint()
+
+    @modules.run_in_pool()
+    def rx_can_commit(self, txId, coordinator, entities, timeout):
+        # node is locked first, in intention mode if only its modules
+        # are used, then modules in order of their uuids
+        nodeUuid = self.agent.uuid
+        nodeMode = None
+        requests = []
+        for entity, mode in sorted(entities):
+            mode = LockMode(mode)
+            if entity == nodeUuid:
+                nodeMode = combine_modes(nodeMode, mode)
+                continue
+            if self.moduleManager.get_module_by_uuid(entity) is None:
+                self.log.info("Vote no for {}, unknown entity {}"
+                              .format(txId, entity))
+                return False
+            nodeMode = combine_modes(nodeMode, get_intention_mode(mode))
+            requests.append((entity, mode))
+        requests.insert(0, (nodeUuid, nodeMode))
 
-    def rx_can_commit(self):
-        pass
+        try:
+            self.locks.acquire(txId, requests, self.lockWait)
+        except EntityLockedException:
+            self.log.info("Vote no for {}, entities are locked"
+                          .format(txId))
+            raise
+        with self.lock:
+            self.transactions[txId] = ParticipantTransaction(
+                txId, coordinator, [entity for entity, mode in entities],
+                timeout)
+            return True
 
-    def rx_pre_commit(self):
-        pass
+    @modules.run_in_pool()
+    def rx_pre_commit(self, txId, entityTasks):
+        with self.lock:
+            tx = self._get_transaction(txId, [ParticipantStatus.VOTED])
+            if tx is None:
+                return False
+            tx.running = True
+        # save points run without lock, entities are locked for
+        # transaction
+        try:
+            for entity, tasks in entityTasks:
+                module = self.moduleManager.get_module_by_uuid(entity)
+                for name, args, savePoint in tasks:
+                    getattr(module, name)
+                    rollbackArgs = None
+                    if "function" in savePoint:
+                        saveFunc = getattr(module, savePoint["function"])
+                        rollbackArgs = [saveFunc(*savePoint.get("args", []))]
+                    elif "args" in savePoint:
+                        rollbackArgs = list(savePoint["args"])
+                    tx.tasks.append([module, name, args, rollbackArgs])
+        except Exception:
+            with self.lock:
+                tx.running = False
+                self._abort(tx)
+            raise
+        with self.lock:
+            tx.running = False
+            if tx.abortPending:
+                self._abort(tx)
+                return False
+            tx.status = ParticipantStatus.PREPARED
+            tx.refresh(2 * tx.timeout)
+            lsn = None
+            if self.journal is not None:
+                # modules are found by name and device after restart
+                tx.record = {"coordinator": tx.coordinator,
+                             "tasks": [[m.name, m.device, name, args,
+                                        rollbackArgs]
+                                       for m, name, args, rollbackArgs
+                                       in tx.tasks]}
+                lsn = self._append(RecordType.PREPARE, tx, tx.record)
+        # other transactions can join group commit meanwhile
+        self._sync(lsn)
+        return True
+
+    @modules.run_in_pool()
+    def rx_do_commit(self, txId, rollbackIfConnectionLost=False,
+                     connectionLostTimeout=0):
+        with self.lock:
+            tx = self._get_transaction(txId, [ParticipantStatus.PREPARED])
+            if tx is None:
+                return False
+            lsn = self._append(RecordType.COMMIT, tx,
+                               rollbackIfConnectionLost)
+            # checkpoint before sync keeps appended commit
+            tx.commitRecord = rollbackIfConnectionLost
+        # commit is on disk before any function is executed
+        self._sync(lsn)
+
+        with self.lock:
+            if tx.status != ParticipantStatus.PREPARED:
+                # aborted meanwhile
+                return False
+            tx.status = ParticipantStatus.COMMITED
+            tx.rollbackIfConnectionLost = rollbackIfConnectionLost
+            tx.running = True
+        # functions run without lock, entities are locked for transaction
+        error = None
+        try:
+            for task in tx.tasks:
+                module, name, args, rollbackArgs = task
+                getattr(module, name)(*args)
+                tx.executed.append(task)
+        except Exception as e:
+            error = e
+        with self.lock:
+            tx.running = False
+            revert = error is not None or tx.abortPending
+            if revert:
+                self._abort(tx)
+            elif rollbackIfConnectionLost:
+                tx.refresh(connectionLostTimeout)
+            else:
+                tx.refresh(2 * tx.timeout)
+        if revert:
+            self._rollback(tx)
+        if error is not None:
+            raise error
+        return not revert
+
+    @modules.run_in_pool()
+    def rx_check(self, txId):
+        with self.lock:
+            tx = self._get_transaction(txId, [ParticipantStatus.COMMITED])
+            if tx is None:
+                return False
+            tx.status = ParticipantStatus.CHECKED
+            tx.refresh(2 * tx.timeout)
+            lsn = self._append(RecordType.CHECK, tx)
+        self._sync(lsn)
+        return True
+
+    @modules.run_in_pool()
+    def rx_confirm(self, txId):
+        with self.lock:
+            tx = self._get_transaction(txId, [ParticipantStatus.COMMITED,
+                                              ParticipantStatus.CHECKED])
+            if tx is None:
+                return False
+            self._release(tx, ParticipantStatus.CONFIRMED)
+            return True
+
+    @modules.run_in_pool()
+    def rx_rollback(self, txId):
+        with self.lock:
+            tx = self.transactions.get(txId, None)
+            if tx is None:
+                # locks can be taken before transaction is known
+                self.locks.release(txId)
+                return True
+            revert = self._abort(tx)
+        if revert:
+            self._rollback(tx)
+        return True
 
-    def rx_do_commit(self):
-        pass
+    @modules.on_event([events.NodeLostEvent, events.NodeExitEvent])
+    def coordinator_lost(self, event):
+        with self.lock:
+            # coordinator cannot finish them any more; running ones
+            # are left to deadline set after their functions return
+            reverted = [tx for tx in list(self.transactions.values())
+                        if tx.coordinator == event.node.uuid and
+                        not tx.running and self._expire(tx)]
+        for tx in reverted:
+            self._rollback(tx)
+
+    @modules.on_start()
+    def start_deadline_timer(self):
+        if self.journal is not None:
+            self._recover()
+        self.timer.start(self.checkInterval)
+
+    @modules.on_exit()
+    def stop_deadline_timer(self):
+        self.timer.cancel()
+        if self.journal is not None:
+            self.journal.close()
@@ -1,19 +1,26 @@
 import sys
+import copy
+import time
 import zmq
 import zmq.auth
 import logging
 import threading
 import json
-import dill  # for pickling what standard pickle can’t cope with
-try:
-    import cPickle as pickle
-except:
-    import pickle
+
+from queue import Queue
 
 import uniflex.msgs as msgs
 from .timer import TimerEventSender
 from . import modules
-from .common import get_inheritors
+from . import serialization
+from . import metrics
+from . import tracing
+from . import profiling
+from .hot_logging import HotPathLogger, HOT_PATH_LOGGING
+from .compression import PayloadCompressor
+from .batching import MessageBatcher, BATCH_MSG_TYPE, unpack_records
+from .common import get_inheritors, is_local_url
+from .common import get_ipc_url, is_ipc_endpoint_available
 from .node import Node
 from . import events
 
@@ -24,27 +31,56 @@ __version__ = "0.1.0"
 __email__ = "gawlowicz@tkn.tu-berlin.de"
 
 
+# transport channels of agents running in this process,
+# messages between them are delivered without serialization
+_localChannels = {}
+_localChannelsLock = threading.Lock()
+
+
+serializedObjectTypes = set([msgs.SerializationType.PICKLE,
+                             msgs.SerializationType.DILL,
+                             msgs.SerializationType.CODEC])
+
+
+def parse_msg_desc(buf):
+    msgDesc = json.loads(bytes(buf).decode('utf-8'))
+    return msgs.MessageDescription.parse(msgDesc)
+
+
+def is_inproc_url(url):
+    return url is not None and url.startswith("inproc://")
+
+
 class SendHelloMsgTimeEvent(events.TimeEvent):
+    priority = events.EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class HelloMsgTimeoutEvent(events.TimeEvent):
+    priority = events.EventPriority.HIGH
+
     def __init__(self):
         super().__init__()
 
 
 class TransportChannel(modules.CoreModule):
-    def __init__(self, agent):
+    def __init__(self, agent, inproc=False):
         super().__init__()
         self.log = logging.getLogger("{module}.{name}".format(
             module=self.__class__.__module__, name=self.__class__.__name__))
+        self.hotLog = HotPathLogger(self.log)
 
         self.agent = agent
         self._nodeManager = None
         self._moduleManager = None
         self.xpub_url = None
         self.xsub_url = None
+        self.ipcSelection = "auto"
+        # decompression works also if compression is not enabled
+        self.compressor = PayloadCompressor()
+        self.batcher = None
         self.timeout = 500  # ms
         self.forceStop = False
 
@@ -53,13 +89,24 @@ class TransportChannel(modules.CoreModule):
         self.connected = False
         self.helloMsgInterval = 3
         self.helloTimeOut = 10
+        # explicit hellos are sent only after quiet period, it is
+        # enabled when broker aggregates liveness of all nodes
+        self.helloSuppression = False
+        self.lastSendTime = 0
         self.helloMsgTimer = TimerEventSender(self, SendHelloMsgTimeEvent)
         self.helloMsgTimeoutTimer = TimerEventSender(self,
                                                      HelloMsgTimeoutEvent)
 
         self.pubSocketLock = threading.Lock()
         self.poller = zmq.Poller()
-        self.context = zmq.Context()
+
+        # inproc:// endpoints require context shared with broker
+        self.inproc = inproc
+        self.localInbox = Queue()
+        if self.inproc:
+            self.context = zmq.Context.instance()
+        else:
+            self.context = zmq.Context()
 
         # for downlink communication
         self.sub = self.context.socket(zmq.SUB)
@@ -86,6 +133,19 @@ class TransportChannel(modules.CoreModule):
         self.log.debug("Set Uplink: {}".format(xsub_url))
         self.xsub_url = xsub_url
 
+    def enable_batching(self, maxMessages=64, maxDelay=500):
+        """
+        Send messages to the same topic in batches of up to maxMessages
+        messages, delayed at most by maxDelay microseconds.
+        """
+        self.batcher = MessageBatcher(self.send_frames,
+                                      self._create_batch_desc,
+                                      maxMessages, maxDelay)
+
+    def _create_batch_desc(self):
+        msgDesc = msgs.MessageDescription(BATCH_MSG_TYPE, self.agent.uuid)
+        return json.dumps(msgDesc.serialize()).encode('utf-8')
+
     def set_certificates(self, client, server):
         self.log.debug("Set Certificates: {}, {}".format(client, server))
         client_public, client_secret = zmq.auth.load_certificate(client)
@@ -111,25 +171,46 @@ class TransportChannel(modules.CoreModule):
         thread.setDaemon(True)
         thread.start()
 
+        if self.inproc:
+            with _localChannelsLock:
+                _localChannels[self.agent.uuid] = self
+            thread = threading.Thread(target=self.recv_local_msgs)
+            thread.setDaemon(True)
+            thread.start()
+
         self.eventClasses = get_inheritors(events.EventBase)
 
+        if self.batcher:
+            self.batcher.start()
+
     @modules.on_exit()
     def stop_module(self):
         self.forceStop = True
+        if self.batcher:
+            self.batcher.stop()
         self._nodeManager.notify_node_exit()
-        try:
-            self.sub.setsockopt(zmq.LINGER, 0)
-            self.pub.setsockopt(zmq.LINGER, 0)
-            self.sub.close()
-            self.pub.close()
-            self.context.term()
-        except:
-            pass
+        if self.inproc:
+            with _localChannelsLock:
+                _localChannels.pop(self.agent.uuid, None)
+            self.localInbox.put(None)
+        # sockets are not thread safe, sub socket is closed by receive
+        # thread when it ends
+        with self.pubSocketLock:
+            try:
+                self.pub.setsockopt(zmq.LINGER, 0)
+                self.pub.close()
+            except:
+                pass
 
     @modules.on_event(SendHelloMsgTimeEvent)
     def send_hello_msg(self, event):
-        self.log.debug("Time to send HelloMsg")
-        self._nodeManager.send_hello_msg(timeout=self.helloTimeOut)
+        quietPeriod = time.time() - self.lastSendTime
+        if self.helloSuppression and quietPeriod < self.helloMsgInterval:
+            self.log.debug("Skip HelloMsg, node sent message {:.2f}s ago"
+                           .format(quietPeriod))
+        else:
+            self.log.debug("Time to send HelloMsg")
+            self._nodeManager.send_hello_msg(timeout=self.helloTimeOut)
 
         # reschedule hello msg
         self.helloMsgTimer.start(self.helloMsgInterval)
@@ -164,14 +245,27 @@ class TransportChannel(modules.CoreModule):
                 self.pub.disconnect(self.xsub_url)
                 self.sub.disconnect(self.xpub_url)
                 self.connected = False
+                self._nodeManager.stop_directory_sync()
             except:
                 pass
 
+    def select_endpoint(self, url):
+        if self.ipcSelection != "auto" or not is_local_url(url):
+            return url
+        ipcUrl = get_ipc_url(url)
+        if is_ipc_endpoint_available(ipcUrl):
+            self.log.debug("Broker endpoint {} is local, use {}"
+                           .format(url, ipcUrl))
+            return ipcUrl
+        return url
+
     def connect(self, xpub_url, xsub_url):
         if not xpub_url and not xsub_url:
             return
 
         self.disconnect()
+        xpub_url = self.select_endpoint(xpub_url)
+        xsub_url = self.select_endpoint(xsub_url)
         self.xpub_url = xpub_url
         self.xsub_url = xsub_url
         self.log.debug("Connect to Broker on XPUB-{},"
@@ -188,13 +282,73 @@ class TransportChannel(modules.CoreModule):
         # start sending hello msgs
         self.helloMsgTimer.start(self.helloMsgInterval)
 
-    def send(self, msgContainer):
-        topic = msgContainer[0].encode('utf-8')
+        if self._nodeManager.discoveryMode == "directory":
+            self._nodeManager.start_directory_sync()
+
+    def _get_local_channel(self, topic):
+        if not self.inproc:
+            return None
+        channel = _localChannels.get(topic, None)
+        if channel is self:
+            return None
+        return channel
+
+    def send_locally(self, channel, msgContainer):
+        topic = msgContainer[0]
         msgDesc = msgContainer[1]
         msg = msgContainer[2]
 
+        if msgDesc.serializationType == msgs.SerializationType.PROTOBUF:
+            if not isinstance(msg, bytes):
+                msg = msg.SerializeToString()
+        else:
+            # event is handed over without serialization; receiver gets
+            # its own copy of event and calling context, arguments are
+            # shared as for modules of one agent
+            msg = copy.copy(msg)
+            msg.traceContext = None
+            if hasattr(msg, 'responseQueue'):
+                # response queue of blocking call stays with sender
+                msg.responseQueue = None
+            if getattr(msg, 'ctx', None) is not None:
+                msg.ctx = copy.copy(msg.ctx)
+
+        # hellos are still needed, broker does not see local delivery
+        channel.localInbox.put([topic, msgDesc, msg])
+        if metrics.registry.enabled:
+            metrics.transportMessages.labels("out").inc()
+            if isinstance(msg, bytes):
+                metrics.transportBytes.labels("out").inc(len(msg))
+
+    def send(self, msgContainer):
+        msgDesc = msgContainer[1]
         msgDesc.sourceUuid = self.agent.uuid
+
+        span = None
+        traceContext = getattr(msgContainer[2], 'traceContext', None)
+        if traceContext is not None and tracing.tracer.enabled:
+            span = tracing.tracer.start_span(
+                "send {}".format(msgDesc.msgType), traceContext,
+                tracing.SpanKind.PRODUCER,
+                attributes={"messaging.destination": msgContainer[0]})
+            msgDesc.traceContext = span.context
+
+        # unicast to co-located agent
+        channel = self._get_local_channel(msgContainer[0])
+        if channel:
+            self.send_locally(channel, msgContainer)
+        else:
+            self.send_remote(msgContainer)
+
+        if span is not None:
+            span.end()
+
+    def send_remote(self, msgContainer):
+        msgDesc = msgContainer[1]
+        topic = msgContainer[0].encode('utf-8')
+        msg = msgContainer[2]
         msgContainer[0] = topic
+        priority = getattr(msg, 'priority', events.EventPriority.HIGH)
 
         serialized = False
         if hasattr(msg, 'serialize'):
@@ -205,25 +359,72 @@ class TransportChannel(modules.CoreModule):
 
         if not serialized:
             if msgDesc.serializationType == msgs.SerializationType.PROTOBUF:
-                msg = msg.SerializeToString()
+                # message may be already serialized, e.g. cached NodeInfo
+                if not isinstance(msg, bytes):
+                    msg = msg.SerializeToString()
 
             # if serialization not set, pickle it
             else:
-                msgDesc.serializationType = msgs.SerializationType.PICKLE
-                try:
-                    msg = pickle.dumps(msg)
-                except:
-                    msg = dill.dumps(msg)
+                # trace context is carried in message header
+                event = msg
+                traceContext = getattr(event, 'traceContext', None)
+                if traceContext is not None:
+                    event.traceContext = None
+                start = time.perf_counter()
+                states = None
+                if profiling.hooks.enabled:
+                    states = profiling.hooks.before(
+                        profiling.HookPoint.SERIALIZE, None,
+                        event.__class__.__name__)
+                msg, buffers, sType = serialization.dumps(event)
+                if states:
+                    profiling.hooks.after(profiling.HookPoint.SERIALIZE,
+                                          None, event.__class__.__name__,
+                                          states)
+                if metrics.registry.enabled:
+                    metrics.serializationTime.labels(
+                        sType.name, "dumps").observe(
+                        time.perf_counter() - start)
+                if traceContext is not None:
+                    event.traceContext = traceContext
+                msgDesc.serializationType = sType
+                # large buffers follow as separate frames
+                msgContainer.extend(buffers)
+
+        # unicast topic is uuid of receiving node
+        peerCompressions = None
+        if self.compressor.enabled:
+            node = self._nodeManager.get_node_by_uuid(msgContainer[0])
+            if node is not None:
+                peerCompressions = node.compressions
+        msg = self.compressor.compress(msgDesc, msg, peerCompressions)
 
         msgDesc = json.dumps(msgDesc.serialize())
         msgContainer[1] = msgDesc.encode('utf-8')
 
         msgContainer[2] = msg
 
+        if self.batcher and self.batcher.running:
+            # control messages and large payloads are not delayed
+            if (len(msgContainer) == 3 and
+                    priority != events.EventPriority.HIGH):
+                self.batcher.add(*msgContainer)
+                return
+            self.batcher.flush()
+
+        self.send_frames(msgContainer)
+
+    def send_frames(self, msgContainer):
         # TODO: it is quick fix; find better solution with socket per thread
         self.pubSocketLock.acquire()
         try:
-            self.pub.send_multipart(msgContainer)
+            # frames below zmq.COPY_THRESHOLD are copied anyway
+            self.pub.send_multipart(msgContainer, copy=False)
+            self.lastSendTime = time.time()
+            if metrics.registry.enabled:
+                metrics.transportMessages.labels("out").inc()
+                metrics.transportBytes.labels("out").inc(
+                    sum(len(frame) for frame in msgContainer))
         except zmq.error.ZMQError:
             self.log.debug("ZMQError: Socket operation on non-socket")
         finally:
@@ -241,7 +442,6 @@ class TransportChannel(modules.CoreModule):
             return
 
         # flatten event
-        self.log.debug("Event name: {}".format(event.__class__.__name__))
         if event.srcNode and isinstance(event.srcNode, Node):
             event.srcNode = event.srcNode.uuid
             event.node = None
@@ -254,8 +454,9 @@ class TransportChannel(modules.CoreModule):
         if dstNode:
             topic = dstNode.uuid
 
-        self.log.debug("sends cmd event : {} on topic: {}"
-                       .format(event.__class__.__name__, topic))
+        if HOT_PATH_LOGGING:
+            self.hotLog.debug("sends event", event=event.__class__.__name__,
+                              topic=topic)
 
         msgDesc = msgs.MessageDescription()
         msgDesc.msgType = event.__class__.__name__
@@ -268,17 +469,25 @@ class TransportChannel(modules.CoreModule):
     def process_msgs(self, msgContainer):
         msgDesc = msgContainer[1]
         src = msgDesc.sourceUuid
-        self.log.debug(
-            "Transport Channel received message: {} from: {}, myUuid: {}"
-            .format(msgDesc.msgType, src, self.agent.uuid))
+        if HOT_PATH_LOGGING:
+            self.hotLog.sampled_debug("Transport Channel received message",
+                                      msgType=msgDesc.msgType, src=src)
 
         if src == self.agent.uuid:
-            self.log.debug("OWN msg -> discard")
             return
 
+        # every message refreshes liveness of its source node
+        self._nodeManager.refresh_node(src)
+
         if msgDesc.msgType == msgs.get_msg_type(msgs.NodeInfoMsg):
             self._nodeManager.serve_node_info_msg(msgContainer)
 
+        elif msgDesc.msgType == msgs.get_msg_type(msgs.NodeInfoSnapshot):
+            self._nodeManager.serve_node_info_snapshot(msgContainer)
+
+        elif msgDesc.msgType == msgs.get_msg_type(msgs.NodeInfoDelta):
+            self._nodeManager.serve_node_info_delta(msgContainer)
+
         elif msgDesc.msgType == msgs.get_msg_type(msgs.NodeInfoRequest):
             self._nodeManager.send_node_info(src)
 
@@ -291,51 +500,155 @@ class TransportChannel(modules.CoreModule):
         elif msgDesc.msgType == msgs.get_msg_type(msgs.HelloMsg):
             self._nodeManager.serve_hello_msg(msgContainer)
 
+        elif msgDesc.msgType == msgs.get_msg_type(msgs.HelloAggregateMsg):
+            # broker aggregates liveness, so it is safe to skip own
+            # hellos while node is sending other messages
+            self.helloSuppression = True
+            self._nodeManager.serve_hello_aggregate_msg(msgContainer)
+
         else:
             event = msgContainer[2]
             self._moduleManager.serve_event_msg(event)
 
+    def recv_local_msgs(self):
+        while not self.forceStop:
+            msgContainer = self.localInbox.get()
+            if msgContainer is None:
+                break
+            if metrics.registry.enabled:
+                metrics.transportMessages.labels("in").inc()
+                if isinstance(msgContainer[2], bytes):
+                    metrics.transportBytes.labels("in").inc(
+                        len(msgContainer[2]))
+            self.serve_msg(*msgContainer, received=time.time_ns())
+
+    def decode_msg(self, topic, msgDesc, payload, buffers=()):
+        """
+        Decode single message, returns message container
+        or None if message has to be discarded.
+        """
+        if isinstance(payload, events.EventBase):
+            # event of co-located agent is not serialized
+            cls = payload.__class__
+            if not serialization.is_allowed_type(cls.__module__,
+                                                 cls.__qualname__):
+                self.log.error("Type {}.{} is not allowed"
+                               .format(cls.__module__, cls.__name__))
+                return None
+            return [topic, msgDesc, payload]
+
+        if msgDesc.compression:
+            try:
+                payload = self.compressor.decompress(msgDesc, payload)
+            except Exception as e:
+                self.log.error("Cannot decompress {}: {}"
+                               .format(msgDesc.msgType, e))
+                return None
+
+        if msgDesc.serializationType in serializedObjectTypes:
+            # out-of-band buffers are used without copy
+            try:
+                start = time.perf_counter()
+                states = None
+                if profiling.hooks.enabled:
+                    states = profiling.hooks.before(
+                        profiling.HookPoint.DESERIALIZE, None,
+                        msgDesc.msgType)
+                msg = serialization.loads(payload, buffers,
+                                          msgDesc.serializationType,
+                                          msgDesc.msgType)
+                if states:
+                    profiling.hooks.after(profiling.HookPoint.DESERIALIZE,
+                                          None, msgDesc.msgType, states)
+                if metrics.registry.enabled:
+                    metrics.serializationTime.labels(
+                        msgs.SerializationType(
+                            msgDesc.serializationType).name,
+                        "loads").observe(time.perf_counter() - start)
+            except Exception as e:
+                self.log.error("Cannot deserialize {}: {}"
+                               .format(msgDesc.msgType, e))
+                return None
+
+        elif msgDesc.serializationType == msgs.SerializationType.PROTOBUF:
+            # TODO: move all protobuf serialization here
+            msg = bytes(payload)
+        elif msgDesc.serializationType == msgs.SerializationType.JSON:
+            msg = bytes(payload).decode('utf-8')
+            msg = json.loads(msg)
+            eventType = str(topic)
+            # get event class and create it
+            myClass = self.eventClasses.get(eventType, None)
+            if myClass and hasattr(myClass, 'parse'):
+                myEvent = myClass.parse(msg)
+                myEvent.srcNode = msgDesc.sourceUuid
+                myEvent.srcModule = "TEST"
+                msg = myEvent
+            else:
+                # discard message that cannot be parsed
+                return None
+        else:
+            msg = bytes(payload)
+
+        return [topic, msgDesc, msg]
+
+    def serve_msg(self, topic, msgDesc, payload, buffers=(), received=None):
+        if msgDesc.traceContext is None or not tracing.tracer.enabled:
+            msgContainer = self.decode_msg(topic, msgDesc, payload, buffers)
+            if msgContainer is not None:
+                self.process_msgs(msgContainer)
+            return
+
+        span = tracing.tracer.start_span(
+            "receive {}".format(msgDesc.msgType), msgDesc.traceContext,
+            tracing.SpanKind.CONSUMER, received,
+            {"messaging.source": msgDesc.sourceUuid})
+        start = time.time_ns()
+        msgContainer = self.decode_msg(topic, msgDesc, payload, buffers)
+        tracing.tracer.record_span("decode", span.context, start,
+                                   time.time_ns())
+        if msgContainer is not None:
+            if isinstance(msgContainer[2], events.EventBase):
+                msgContainer[2].traceContext = span.context
+            self.process_msgs(msgContainer)
+        span.end()
+
     def recv_msgs(self):
         while not self.forceStop:
             try:
                 socks = dict(self.poller.poll(self.timeout))
                 if self.sub in socks and socks[self.sub] == zmq.POLLIN:
-                    msgContainer = self.sub.recv_multipart()
-                    assert len(msgContainer) == 3, msgContainer
-                    topic = msgContainer[0].decode('utf-8')
-                    msgDesc = msgContainer[1].decode('utf-8')
-                    msgDesc = json.loads(msgDesc)
-                    msgDesc = msgs.MessageDescription.parse(msgDesc)
-                    msg = msgContainer[2]
-
-                    if msgDesc.serializationType == msgs.SerializationType.PICKLE:
-                        try:
-                            msg = pickle.loads(msg)
-                        except:
-                            msg = dill.loads(msg)
-
-                    elif msgDesc.serializationType == msgs.SerializationType.PROTOBUF:
-                        # TODO: move all protobuf serialization here
-                        pass
-                    elif msgDesc.serializationType == msgs.SerializationType.JSON:
-                        msg = msg.decode('utf-8')
-                        msg = json.loads(msg)
-                        eventType = str(topic)
-                        # get event class and create it
-                        myClass = self.eventClasses.get(eventType, None)
-                        if myClass and hasattr(myClass, 'parse'):
-                            myEvent = myClass.parse(msg)
-                            myEvent.srcNode = msgDesc.sourceUuid
-                            myEvent.srcModule = "TEST"
-                            msg = myEvent
-                        else:
-                            # discard message that cannot be parsed
-                            continue
-
-                    msgContainer[0] = topic
-                    msgContainer[1] = msgDesc
-                    msgContainer[2] = msg
-
-                    self.process_msgs(msgContainer)
+                    frames = self.sub.recv_multipart(copy=False)
+                    if self.forceStop:
+                        # modules are exiting
+                        break
+                    assert len(frames) >= 3, frames
+                    if metrics.registry.enabled:
+                        metrics.transportMessages.labels("in").inc()
+                        metrics.transportBytes.labels("in").inc(
+                            sum(len(frame) for frame in frames))
+                    topic = frames[0].bytes.decode('utf-8')
+
+                    received = time.time_ns()
+                    msgDesc = parse_msg_desc(frames[1].buffer)
+
+                    if msgDesc.msgType == BATCH_MSG_TYPE:
+                        records = unpack_records(frames[2].buffer)
+                        for desc, payload in records:
+                            self.serve_msg(topic, parse_msg_desc(desc),
+                                           payload, (), received)
+                    else:
+                        buffers = [f.buffer for f in frames[3:]]
+                        self.serve_msg(topic, msgDesc, frames[2].buffer,
+                                       buffers, received)
             except zmq.error.ZMQError:
                 self.log.debug("ZMQError: Socket operation on non-socket")
+
+        try:
+            self.sub.setsockopt(zmq.LINGER, 0)
+            self.sub.close()
+            # shared context is used by other agents and broker
+            if not self.inproc:
+                self.context.term()
+        except:
+            pass
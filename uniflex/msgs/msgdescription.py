@@ -12,20 +12,43 @@ class SerializationType(IntEnum):
     PICKLE = 2
     MSGPACK = 3
     PROTOBUF = 4
+    DILL = 5
+    CODEC = 6
+
+
+class CompressionType(IntEnum):
+    NONE = 0
+    ZLIB = 1
+    LZ4 = 2
+    ZSTD = 3
 
 
 class MessageDescription(object):
     def __init__(self, msgType=None, sourceUuid=None,
-                 serializationType=SerializationType.NONE):
+                 serializationType=SerializationType.NONE,
+                 compression=CompressionType.NONE, dictionaryId=None,
+                 traceContext=None):
         super().__init__()
         self.msgType = msgType
         self.sourceUuid = sourceUuid
         self.serializationType = serializationType
+        self.compression = compression
+        self.dictionaryId = dictionaryId
+        # (traceId, spanId) of span that sent message
+        self.traceContext = traceContext
 
     def serialize(self):
-        return {"msgType": self.msgType,
-                "sourceUuid": self.sourceUuid,
-                "serializationType": self.serializationType}
+        buf = {"msgType": self.msgType,
+               "sourceUuid": self.sourceUuid,
+               "serializationType": self.serializationType}
+        # compression fields are sent only if used
+        if self.compression != CompressionType.NONE:
+            buf["compression"] = self.compression
+        if self.dictionaryId is not None:
+            buf["dictionaryId"] = self.dictionaryId
+        if self.traceContext is not None:
+            buf["trace"] = list(self.traceContext)
+        return buf
 
     @classmethod
     def parse(cls, buf):
@@ -33,4 +56,10 @@ class MessageDescription(object):
         sourceUuid = buf.get("sourceUuid", None)
         sType = buf.get("serializationType", 0)
         sType = SerializationType(sType)
-        return cls(msgType, sourceUuid, sType)
+        compression = CompressionType(buf.get("compression", 0))
+        dictionaryId = buf.get("dictionaryId", None)
+        traceContext = buf.get("trace", None)
+        if traceContext is not None:
+            traceContext = tuple(traceContext)
+        return cls(msgType, sourceUuid, sType, compression, dictionaryId,
+                   traceContext)